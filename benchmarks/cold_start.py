@@ -0,0 +1,84 @@
+"""
+Measures the cold start of the serving path: module import time and the time to build each shared client.
+
+Every measurement runs in a fresh interpreter, so nothing is warmed up by an earlier step:
+
+    python benchmarks/cold_start.py --runs 3
+
+Clients are built without making requests, except the mem0 client, which validates
+its API key on construction; failures are reported instead of timed.
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+import replay
+
+MODULES = ["config", "agent.workflow", "agent.tool", "agent.nutrition_bot", "app"]
+
+# Shared clients in the order they are first needed by a query
+SINGLETONS = [
+    ("config", "get_llm"),
+    ("config", "get_embedding_model"),
+    ("utils.embedding_cache", "get_cached_embedding_model"),
+    ("utils.retrieve", "get_vector_store"),
+    ("utils.retrieve", "get_docstore"),
+    ("utils.retrieve", "get_lexical_index"),
+    ("agent.workflow", "get_workflow_app"),
+    ("agent.nutrition_bot", "get_agent_executor"),
+    ("utils.guardrail", "get_llama_guard_client"),
+    ("agent.nutrition_bot", "get_memory_client")
+]
+
+MEASURE = """
+import sys, json, time, importlib
+sys.path.insert(0, "src")
+kind, module, name = sys.argv[1:4]
+start = time.perf_counter()
+target = importlib.import_module(module)
+imported = time.perf_counter()
+error = None
+if kind == "singleton":
+    try:
+        getattr(target, name)()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+print(json.dumps({"import_s": imported - start, "build_s": time.perf_counter() - imported, "error": error}))
+"""
+
+
+def measure(kind: str, module: str, name: str = "") -> dict:
+    process = subprocess.run([sys.executable, "-c", MEASURE, kind, module, name],
+                             cwd=replay.ROOT, capture_output=True, text=True)
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1]}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def median(samples: list[dict], key: str) -> float:
+    return statistics.median(sample[key] for sample in samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    print(f"{'import':<52} {'time (s)':>9}")
+    for module in MODULES:
+        samples = [measure("import", module) for _ in range(args.runs)]
+        if "import_s" not in samples[-1]:
+            print(f"{module:<52} {'error':>9}  {samples[-1]['error'][:60]}")
+        else:
+            print(f"{module:<52} {median(samples, 'import_s'):>9.2f}")
+
+    print(f"\n{'first use (after import)':<52} {'time (s)':>9}")
+    for module, name in SINGLETONS:
+        samples = [measure("singleton", module, name) for _ in range(args.runs)]
+        label = f"{module}.{name}()"
+        if samples[-1]["error"] or "build_s" not in samples[-1]:
+            print(f"{label:<52} {'error':>9}  {samples[-1]['error'][:60]}")
+        else:
+            print(f"{label:<52} {median(samples, 'build_s'):>9.2f}")
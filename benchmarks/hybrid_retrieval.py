@@ -0,0 +1,98 @@
+"""
+Compares recall@k and search latency (p50/p99) of vector-only and hybrid retrieval.
+
+Queries are the hypothetical questions of a sample of stored records, one per line, and a
+retrieved document is relevant when it comes from the same source and page as the question.
+As the questions are also part of the indexed text, this favours lexical matching; pass
+`--queries` with a JSON list of {"query", "source", "page"} items to use labelled queries.
+
+    python benchmarks/hybrid_retrieval.py --sample 200
+
+The queries are embedded in one batch through the embedding cache before timing, so the
+latencies exclude the embedding request. The "embedded" column counts the queries that
+needed one, which the lexical-only path skips.
+"""
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+import replay
+
+from utils.retrieve import (ScoredRetriever,
+                            get_vector_store)
+from utils.embedding_cache import get_cached_embedding_model
+from config import (RRF_K,
+                    RETRIEVAL_FETCH_K,
+                    RETRIEVAL_MIN_SCORE,
+                    RETRIEVAL_MMR_LAMBDA,
+                    LEXICAL_ONLY_MAX_TERMS)
+
+MODES = {
+    "vector": {"hybrid": False},
+    "hybrid": {"hybrid": True, "lexical_only_max_terms": 0},
+    "lexical-only": {"hybrid": True, "lexical_only_max_terms": LEXICAL_ONLY_MAX_TERMS}
+}
+
+
+def sample_queries(count: int) -> list[dict]:
+    collection = get_vector_store()._collection
+    records = collection.get(include=["documents", "metadatas"])
+
+    queries = [
+        {"query": line.strip(), "source": metadata.get("source"), "page": metadata.get("page")}
+        for document, metadata in zip(records["documents"], records["metadatas"])
+        for line in (document or "").splitlines() if line.strip()
+    ]
+    rng = np.random.default_rng(0)
+    return [queries[i] for i in rng.permutation(len(queries))[:count]]
+
+
+def measure(mode: str, queries: list[dict], k: int) -> dict:
+    retriever = ScoredRetriever(k=k, fetch_k=RETRIEVAL_FETCH_K, min_score=RETRIEVAL_MIN_SCORE,
+                                mmr_lambda=RETRIEVAL_MMR_LAMBDA, rrf_k=RRF_K, **MODES[mode])
+
+    hits, embedded, latencies = 0, 0, []
+    for item in queries:
+        embedded += not retriever.is_lexical_only(item["query"], retriever.search_lexical(item["query"]))
+
+        start = time.perf_counter()
+        docs = retriever.invoke(item["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        hits += any(doc.metadata.get("source") == item["source"] and doc.metadata.get("page") == item["page"] for doc in docs)
+
+    return {
+        "recall": hits / len(queries),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "embedded": embedded
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", type=int, default=200, help="Number of stored questions used as queries")
+    parser.add_argument("--queries", help="JSON file of labelled queries instead of stored questions")
+    parser.add_argument("--k", type=int, default=5, help="Documents per search")
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries) as f:
+            queries = json.load(f)
+    else:
+        queries = sample_queries(args.sample)
+
+    if not queries:
+        sys.exit("No queries: the vector store is empty.")
+
+    # Fill the embedding cache in one request, so that only the searches are timed
+    get_cached_embedding_model().embed_queries([item["query"] for item in queries])
+
+    print(f"{len(queries)} queries")
+    print(f"{'mode':<14} {f'recall@{args.k}':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'embedded':>9}")
+    for mode in MODES:
+        result = measure(mode, queries, args.k)
+        print(f"{mode:<14} {result['recall']:>9.3f} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['embedded']:>9}")
@@ -0,0 +1,115 @@
+"""
+Measures ingestion throughput in chunks/sec for the notebook's serial loop and the ingestion pipeline.
+
+Runs offline with a fake chat model and embedding model that sleep for a simulated
+latency per request, on synthetic chunks, into temporary stores:
+
+    python benchmarks/ingestion_throughput.py --chunks 64 --llm-latency 0.5
+
+"notebook" generates questions one chunk at a time and embeds 100 documents per request,
+as `data_processing.ipynb` does. "pipeline" runs `ingestion.ingest` with concurrent,
+rate-limited generation and batched embeddings. "rerun" runs it again on the same
+checkpoint and embedding cache with a tenth of the chunks changed.
+"""
+import time
+import zlib
+import asyncio
+import argparse
+import tempfile
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+import replay
+
+from ingestion.pipeline import ingest
+from ingestion.store import build_store
+from ingestion.questions import QuestionCheckpoint
+from utils.embedding_cache import CachedEmbeddings
+from utils.prompts import HYPOTHETICAL_QUESTIONS
+
+
+class FakeLLM:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def ainvoke(self, prompt: str) -> AIMessage:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return AIMessage(content=f"1. What does chunk {zlib.crc32(prompt.encode())} describe?")
+
+    def invoke(self, prompt: str) -> AIMessage:
+        self.calls += 1
+        time.sleep(self.latency)
+        return AIMessage(content=f"1. What does chunk {zlib.crc32(prompt.encode())} describe?")
+
+
+class FakeEmbeddings:
+    def __init__(self, latency: float, dim: int = 1536):
+        self.latency = latency
+        self.dim = dim
+        self.calls = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [np.random.default_rng(zlib.crc32(text.encode())).standard_normal(self.dim).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def synthetic_chunks(count: int, version: int = 0) -> list[Document]:
+    return [
+        Document(
+            page_content=f"Passage {i} (revision {version if i % 10 == 0 else 0}) about nutritional disorders. " * 20,
+            metadata={"source": "synthetic.pdf", "page": i // 4, "type": "text"}
+        )
+        for i in range(count)
+    ]
+
+
+def notebook(chunks: list[Document], llm: FakeLLM, embeddings: FakeEmbeddings, directory: str) -> float:
+    start = time.perf_counter()
+    documents = []
+    for i, chunk in enumerate(chunks):
+        questions = llm.invoke(HYPOTHETICAL_QUESTIONS["text"].format(content=chunk.page_content)).content
+        documents.append(Document(id=f"txt{i}", page_content=questions, metadata={"original_content": chunk.page_content, **chunk.metadata}))
+    build_store(documents, embeddings, directory, "hypotheticals", batch_size=100)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per question generation request")
+    parser.add_argument("--embedding-latency", type=float, default=0.2, help="Seconds per embedding request")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=0, help="Requests per minute, 0 for no limit")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+    print(f"{'mode':<10} {'chunks/s':>9} {'seconds':>8} {'LLM calls':>10} {'embedding calls':>16}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        llm, embeddings = FakeLLM(args.llm_latency), FakeEmbeddings(args.embedding_latency)
+        elapsed = notebook(chunks, llm, embeddings, f"{tmp}/notebook")
+        print(f"{'notebook':<10} {len(chunks) / elapsed:>9.1f} {elapsed:>8.2f} {llm.calls:>10} {embeddings.calls:>16}")
+
+        checkpoint = QuestionCheckpoint(f"{tmp}/checkpoint.sqlite3")
+        llm, embeddings = FakeLLM(args.llm_latency), FakeEmbeddings(args.embedding_latency)
+        cached = CachedEmbeddings(embeddings, "fake", f"{tmp}/embeddings")
+
+        for mode, run_chunks in [("pipeline", chunks), ("rerun", synthetic_chunks(args.chunks, version=1))]:
+            llm.calls, embeddings.calls = 0, 0
+            stats = ingest(run_chunks, llm, cached, checkpoint, f"{tmp}/pipeline", "hypotheticals",
+                           concurrency=args.concurrency, requests_per_minute=args.rpm)
+            print(f"{mode:<10} {stats['chunks_per_s']:>9.1f} {stats['total_s']:>8.2f} {llm.calls:>10} {embeddings.calls:>16}")
+
+        checkpoint.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Recorded-response helpers shared by the benchmarks.
+
+A recording maps each user query to the LLM responses (and their latencies) that
+every workflow node received, plus the documents returned by retrieval. Replaying
+a recording swaps the OpenAI clients for stubs that sleep for the recorded latency,
+so workflow variants can be compared on wall-clock time without network noise.
+"""
+import os
+import sys
+import json
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# The app runs from the repository root with `src` on the import path
+sys.path.insert(0, str(ROOT / "src"))
+os.chdir(ROOT)
+
+from langchain_core.messages import AIMessage
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from utils.prompts import (GENERATE,
+                           EXPANSION,
+                           PRECISION,
+                           REFINEMENT,
+                           GROUNDEDNESS,
+                           RESPONSE_REFINEMENT)
+
+
+# Identify the calling node from the system prompt of the rendered chat prompt
+NODES_BY_SYSTEM_PROMPT = {
+    EXPANSION["system"]: "expand_query",
+    GENERATE["system"]: "craft_response",
+    GROUNDEDNESS["system"]: "score_groundedness",
+    PRECISION["system"]: "check_precision",
+    REFINEMENT["system"]: "refine_query",
+    RESPONSE_REFINEMENT["system"]: "refine_response"
+}
+
+# Modules that hold a reference to the shared chat model
+LLM_MODULES = ["agent.generate", "evaluation.groundedness", "evaluation.precision"]
+
+
+def node_name(prompt) -> str:
+    """
+    Returns the workflow node that rendered the given chat prompt.
+    """
+    return NODES_BY_SYSTEM_PROMPT.get(prompt.to_messages()[0].content, "unknown")
+
+
+def load_recording(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_recording(path: str, recording: dict):
+    with open(path, "w") as f:
+        json.dump(recording, f, indent=2)
+
+
+def replay_llm(recording: dict, query: str) -> RunnableLambda:
+    """
+    Builds a chat model stub that answers each node with its recorded responses in order.
+    """
+    calls = recording[query]["llm"]
+    position = {}
+
+    def invoke(prompt):
+        node = node_name(prompt)
+        index = position.get(node, 0)
+        position[node] = index + 1
+
+        # Reuse the last response if a workflow variant calls a node more often
+        call = calls[node][min(index, len(calls[node]) - 1)]
+        time.sleep(call["latency"])
+
+        return AIMessage(content=call["response"])
+
+    return RunnableLambda(invoke)
+
+
+def replay_retriever(recording: dict, query: str) -> RunnableLambda:
+    """
+    Builds a retriever stub that returns the recorded documents after the recorded latency.
+    """
+    retrieval = recording[query]["retrieval"]
+
+    def invoke(_):
+        time.sleep(retrieval["latency"])
+        return [Document(page_content=doc["content"], metadata=doc["metadata"]) for doc in retrieval["documents"]]
+
+    return RunnableLambda(invoke)
+
+
+def recording_llm(llm, calls: dict) -> RunnableLambda:
+    """
+    Wraps the real chat model so that every response and its latency are recorded.
+    """
+    def invoke(prompt):
+        start = time.perf_counter()
+        response = llm.invoke(prompt)
+        calls.setdefault(node_name(prompt), []).append({
+            "response": response.content,
+            "latency": time.perf_counter() - start
+        })
+        return response
+
+    return RunnableLambda(invoke)
+
+
+def recording_retriever(retriever, retrieval: dict) -> RunnableLambda:
+    """
+    Wraps the real retriever so that the first retrieval and its latency are recorded.
+    """
+    def invoke(query):
+        start = time.perf_counter()
+        docs = retriever.invoke(query)
+        retrieval.setdefault("latency", time.perf_counter() - start)
+        retrieval.setdefault("documents", [{"content": d.page_content, "metadata": d.metadata} for d in docs])
+        return docs
+
+    return RunnableLambda(invoke)
+
+
+def patch_llm(llm):
+    """
+    Points every workflow module at the given chat model, bypassing the prompt cache.
+    """
+    for name in LLM_MODULES:
+        setattr(sys.modules[name], "cached_llm", lambda node: llm)
+        setattr(sys.modules[name], "response_llm", lambda: llm)
+
+
+class RetrieverStub:
+    """
+    Exposes a retrieval runnable through the `ScoredRetriever` methods used by the retrieval nodes.
+
+    Queries are neither searched lexically nor embedded, so loop reuse only matches identical queries.
+    """
+
+    def __init__(self, runnable):
+        self.runnable = runnable
+
+    def invoke(self, query: str, config=None):
+        return self.runnable.invoke(query, config)
+
+    async def ainvoke(self, query: str, config=None):
+        return await self.runnable.ainvoke(query, config)
+
+    def search_lexical(self, query: str) -> list:
+        return []
+
+    def answers_lexically(self, query: str) -> bool:
+        return False
+
+    def embed_queries(self, queries: list[str], lexicals: list) -> list:
+        return [None] * len(queries)
+
+    async def aembed_queries(self, queries: list[str], lexicals: list) -> list:
+        return [None] * len(queries)
+
+    def retrieve(self, query: str, lexical: list, embedding=None):
+        return self.runnable.invoke(query)
+
+    async def aretrieve(self, query: str, lexical: list, embedding=None):
+        return await self.runnable.ainvoke(query)
+
+
+def patch_retriever(retriever):
+    """
+    Points retrieval at the given retriever runnable.
+    """
+    sys.modules["utils.retrieve"].get_retriever = lambda: RetrieverStub(retriever)
@@ -0,0 +1,91 @@
+"""
+Compares search latency (p50/p99) and resident memory of the Chroma and local retrieval backends.
+
+Export the local index first with `PYTHONPATH=src python -m utils.local_index`, then run:
+
+    python benchmarks/retrieval_backends.py --queries 500
+
+Query vectors are perturbed copies of stored embeddings, so no embedding API calls are made.
+Each backend runs in its own subprocess so that resident memory is measured in isolation.
+"""
+import sys
+import json
+import time
+import resource
+import argparse
+import subprocess
+
+import numpy as np
+
+import replay
+
+from config import (STORE_DIRECTORY,
+                    STORE_COLLECTION,
+                    LOCAL_INDEX_DIRECTORY)
+
+BACKENDS = ["chroma", "local-exact", "local-hnsw"]
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def query_vectors(count: int, k: int) -> np.ndarray:
+    matrix = np.load(f"{LOCAL_INDEX_DIRECTORY}/embeddings.npy", mmap_mode="r")
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, matrix.shape[0], size=count)
+    return matrix[rows] + rng.normal(scale=0.01, size=(count, matrix.shape[1])).astype(np.float32)
+
+
+def load_backend(backend: str):
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        return Chroma(collection_name=STORE_COLLECTION, persist_directory=STORE_DIRECTORY)
+
+    from utils.local_index import LocalVectorStore
+    return LocalVectorStore(LOCAL_INDEX_DIRECTORY, embedding_function=None, method=backend.split("-")[1])
+
+
+def measure(backend: str, count: int, k: int) -> dict:
+    queries = query_vectors(count, k)
+    baseline = max_rss_mb()
+
+    start = time.perf_counter()
+    store = load_backend(backend)
+    load_time = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search_by_vector(query.tolist(), k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "backend": backend,
+        "load_s": load_time,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "rss_mb": max_rss_mb() - baseline
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500, help="Number of searches per backend")
+    parser.add_argument("--k", type=int, default=5, help="Documents per search")
+    parser.add_argument("--backend", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(measure(args.backend, args.queries, args.k)))
+        sys.exit()
+
+    print(f"{'backend':<12} {'load (s)':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'RSS (MB)':>9}")
+    for backend in BACKENDS:
+        output = subprocess.run(
+            [sys.executable, __file__, "--backend", backend, "--queries", str(args.queries), "--k", str(args.k)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{backend:<12} {result['load_s']:>9.3f} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['rss_mb']:>9.1f}")
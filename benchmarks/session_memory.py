@@ -0,0 +1,89 @@
+"""
+Load test of the memory used per Streamlit session with a bot per session versus one shared bot.
+
+Builds the bots of `--sessions` simulated sessions and reports the Python heap and
+resident memory added per session, and the threads left running:
+
+    python benchmarks/session_memory.py --sessions 200
+
+"per-session" rebuilds the mem0 clients, agent executor and connection pool for every
+session, as `app.py` did with a `NutritionBot` in `st.session_state`. "shared" hands every
+session the same bot, as `st.cache_resource` does now. No requests are sent; mem0's API key
+check on client construction is skipped.
+"""
+import sys
+import json
+import argparse
+import resource
+import threading
+import subprocess
+import tracemalloc
+
+import replay
+
+MODES = ["per-session", "shared"]
+
+
+def rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def offline_mem0():
+    from mem0.client import main
+
+    main.MemoryClient._validate_api_key = lambda self: None
+    main.AsyncMemoryClient._validate_api_key = lambda self: None
+    main.capture_client_event = lambda *args, **kwargs: None
+
+
+def measure(mode: str, sessions: int) -> dict:
+    offline_mem0()
+
+    from utils.http import get_transport
+    from agent.nutrition_bot import (NutritionBot,
+                                     get_agent_executor,
+                                     get_memory_client,
+                                     get_async_memory_client)
+
+    # Build the shared parts once so that only the per-session cost is measured
+    shared = NutritionBot()
+    baseline_rss, baseline_threads = rss_mb(), threading.active_count()
+    tracemalloc.start()
+
+    bots = []
+    for _ in range(sessions):
+        if mode == "per-session":
+            for accessor in [get_transport, get_memory_client, get_async_memory_client, get_agent_executor]:
+                accessor.reset()
+            bots.append(NutritionBot())
+            get_async_memory_client()   # A bot per session built its own async client too
+        else:
+            bots.append(shared)
+
+    heap, _ = tracemalloc.get_traced_memory()
+    return {
+        "mode": mode,
+        "heap_kb_per_session": heap / 1024 / sessions,
+        "rss_mb_per_session": (rss_mb() - baseline_rss) / sessions,
+        "threads": threading.active_count() - baseline_threads
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200, help="Simulated browser sessions")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.sessions)))
+        sys.exit()
+
+    print(f"{'mode':<12} {'heap/session (KB)':>18} {'RSS/session (MB)':>17} {'extra threads':>14}")
+    for mode in MODES:
+        # Each mode runs in its own interpreter so that resident memory is measured in isolation
+        output = subprocess.run([sys.executable, __file__, "--mode", mode, "--sessions", str(args.sessions)],
+                                cwd=replay.ROOT, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<12} {result['heap_kb_per_session']:>18.1f} {result['rss_mb_per_session']:>17.3f} {result['threads']:>14}")
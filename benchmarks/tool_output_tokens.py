@@ -0,0 +1,83 @@
+"""
+Compares the prompt tokens of the agent's final call with the full and the compact agentic_rag tool output.
+
+After calling agentic_rag, the agent sends its prompt again together with the tool call and
+its result, serialized into the scratchpad. Each query of a recording made with
+`benchmarks/workflow_latency.py --record` is replayed through the workflow offline, and
+that final prompt is rendered with the whole workflow state and with its projection:
+
+    python benchmarks/tool_output_tokens.py --recording recording.json
+"""
+import json
+import argparse
+
+import replay
+
+from langchain_core.messages import AIMessage
+from langchain.prompts import ChatPromptTemplate
+from langchain.agents.output_parsers.tools import ToolAgentAction
+from langchain.agents.format_scratchpad.tools import format_to_tool_messages
+
+from utils.prompts import AGENT
+from utils.packing import count_tokens
+from agent.workflow import create_workflow
+from agent.tool import (tool_output,
+                        initial_state)
+
+
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system", AGENT["system"]),
+    ("human", "{input}"),
+    ("placeholder", "{agent_scratchpad}")
+])
+
+
+def final_prompt_tokens(query: str, observation) -> int:
+    """
+    Renders the agent prompt after one agentic_rag call and counts its tokens.
+    """
+    call = {"name": "agentic_rag", "args": {"query": query}, "id": "call_0"}
+    action = ToolAgentAction(tool="agentic_rag", tool_input=call["args"], log="",
+                             message_log=[AIMessage(content="", tool_calls=[call])], tool_call_id=call["id"])
+
+    messages = PROMPT.format_messages(
+        input=AGENT["query"].format(context="Previous relevant interactions:\n", query=query),
+        agent_scratchpad=format_to_tool_messages([(action, observation)])
+    )
+    return sum(
+        count_tokens(message.content) + sum(count_tokens(json.dumps(tool_call["args"])) for tool_call in getattr(message, "tool_calls", []))
+        for message in messages
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recording", required=True, help="Recording made with workflow_latency.py --record")
+    args = parser.parse_args()
+
+    recording = replay.load_recording(args.recording)
+    app = create_workflow(parallel_evaluation=False, fast_path=False, multi_query=False).compile()
+
+    # Only the recorded responses matter here, not their latency
+    for entry in recording.values():
+        entry["retrieval"]["latency"] = 0.0
+        for calls in entry["llm"].values():
+            for call in calls:
+                call["latency"] = 0.0
+
+    totals = {"full": 0, "compact": 0}
+    print(f"{'query':<60} {'full':>8} {'compact':>8} {'saved':>8}")
+    for query in recording:
+        replay.patch_llm(replay.replay_llm(recording, query))
+        replay.patch_retriever(replay.replay_retriever(recording, query))
+        output = app.invoke(initial_state(query))
+
+        full = final_prompt_tokens(query, output)
+        compact = final_prompt_tokens(query, tool_output(output, compact=True))
+        totals["full"] += full
+        totals["compact"] += compact
+        print(f"{query[:60]:<60} {full:>8} {compact:>8} {full - compact:>8}")
+
+    count = len(recording)
+    print(f"{'mean':<60} {totals['full'] / count:>8.0f} {totals['compact'] / count:>8.0f} "
+          f"{(totals['full'] - totals['compact']) / count:>8.0f}")
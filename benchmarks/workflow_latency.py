@@ -0,0 +1,77 @@
+"""
+Compares the per-query wall-clock time of the sequential and parallel-judge workflows.
+
+Record responses once against the live services, then replay them offline:
+
+    python benchmarks/workflow_latency.py --record --recording recording.json \
+        --query "What are the symptoms of vitamin B12 deficiency?"
+    python benchmarks/workflow_latency.py --recording recording.json
+
+Recordings hold one retrieval per query, so both workflows expand a single query.
+"""
+import time
+import argparse
+import statistics
+
+import replay
+
+from agent.tool import initial_state
+from agent.workflow import create_workflow
+
+
+def record(queries: list[str], path: str):
+    from config import get_llm
+    from utils.retrieve import get_retriever
+
+    llm, retriever = get_llm(), get_retriever()
+
+    recording = {}
+    for query in queries:
+        calls, retrieval = {}, {}
+        replay.patch_llm(replay.recording_llm(llm, calls))
+        replay.patch_retriever(replay.recording_retriever(retriever, retrieval))
+
+        # Record the sequential flow so that every judge call is captured
+        create_workflow(parallel_evaluation=False, fast_path=False, multi_query=False).compile().invoke(initial_state(query))
+        recording[query] = {"llm": calls, "retrieval": retrieval}
+
+    replay.save_recording(path, recording)
+    print(f"Recorded {len(queries)} queries to {path}")
+
+
+def run(recording: dict, runs: int):
+    apps = {
+        "sequential": create_workflow(parallel_evaluation=False, fast_path=False, multi_query=False).compile(),
+        "parallel": create_workflow(parallel_evaluation=True, fast_path=False, multi_query=False).compile()
+    }
+
+    print(f"{'query':<60} {'sequential (s)':>15} {'parallel (s)':>13} {'saved (s)':>10}")
+    for query in recording:
+        timings = {}
+        for mode, app in apps.items():
+            samples = []
+            for _ in range(runs):
+                replay.patch_llm(replay.replay_llm(recording, query))
+                replay.patch_retriever(replay.replay_retriever(recording, query))
+
+                start = time.perf_counter()
+                app.invoke(initial_state(query))
+                samples.append(time.perf_counter() - start)
+            timings[mode] = statistics.median(samples)
+
+        saved = timings["sequential"] - timings["parallel"]
+        print(f"{query[:60]:<60} {timings['sequential']:>15.2f} {timings['parallel']:>13.2f} {saved:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recording", required=True, help="Path of the recorded responses (JSON)")
+    parser.add_argument("--record", action="store_true", help="Record live responses instead of replaying")
+    parser.add_argument("--query", action="append", default=[], help="Query to record (repeatable)")
+    parser.add_argument("--runs", type=int, default=3, help="Replays per query and workflow")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.query, args.recording)
+    else:
+        run(replay.load_recording(args.recording), args.runs)
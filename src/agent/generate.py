@@ -1,13 +1,39 @@
+import re
+
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from config import llm
-from utils.prompts import (GENERATE, 
-                           EXPANSION, 
-                           REFINEMENT, 
+from utils.llm_cache import (cached_llm,
+                             response_llm)
+from config import MULTI_QUERY_VARIANTS
+from utils.prompts import (GENERATE,
+                           EXPANSION,
+                           MULTI_QUERY,
+                           REFINEMENT,
                            RESPONSE_REFINEMENT)
 
 
+def craft_response_chain():
+    """
+    Builds the chain that generates a response from the query and the retrieved context.
+    """
+    response_prompt = ChatPromptTemplate.from_messages([
+        ("system", GENERATE["system"]),
+        ("user", GENERATE["query"])
+    ])
+
+    return response_prompt | response_llm()
+
+
+def craft_response_inputs(state: dict) -> dict:
+    return {
+        "history": state.get("history", ""),
+        "query": state['query'],
+        "context": "\n".join([doc["content"] for doc in state['context']]),
+        "feedback": state['query_feedback']
+    }
+
+
 def craft_response(state: dict) -> dict:
     """
     Generates a response using the retrieved context, focusing on nutrition disorders.
@@ -20,18 +46,21 @@ def craft_response(state: dict) -> dict:
     """
     print("-"*20, "craft_response", "-"*20)
 
-    response_prompt = ChatPromptTemplate.from_messages([
-        ("system", GENERATE["system"]),
-        ("user", GENERATE["query"])
-    ])
+    response = craft_response_chain().invoke(craft_response_inputs(state))
 
-    chain = response_prompt | llm
+    state["response"] = response
+    print(" Intermediate response:", response)
 
-    response = chain.invoke({
-        "query": state['query'],
-        "context": "\n".join([doc["content"] for doc in state['context']]),
-        "feedback": state['query_feedback']
-    })
+    return state
+
+
+async def acraft_response(state: dict) -> dict:
+    """
+    Async variant of `craft_response`.
+    """
+    print("-"*20, "craft_response", "-"*20)
+
+    response = await craft_response_chain().ainvoke(craft_response_inputs(state))
 
     state["response"] = response
     print(" Intermediate response:", response)
@@ -39,6 +68,18 @@ def craft_response(state: dict) -> dict:
     return state
 
 
+def expand_query_chain():
+    """
+    Builds the chain that expands the user query.
+    """
+    expand_prompt = ChatPromptTemplate.from_messages([
+        ("system", EXPANSION["system"]),
+        ("user", EXPANSION["query"])
+    ])
+
+    return expand_prompt | cached_llm("expand_query") | StrOutputParser()
+
+
 def expand_query(state):
     """
     Expands the user query to improve retrieval of nutrition disorder-related information.
@@ -50,14 +91,22 @@ def expand_query(state):
         dict: The updated state with the expanded query.
     """
     print("-"*20, "expand_query", "-"*20)
-    
-    expand_prompt = ChatPromptTemplate.from_messages([
-        ("system", EXPANSION["system"]),
-        ("user", EXPANSION["query"])
-    ])
 
-    chain = expand_prompt | llm | StrOutputParser()
-    expanded_query = chain.invoke({"query": state['query'], "query_feedback": state["query_feedback"]})
+    expanded_query = expand_query_chain().invoke({"query": state['query'], "query_feedback": state["query_feedback"]})
+
+    state["expanded_query"] = expanded_query
+    print(" expanded_query", expanded_query)
+
+    return state
+
+
+async def aexpand_query(state):
+    """
+    Async variant of `expand_query`.
+    """
+    print("-"*20, "expand_query", "-"*20)
+
+    expanded_query = await expand_query_chain().ainvoke({"query": state['query'], "query_feedback": state["query_feedback"]})
 
     state["expanded_query"] = expanded_query
     print(" expanded_query", expanded_query)
@@ -65,6 +114,82 @@ def expand_query(state):
     return state
 
 
+def expand_queries_chain():
+    """
+    Builds the chain that rewrites the user query as several search queries.
+    """
+    multi_query_prompt = ChatPromptTemplate.from_messages([
+        ("system", MULTI_QUERY["system"]),
+        ("user", MULTI_QUERY["query"])
+    ])
+
+    return multi_query_prompt | cached_llm("expand_queries") | StrOutputParser()
+
+
+def parse_queries(text: str, count: int) -> list[str]:
+    """
+    Splits the LLM output into at most `count` distinct queries, dropping any numbering or bullets.
+    """
+    queries = []
+    for line in text.splitlines():
+        query = re.sub(r"^\s*(\d+[.)]|[-*•])\s*", "", line).strip()
+        if query and query not in queries:
+            queries.append(query)
+
+    return queries[:count]
+
+
+def update_expanded_queries(state: dict, text: str) -> dict:
+    queries = parse_queries(text, MULTI_QUERY_VARIANTS)
+
+    # The variants stand for the expanded query in query refinement and the workflow output
+    state["expanded_queries"] = queries
+    state["expanded_query"] = "\n".join(queries)
+    print(" expanded_queries", queries)
+
+    return state
+
+
+def expand_queries(state: dict) -> dict:
+    """
+    Rewrites the user query as `MULTI_QUERY_VARIANTS` search queries in one LLM call.
+
+    Args:
+        state (dict): The current state of the workflow, containing the user query.
+
+    Returns:
+        dict: The updated state with the query variants.
+    """
+    print("-"*20, "expand_query", "-"*20)
+
+    text = expand_queries_chain().invoke({"query": state['query'], "query_feedback": state["query_feedback"], "count": MULTI_QUERY_VARIANTS})
+
+    return update_expanded_queries(state, text)
+
+
+async def aexpand_queries(state: dict) -> dict:
+    """
+    Async variant of `expand_queries`.
+    """
+    print("-"*20, "expand_query", "-"*20)
+
+    text = await expand_queries_chain().ainvoke({"query": state['query'], "query_feedback": state["query_feedback"], "count": MULTI_QUERY_VARIANTS})
+
+    return update_expanded_queries(state, text)
+
+
+def refine_query_chain():
+    """
+    Builds the chain that suggests improvements for the expanded query.
+    """
+    refine_query = ChatPromptTemplate.from_messages([
+        ("system", REFINEMENT["system"]),
+        ("user", REFINEMENT["query"])
+    ])
+
+    return refine_query | cached_llm("refine_query") | StrOutputParser()
+
+
 def refine_query(state: dict) -> dict:
     """
     Suggests improvements for the expanded query.
@@ -76,23 +201,47 @@ def refine_query(state: dict) -> dict:
         dict: The updated state with query refinement suggestions.
     """
     print("-"*20, "refine_query", "-"*20)
-    
-    refine_query = ChatPromptTemplate.from_messages([
-        ("system", REFINEMENT["system"]),
-        ("user", REFINEMENT["query"])
-    ])
 
-    chain = refine_query | llm | StrOutputParser()
+    suggestions = refine_query_chain().invoke({'query': state['query'], 'expanded_query': state['expanded_query']})
 
     # Store refinement suggestions without modifying the original expanded query
-    query_feedback = f"Previous Expanded Query: {state['expanded_query']}\nSuggestions: {chain.invoke({'query': state['query'], 'expanded_query': state['expanded_query']})}"
-    
+    query_feedback = f"Previous Expanded Query: {state['expanded_query']}\nSuggestions: {suggestions}"
+
     state["query_feedback"] = query_feedback
     print(" query_feedback:", query_feedback)
 
     return state
 
 
+async def arefine_query(state: dict) -> dict:
+    """
+    Async variant of `refine_query`.
+    """
+    print("-"*20, "refine_query", "-"*20)
+
+    suggestions = await refine_query_chain().ainvoke({'query': state['query'], 'expanded_query': state['expanded_query']})
+
+    # Store refinement suggestions without modifying the original expanded query
+    query_feedback = f"Previous Expanded Query: {state['expanded_query']}\nSuggestions: {suggestions}"
+
+    state["query_feedback"] = query_feedback
+    print(" query_feedback:", query_feedback)
+
+    return state
+
+
+def refine_response_chain():
+    """
+    Builds the chain that suggests improvements for the generated response.
+    """
+    refine_response_prompt = ChatPromptTemplate.from_messages([
+        ("system", RESPONSE_REFINEMENT["system"]),
+        ("user", RESPONSE_REFINEMENT["query"])
+    ])
+
+    return refine_response_prompt | cached_llm("refine_response") | StrOutputParser()
+
+
 def refine_response(state: dict) -> dict:
     """
     Suggests improvements for the generated response.
@@ -105,16 +254,28 @@ def refine_response(state: dict) -> dict:
     """
     print("-"*20, "refine_response", "-"*20)
 
-    refine_response_prompt = ChatPromptTemplate.from_messages([
-        ("system", RESPONSE_REFINEMENT["system"]),
-        ("user", RESPONSE_REFINEMENT["query"])
-    ])
+    suggestions = refine_response_chain().invoke({'query': state['query'], 'response': state['response']})
 
-    chain = refine_response_prompt | llm | StrOutputParser()
+    # Store response suggestions in a structured format
+    feedback = f"Previous Response: {state['response']}\nSuggestions: {suggestions}"
+
+    state['feedback'] = feedback
+    print(" feedback: ", feedback)
+
+    return state
+
+
+async def arefine_response(state: dict) -> dict:
+    """
+    Async variant of `refine_response`.
+    """
+    print("-"*20, "refine_response", "-"*20)
+
+    suggestions = await refine_response_chain().ainvoke({'query': state['query'], 'response': state['response']})
 
     # Store response suggestions in a structured format
-    feedback = f"Previous Response: {state['response']}\nSuggestions: {chain.invoke({'query': state['query'], 'response': state['response']})}"
-    
+    feedback = f"Previous Response: {state['response']}\nSuggestions: {suggestions}"
+
     state['feedback'] = feedback
     print(" feedback: ", feedback)
 
@@ -1,49 +1,135 @@
+import time
+import queue
+import asyncio
+import threading
 from datetime import datetime
-from mem0 import MemoryClient
+from contextlib import nullcontext
+from typing import Iterator, Optional
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.agents import (AgentExecutor, 
                               create_tool_calling_agent)
 
 from utils.prompts import AGENT
+from utils.lazy import singleton
+from utils.http import http_client
+from utils.history_cache import HistoryCache
+from utils.memory_writer import MemoryWriter
+from utils.embedding_cache import get_cached_embedding_model
+from utils.streaming import StreamingHandler
 from config import (MEM0_API_KEY, 
                     OPENAI_API_KEY, 
-                    OPENAI_API_BASE)
-from agent.tool import agentic_rag
+                    OPENAI_API_BASE, 
+                    HISTORY_CACHE_TTL,
+                    HISTORY_CACHE_ENABLED,
+                    DIRECT_WORKFLOW_ENABLED,
+                    HISTORY_CACHE_MAX_USERS,
+                    MEMORY_WRITER_BACKOFF,
+                    MEMORY_WRITER_ENABLED,
+                    MEMORY_WRITER_BATCH_SIZE,
+                    MEMORY_WRITER_QUEUE_SIZE,
+                    MEMORY_WRITER_MAX_RETRIES)
+from agent.routing import needs_agent
+from agent.tool import (agentic_rag,
+                        run_workflow,
+                        arun_workflow,
+                        response_text)
+from agent.speculation import Speculation
+
+
+@singleton
+def get_memory_client():
+    """
+    Returns the shared mem0 client that stores and retrieves customer interactions.
+    """
+    from mem0 import MemoryClient
+
+    return MemoryClient(api_key=MEM0_API_KEY, client=http_client(timeout=300))
+
+
+@singleton
+def get_async_memory_client():
+    """
+    Returns the shared async mem0 client.
+    """
+    from mem0 import AsyncMemoryClient
+
+    return AsyncMemoryClient(api_key=MEM0_API_KEY)
+
+
+@singleton
+def get_agent_executor() -> AgentExecutor:
+    """
+    Returns the shared agent executor. It keeps no per-user state, so every bot can use it.
+    """
+
+    # Initialize the OpenAI client using the provided credentials
+    client = ChatOpenAI(
+        model_name="gpt-4o-mini",
+        openai_api_key=OPENAI_API_KEY,
+        openai_api_base=OPENAI_API_BASE,
+        temperature=0,
+        http_client=http_client()
+    )
+
+    # Define tools available to the chatbot, such as web search
+    tools = [agentic_rag]
+
+    # Build the prompt template for the agent
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", AGENT["system"]),                        # System instructions
+        ("human", "{input}"),                               # Placeholder for human input
+        ("placeholder", "{agent_scratchpad}")               # Placeholder for intermediate reasoning steps
+    ])
+
+    # Create an agent capable of interacting with tools and executing tasks
+    agent = create_tool_calling_agent(client, tools, prompt)
+
+    # Wrap the agent in an executor to manage tool interactions and execution flow
+    return AgentExecutor(agent=agent, tools=tools, verbose=True)
 
 
 class NutritionBot:
     def __init__(self):
         """
-        Initialize the NutritionBot class, setting up memory, the LLM client, tools, and the agent executor.
+        Initialize the NutritionBot class with the shared memory clients and agent executor.
         """
 
-        # Initialize a memory client to store and retrieve customer interactions
-        self.memory = MemoryClient(api_key=MEM0_API_KEY)
+        # Memory client to store and retrieve customer interactions; the async one is built on first use
+        self.memory = get_memory_client()
 
-        # Initialize the OpenAI client using the provided credentials
-        self.client = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=OPENAI_API_KEY,
-            openai_api_base=OPENAI_API_BASE,
-            temperature=0
-        )
+        # Search the history of returning users locally instead of calling mem0 on every turn
+        self.history_cache = HistoryCache(
+            self.memory,
+            get_async_memory_client,
+            get_cached_embedding_model(),
+            ttl=HISTORY_CACHE_TTL,
+            limit=5,
+            max_users=HISTORY_CACHE_MAX_USERS
+        ) if HISTORY_CACHE_ENABLED else None
 
-        # Define tools available to the chatbot, such as web search
-        tools = [agentic_rag]
+        # Write interactions in the background so responses don't wait on mem0,
+        # telling the history cache once they have been written
+        self.memory_writer = MemoryWriter(
+            self.memory,
+            max_queue_size=MEMORY_WRITER_QUEUE_SIZE,
+            batch_size=MEMORY_WRITER_BATCH_SIZE,
+            max_retries=MEMORY_WRITER_MAX_RETRIES,
+            backoff=MEMORY_WRITER_BACKOFF,
+            on_done=self.history_cache.confirm if self.history_cache is not None else None
+        ) if MEMORY_WRITER_ENABLED else None
 
-        # Build the prompt template for the agent
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", AGENT["system"]),                        # System instructions
-            ("human", "{input}"),                               # Placeholder for human input
-            ("placeholder", "{agent_scratchpad}")               # Placeholder for intermediate reasoning steps
-        ])
+        # Agent executor shared by every bot in the process
+        self.agent_executor = get_agent_executor()
 
-        # Create an agent capable of interacting with tools and executing tasks
-        agent = create_tool_calling_agent(self.client, tools, prompt)
 
-        # Wrap the agent in an executor to manage tool interactions and execution flow
-        self.agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    @property
+    def async_memory(self):
+        """
+        The shared async mem0 client. Its constructor validates the API key over the network,
+        so it is only built once the async path is used.
+        """
+        return get_async_memory_client()
 
 
     def store_customer_interaction(self, user_id: str, message: str, response: str, metadata: dict = None):
@@ -56,6 +142,69 @@ class NutritionBot:
             response (str): Chatbot's response.
             metadata (dict, optional): Additional metadata for the interaction.
         """
+        conversation, metadata = self.format_interaction(message, response, metadata)
+
+        # Make the interaction searchable right away, before mem0 has processed it
+        if self.history_cache is not None:
+            self.history_cache.add(user_id, conversation, metadata)
+
+        # Queue the interaction for the background writer, which confirms it to the history cache
+        if self.memory_writer is not None:
+            if not self.memory_writer.submit(user_id, conversation, metadata):
+                self.confirm_interaction(user_id)
+            return
+
+        # Store the interaction in the memory client
+        try:
+            self.memory.add(
+                conversation,
+                user_id=user_id,
+                output_format="v1.1",
+                metadata=metadata
+            )
+        finally:
+            self.confirm_interaction(user_id)
+
+
+    async def astore_customer_interaction(self, user_id: str, message: str, response: str, metadata: dict = None):
+        """
+        Async variant of `store_customer_interaction`.
+        """
+        conversation, metadata = self.format_interaction(message, response, metadata)
+
+        if self.history_cache is not None:
+            self.history_cache.add(user_id, conversation, metadata)
+
+        # Wait for room on a full queue off the event loop, up to the writer's enqueue timeout
+        if self.memory_writer is not None:
+            if not await asyncio.to_thread(self.memory_writer.submit, user_id, conversation, metadata):
+                self.confirm_interaction(user_id)
+            return
+
+        try:
+            await self.async_memory.add(
+                conversation,
+                user_id=user_id,
+                output_format="v1.1",
+                metadata=metadata
+            )
+        finally:
+            self.confirm_interaction(user_id)
+
+
+    def confirm_interaction(self, user_id: str):
+        """
+        Tells the history cache that an interaction was written to mem0, or will never be.
+        """
+        if self.history_cache is not None:
+            self.history_cache.confirm(user_id)
+
+
+    @staticmethod
+    def format_interaction(message: str, response: str, metadata: dict = None) -> tuple[list[dict], dict]:
+        """
+        Format an interaction and its metadata for storage.
+        """
         if metadata is None:
             metadata = {}
 
@@ -68,13 +217,7 @@ class NutritionBot:
             {"role": "assistant", "content": response}
         ]
 
-        # Store the interaction in the memory client
-        self.memory.add(
-            conversation,
-            user_id=user_id,
-            output_format="v1.1",
-            metadata=metadata
-        )
+        return conversation, metadata
 
 
     def get_relevant_history(self, user_id: str, query: str) -> list[dict]:
@@ -88,6 +231,9 @@ class NutritionBot:
         Returns:
             list[dict]: A list of relevant past interactions.
         """
+        if self.history_cache is not None:
+            return self.history_cache.search(user_id, query)
+
         return self.memory.search(
             query=query,            # Search for interactions related to the query
             user_id=user_id,        # Restrict search to the specific user
@@ -95,44 +241,231 @@ class NutritionBot:
         )
 
 
-    def handle_customer_query(self, user_id: str, query: str) -> str:
+    async def aget_relevant_history(self, user_id: str, query: str) -> list[dict]:
         """
-        Process a customer's query and provide a response, taking into account past interactions.
+        Async variant of `get_relevant_history`.
+        """
+        if self.history_cache is not None:
+            return await self.history_cache.asearch(user_id, query)
+
+        return await self.async_memory.search(
+            query=query,
+            user_id=user_id,
+            limit=5
+        )
+
+
+    def speculate(self, user_id: str, query: str) -> Speculation:
+        """
+        Start the guardrail check, history lookup and first workflow stage for a query in parallel.
 
         Args:
             user_id (str): Unique identifier for the customer.
             query (str): Customer's query.
 
         Returns:
-            str: Chatbot's response.
+            Speculation: The speculative work; check `is_allowed()` before handling the query with it.
+        """
+        return Speculation(user_id, query, self.get_relevant_history)
+
+
+    def lookup_history(self, user_id: str, query: str, speculation: Optional[Speculation] = None) -> list[dict]:
+        """
+        Retrieve the relevant past interactions, from the speculative lookup when one was started.
+        """
+        if speculation is not None:
+            return speculation.history.result()
+
+        return self.get_relevant_history(user_id, query)
+
+
+    def build_agent_prompt(self, user_id: str, query: str, speculation: Optional[Speculation] = None) -> str:
+        """
+        Build the agent prompt from the current query and the relevant past interactions.
+
+        Args:
+            user_id (str): Unique identifier for the customer.
+            query (str): Customer's query.
+            speculation (Speculation, optional): Speculative work holding the history lookup.
+
+        Returns:
+            str: The prompt for the agent.
         """
 
         # Retrieve relevant past interactions for context
-        relevant_history = self.get_relevant_history(user_id, query)
+        return self.format_agent_prompt(query, self.lookup_history(user_id, query, speculation))
 
-        # Build a context string from the relevant history
+
+    @staticmethod
+    def format_history(relevant_history: list[dict]) -> str:
+        """
+        Format the relevant past interactions as a context string.
+        """
         context = "Previous relevant interactions:\n"
         for memory in relevant_history:
             context += f"Customer: {memory['memory']}\n"    # Customer's past messages
             context += f"Support: {memory['memory']}\n"     # Chatbot's past responses
             context += "---\n"
 
+        return context
+
+
+    @classmethod
+    def format_agent_prompt(cls, query: str, relevant_history: list[dict]) -> str:
+        """
+        Format the agent prompt from the current query and the relevant past interactions.
+        """
+
+        # Build a context string from the relevant history
+        context = cls.format_history(relevant_history)
+
         print("CONTEXT: ", context)
 
         # Prepare a prompt combining past context and the current query
-        prompt = AGENT["query"].format(context=context, query=query)
+        return AGENT["query"].format(context=context, query=query)
+
 
-        # Generate a response using the agent
-        response = self.agent_executor.invoke({"input": prompt})
+    @staticmethod
+    def uses_workflow(query: str) -> bool:
+        """
+        Whether to answer with the RAG workflow directly, saving the agent's tool call and rewrite.
+        """
+        return DIRECT_WORKFLOW_ENABLED and not needs_agent(query)
+
+
+    @classmethod
+    def workflow_history(cls, relevant_history: list[dict]) -> str:
+        # Given to the response prompt ahead of the query
+        return cls.format_history(relevant_history) + "\n" if relevant_history else ""
+
+
+    def handle_customer_query(self, user_id: str, query: str, speculation: Optional[Speculation] = None) -> str:
+        """
+        Process a customer's query and provide a response, taking into account past interactions.
+
+        Args:
+            user_id (str): Unique identifier for the customer.
+            query (str): Customer's query.
+            speculation (Speculation, optional): Speculative work started with `speculate`.
+
+        Returns:
+            str: Chatbot's response.
+        """
+        relevant_history = self.lookup_history(user_id, query, speculation)
+
+        with speculation.retrieval_context() if speculation else nullcontext():
+            if self.uses_workflow(query):
+                # Answer with the validated response of the workflow
+                response = response_text(run_workflow(query, self.workflow_history(relevant_history)))
+            else:
+                # Generate a response using the agent
+                response = self.agent_executor.invoke({"input": self.format_agent_prompt(query, relevant_history)})["output"]
 
         # Store the current interaction for future reference
         self.store_customer_interaction(
             user_id=user_id,
             message=query,
-            response=response["output"],
+            response=response,
             metadata={"type": "support_query"}
         )
 
         # Return the chatbot's response
-        return response['output']
-    
\ No newline at end of file
+        return response
+
+
+    async def ahandle_customer_query(self, user_id: str, query: str, speculation: Optional[Speculation] = None) -> str:
+        """
+        Async variant of `handle_customer_query`, so one worker can serve many concurrent users.
+
+        Args:
+            user_id (str): Unique identifier for the customer.
+            query (str): Customer's query.
+            speculation (Speculation, optional): Speculative work started with `speculate`.
+
+        Returns:
+            str: Chatbot's response.
+        """
+        if speculation is not None:
+            relevant_history = await asyncio.wrap_future(speculation.history)
+        else:
+            relevant_history = await self.aget_relevant_history(user_id, query)
+
+        with speculation.retrieval_context() if speculation else nullcontext():
+            if self.uses_workflow(query):
+                response = response_text(await arun_workflow(query, self.workflow_history(relevant_history)))
+            else:
+                # Generate a response using the agent (the agentic_rag tool runs the workflow with ainvoke)
+                response = (await self.agent_executor.ainvoke({"input": self.format_agent_prompt(query, relevant_history)}))["output"]
+
+        await self.astore_customer_interaction(
+            user_id=user_id,
+            message=query,
+            response=response,
+            metadata={"type": "support_query"}
+        )
+
+        return response
+
+
+    def stream_customer_query(self, user_id: str, query: str, speculation: Optional[Speculation] = None) -> Iterator[dict]:
+        """
+        Process a customer's query like `handle_customer_query`, streaming progress as it happens.
+
+        Args:
+            user_id (str): Unique identifier for the customer.
+            query (str): Customer's query.
+            speculation (Speculation, optional): Speculative work started with `speculate`.
+
+        Yields:
+            dict: Events with a "type" of "stage" (workflow progress), "token" (part of the
+                response being crafted), "reset" (the draft streamed so far was rejected by
+                the judges), "response" (the complete final response, replacing the tokens
+                streamed so far) or, last, "metrics" (with the time to first token in seconds).
+        """
+        start = time.perf_counter()
+        events = queue.Queue()
+        result = {}
+
+        def run_agent():
+            try:
+                relevant_history = self.lookup_history(user_id, query, speculation)
+                config = {"callbacks": [StreamingHandler(events)]}
+                with speculation.retrieval_context() if speculation else nullcontext():
+                    if self.uses_workflow(query):
+                        # The tokens of craft_response are streamed as on the agent path, without the agent's rewrite
+                        result["response"] = response_text(run_workflow(query, self.workflow_history(relevant_history), config))
+                    else:
+                        result["response"] = self.agent_executor.invoke(
+                            {"input": self.format_agent_prompt(query, relevant_history)},
+                            config=config
+                        )["output"]
+
+                # Tokens come from craft_response, which the agent rewrites in its answer. A semantic
+                # cache hit or the fallback after the last refinement loop streams no tokens at all
+                events.put({"type": "response", "content": result["response"]})
+            except Exception as e:
+                result["error"] = e
+            finally:
+                events.put(None)
+
+        threading.Thread(target=run_agent, daemon=True).start()
+
+        time_to_first_token = None
+        while (event := events.get()) is not None:
+            if event["type"] in ("token", "response") and time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+                print(f"TIME TO FIRST TOKEN: {time_to_first_token:.2f}s")
+            yield event
+
+        if "error" in result:
+            raise result["error"]
+
+        # Store the current interaction for future reference
+        self.store_customer_interaction(
+            user_id=user_id,
+            message=query,
+            response=result["response"],
+            metadata={"type": "support_query"}
+        )
+
+        yield {"type": "metrics", "time_to_first_token": time_to_first_token, "total_time": time.perf_counter() - start}
@@ -0,0 +1,136 @@
+import re
+import threading
+from collections import defaultdict
+
+from utils.retrieve import (get_retriever,
+                            context_from_documents)
+from config import (FAST_PATH_THRESHOLD,
+                    FAST_PATH_DIRECT_THRESHOLD)
+
+
+# Paths a query can take through the workflow
+FULL_PATH = "full"                      # Expansion, retrieval, response and the judge loop
+SKIP_EXPANSION_PATH = "skip_expansion"  # Retrieval with the raw query, then response and the judge loop
+DIRECT_PATH = "direct"                  # Retrieval with the raw query and a single response
+
+
+# Turns answered by the tool-calling agent rather than the workflow: small talk, and
+# questions about the conversation itself, which call for the history rather than the documents
+SMALL_TALK = re.compile(r"^\W*(hi|hello|hey|good (morning|afternoon|evening)|thanks?( you)?|thank you( so much| very much)?|"
+                        r"ok(ay)?|great|cool|bye|goodbye|see you)\b[\w\s]{0,20}\W*$", re.IGNORECASE)
+CONVERSATION = re.compile(r"\b(you (said|told|mentioned|recommended|suggested)|i (said|told|asked|mentioned)|"
+                          r"(last|previous|earlier) (time|conversation|chat|answer|question)|remind me|my name|"
+                          r"what did (i|you)|we (talked|discussed|spoke))\b", re.IGNORECASE)
+
+
+def needs_agent(query: str) -> bool:
+    """
+    Decides whether a customer turn goes to the tool-calling agent, without calling an LLM.
+
+    Knowledge questions are answered by the RAG workflow directly; the agent is kept for
+    small talk and for questions about past interactions.
+    """
+    return bool(SMALL_TALK.match(query) or CONVERSATION.search(query))
+
+
+def select_path(score: float) -> str:
+    """
+    Chooses the path of a query from the similarity of its best retrieval hit.
+    """
+    if score >= FAST_PATH_DIRECT_THRESHOLD:
+        return DIRECT_PATH
+    if score >= FAST_PATH_THRESHOLD:
+        return SKIP_EXPANSION_PATH
+    return FULL_PATH
+
+
+def update_probe(state: dict, docs: list) -> dict:
+    # Diversification may reorder the hits, so the best one is not necessarily first
+    score = max((doc.metadata.get("score", 0.0) for doc in docs), default=0.0)
+    path = select_path(score)
+
+    state["retrieval_score"] = score
+    state["fast_path"] = path
+    print(f" Top retrieval score {score:.3f}. Taking the {path} path.")
+
+    # The full path retrieves again with the expanded query
+    if path != FULL_PATH:
+        state["context"] = context_from_documents(docs)
+
+    return state
+
+
+def probe_retrieval(state: dict) -> dict:
+    """
+    Retrieves with the raw query to decide whether the query can take a fast path.
+
+    When the best hit is close enough to a stored question, its context is kept and
+    expansion is skipped; above the direct threshold the judge loop is skipped too.
+
+    Args:
+        state (dict): The current state of the workflow, containing the user query.
+
+    Returns:
+        dict: The updated state with the top score, the chosen path and, on a fast path, the context.
+    """
+    print("-"*20, "probe_retrieval", "-"*20)
+
+    return update_probe(state, get_retriever().invoke(state["query"]))
+
+
+async def aprobe_retrieval(state: dict) -> dict:
+    """
+    Async variant of `probe_retrieval`.
+    """
+    print("-"*20, "probe_retrieval", "-"*20)
+
+    return update_probe(state, await get_retriever().ainvoke(state["query"]))
+
+
+def route_probe(state: dict) -> str:
+    """
+    Decide whether to expand the query or answer from the probed context.
+    """
+    if state["fast_path"] == FULL_PATH:
+        return "expand_query"
+    return "craft_response"
+
+
+def is_direct(state: dict) -> bool:
+    return state.get("fast_path") == DIRECT_PATH
+
+
+class PathStats:
+    """
+    Counts the queries taking each path and their workflow latency.
+
+    The latency saved by a fast path is estimated against the mean latency of the
+    full path, so it is only reported once full-path queries have been observed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+
+    def record(self, path: str, elapsed: float):
+        with self.lock:
+            self.counts[path] += 1
+            self.seconds[path] += elapsed
+        print(f" {path} path took {elapsed:.2f}s. {self.summary()}")
+
+
+    def summary(self) -> str:
+        with self.lock:
+            counts = dict(self.counts)
+            means = {path: self.seconds[path] / count for path, count in counts.items()}
+
+        text = "Paths taken: " + ", ".join(f"{path}={count}" for path, count in sorted(counts.items()))
+        if FULL_PATH in means:
+            saved = sum((means[FULL_PATH] - means[path]) * counts[path] for path in counts if path != FULL_PATH)
+            text += f". Estimated time saved: {saved:.1f}s"
+        return text
+
+
+path_stats = PathStats()
@@ -0,0 +1,70 @@
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SPECULATION_WORKERS
+from agent.tool import (prefetch_retrieval,
+                        speculative_retrieval)
+from utils.guardrail import (is_input_allowed,
+                             filter_input_with_llama_guard)
+
+
+# Thread pool shared by all speculative requests
+executor = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculation")
+
+
+class Speculation:
+    """
+    Starts the guardrail check, the history lookup and the first workflow stage
+    (query expansion and retrieval) of a query at the same time.
+
+    The history and retrieval results are only used once the guardrail allows the
+    input; otherwise the speculative work is cancelled and its results discarded.
+    """
+
+    def __init__(self, user_id: str, query: str, get_relevant_history):
+        """
+        Args:
+            user_id (str): Unique identifier for the customer.
+            query (str): Customer's query.
+            get_relevant_history: Callable returning the relevant past interactions for (user_id, query).
+        """
+        self.query = query
+        self.cancelled = threading.Event()
+
+        self.guard = executor.submit(filter_input_with_llama_guard, query)
+        self.history = executor.submit(get_relevant_history, user_id, query)
+        self.retrieval = executor.submit(prefetch_retrieval, query, self.cancelled)
+
+
+    def is_allowed(self) -> bool:
+        """
+        Waits for the guardrail and cancels the speculative work if the input is disallowed.
+        """
+        allowed = is_input_allowed(self.guard.result())
+        if not allowed:
+            print(" Input disallowed. Cancelling speculative work.")
+            self.cancel()
+
+        return allowed
+
+
+    def cancel(self):
+        """
+        Cancels pending speculative work; running work stops at the next stage boundary.
+        """
+        self.cancelled.set()
+        self.history.cancel()
+        self.retrieval.cancel()
+
+
+    @contextmanager
+    def retrieval_context(self):
+        """
+        Makes the speculative retrieval available to the agentic_rag tool within the block.
+        """
+        token = speculative_retrieval.set((self.query, self.retrieval))
+        try:
+            yield
+        finally:
+            speculative_retrieval.reset(token)
@@ -1,34 +1,303 @@
-from langchain_core.tools import tool
+import os
+import time
+import asyncio
+import threading
+from typing import Optional
+from contextvars import ContextVar
+from langchain_core.tools import StructuredTool
 
-from agent.workflow import WORKFLOW_APP
+from agent.workflow import get_workflow_app
+from agent.generate import (expand_query,
+                            expand_queries)
+from agent.routing import (FULL_PATH,
+                           path_stats)
+from utils.retrieve import (get_retriever,
+                            retrieve_context,
+                            retrieve_multi_context)
+from utils.lazy import singleton
+from utils.semantic_cache import SemanticCache
+from utils.embedding_cache import get_cached_embedding_model
+from config import (STORE_DIRECTORY,
+                    SEMANTIC_CACHE_TTL,
+                    SEMANTIC_CACHE_PATH,
+                    SEMANTIC_CACHE_ENABLED,
+                    TOOL_OUTPUT_COMPACT,
+                    MULTI_QUERY_ENABLED,
+                    SEMANTIC_CACHE_THRESHOLD,
+                    SEMANTIC_CACHE_MAX_ENTRIES)
 
 
-@tool
-def agentic_rag(query: str):
+# Speculative retrieval started for the current request, as (user query, future of the prefetched state)
+speculative_retrieval = ContextVar("speculative_retrieval", default=None)
+
+
+@singleton
+def get_semantic_cache() -> Optional[SemanticCache]:
     """
-    Runs the RAG-based agent with conversation history for context-aware responses.
+    Returns the semantic cache of validated responses, or None when it is disabled.
+    """
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
 
-    Args:
-        query (str): The current user query.
+    return SemanticCache(
+        path=SEMANTIC_CACHE_PATH,
+        embeddings=get_cached_embedding_model(),
+        store_directory=STORE_DIRECTORY,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        ttl=SEMANTIC_CACHE_TTL,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+    )
 
-    Returns:
-        dict[str, Any]: The updated state with the generated response and conversation history.
+
+def is_validated(output: dict) -> bool:
+    """
+    Checks whether a workflow output passed both the groundedness and precision gates.
+
+    Responses of the direct path are not judged, so their scores are None and they never validate.
+    """
+    scores = [output["groundedness_score"], output["precision_score"]]
+    return all(score is not None and score >= 4.0 for score in scores)
+
+
+def response_text(output: dict) -> str:
+    # craft_response stores the AI message, cached outputs its content
+    response = output["response"]
+    return getattr(response, "content", response)
+
+
+def cacheable_output(output: dict) -> dict:
+    """
+    Selects the JSON-serializable parts of a validated workflow output.
+    """
+    return {
+        "query": output["query"],
+        "expanded_query": output["expanded_query"],
+        "context": output["context"],
+        "response": response_text(output),
+        "precision_score": output["precision_score"],
+        "groundedness_score": output["groundedness_score"]
+    }
+
+
+def citations(context: list[dict]) -> list[str]:
     """
-    # Initialize state with necessary parameters
-    inputs = {
+    Formats the sources of the retrieved context as short citations, such as "Nutritional Disorders.pdf, p. 12".
+    """
+    sources = []
+    for doc in context:
+        metadata = doc.get("metadata", {})
+        if "source" not in metadata:
+            continue
+
+        # Text pages are numbered from 0 and table pages from 1
+        page = metadata.get("page")
+        if page is not None and metadata.get("type") != "table":
+            page += 1
+
+        citation = os.path.basename(metadata["source"]) + (f", p. {page}" if page is not None else "")
+        if citation not in sources:
+            sources.append(citation)
+
+    return sources
+
+
+def tool_output(output: dict, compact: bool = TOOL_OUTPUT_COMPACT) -> dict:
+    """
+    Projects a workflow output onto what the agent needs to answer: the response and its sources.
+
+    The agent's scratchpad is sent back to the LLM on its final turn, so the retrieved
+    passages, feedback and scores of the full state would only inflate that prompt.
+    """
+    if not compact:
+        return output
+
+    return {"response": response_text(output), "sources": citations(output["context"])}
+
+
+def initial_state(query: str) -> dict:
+    """
+    Builds the initial workflow state for a query.
+    """
+    return {
         "query": query,                 # Current user query
         "expanded_query": "",           # Expanded version will be generated in the workflow
+        "expanded_queries": [],         # Query variants of multi-query retrieval
         "context": [],                  # Retrieved documents (initially empty)
         "response": "",                 # AI-generated response (to be filled by workflow)
-        "precision_score": 0.0,         # Initial precision score
-        "groundedness_score": 0.0,      # Initial groundedness score
+        "precision_score": None,        # Set by the precision judge, None if it doesn't run
+        "groundedness_score": None,     # Set by the groundedness judge, None if it doesn't run
         "groundedness_loop_count": 0,   # Start groundedness loop counter at 0
         "precision_loop_count": 0,      # Start precision loop counter at 0
         "feedback": "",                 # Initial feedback is empty
         "query_feedback": "",           # Initial query feedback is empty
-        "loop_max_iter": 3              # Maximum number of iterations for loops
+        "loop_max_iter": 3,             # Maximum number of iterations for loops
+        "retrieval_score": 0.0,         # Set by the retrieval probe of the fast path
+        "fast_path": "",                # Path chosen from the retrieval score
+        "history": "",                  # Relevant past interactions, set when called without the agent
+        "retrieval_queries": [],        # Expanded queries of the last retrieval
+        "retrieval_embeddings": [],     # Their embeddings, None for queries answered lexically
+        "retrieval_ids": [],            # Document ids of the last retrieval
+        "groundedness_key": "",         # Inputs of the last groundedness verdict
+        "node_seconds": {},             # Duration of the last run of skippable nodes
+        "skipped_nodes": [],            # Nodes skipped on refinement loops
+        "time_saved": 0.0               # Estimated seconds saved by skipping them
     }
 
-    output = WORKFLOW_APP.invoke(inputs)
+
+def prefetch_retrieval(query: str, cancelled: threading.Event) -> Optional[dict]:
+    """
+    Runs the first workflow stage (expansion and retrieval) ahead of the agent.
+
+    Args:
+        query (str): The user query.
+        cancelled (threading.Event): Set when the speculation is discarded, to skip retrieval.
+
+    Returns:
+        Optional[dict]: The workflow state with the retrieved context, or None if cancelled.
+    """
+    expand, retrieve = (expand_queries, retrieve_multi_context) if MULTI_QUERY_ENABLED else (expand_query, retrieve_context)
+
+    state = expand(initial_state(query))
+    if cancelled.is_set():
+        return None
+
+    return retrieve(state)
+
+
+def matching_speculation(query: str):
+    """
+    Returns the future of the speculative retrieval if it was started for the same query.
+    """
+    speculation = speculative_retrieval.get()
+    if speculation is None:
+        return None
+
+    speculative_query, future = speculation
+    if " ".join(speculative_query.lower().split()) != " ".join(query.lower().split()):
+        print(" Discarding speculative retrieval for a rephrased query.")
+        future.cancel()
+        return None
+
+    return future
+
+
+def speculative_state(query: str) -> dict:
+    """
+    Returns the speculatively prefetched state for the query, or a fresh initial state.
+    """
+    future = matching_speculation(query)
+    try:
+        state = future.result() if future is not None else None
+    except Exception as e:
+        print(f" Speculative retrieval failed: {e}")
+        state = None
+
+    return dict(state) if state else initial_state(query)
+
+
+async def aspeculative_state(query: str) -> dict:
+    """
+    Async variant of `speculative_state`.
+    """
+    future = matching_speculation(query)
+    try:
+        state = await asyncio.wrap_future(future) if future is not None else None
+    except Exception as e:
+        print(f" Speculative retrieval failed: {e}")
+        state = None
+
+    return dict(state) if state else initial_state(query)
+
+
+def run_workflow(query: str, history: str = "", config: Optional[dict] = None) -> dict:
+    """
+    Runs the RAG workflow for a query, returning a previously validated response for a near-duplicate query.
+
+    Args:
+        query (str): The user query.
+        history (str): Relevant past interactions to take into account in the response.
+        config (Optional[dict]): Runnable config of the workflow, such as its callbacks.
+
+    Returns:
+        dict[str, Any]: The final workflow state with the generated response.
+    """
+    # Responses taking the history into account hold the customer's details: never share them
+    semantic_cache = get_semantic_cache() if not history else None
+    if semantic_cache is not None:
+        # Short queries answered from the lexical index are matched on their text, without an embedding request
+        query_embedding = None if get_retriever().answers_lexically(query) else semantic_cache.embed(query)
+        cached_output = semantic_cache.lookup(query_embedding) if query_embedding is not None else semantic_cache.lookup_text(query)
+        if cached_output is not None:
+            return cached_output
+
+    state = speculative_state(query)
+    state["history"] = history
+
+    start = time.perf_counter()
+    output = get_workflow_app().invoke(state, config)
+    path_stats.record(output.get("fast_path") or FULL_PATH, time.perf_counter() - start)
+
+    # Only cache responses that passed both evaluation gates
+    if semantic_cache is not None and is_validated(output):
+        semantic_cache.store(query, query_embedding, cacheable_output(output))
+
+    return output
+
+
+async def arun_workflow(query: str, history: str = "", config: Optional[dict] = None) -> dict:
+    """
+    Async variant of `run_workflow`.
+    """
+    semantic_cache = get_semantic_cache() if not history else None
+    if semantic_cache is not None:
+        lexical = await asyncio.to_thread(get_retriever().answers_lexically, query)
+        query_embedding = None if lexical else await semantic_cache.aembed(query)
+        cached_output = semantic_cache.lookup(query_embedding) if query_embedding is not None else semantic_cache.lookup_text(query)
+        if cached_output is not None:
+            return cached_output
+
+    state = await aspeculative_state(query)
+    state["history"] = history
+
+    start = time.perf_counter()
+    output = await get_workflow_app().ainvoke(state, config)
+    path_stats.record(output.get("fast_path") or FULL_PATH, time.perf_counter() - start)
+
+    if semantic_cache is not None and is_validated(output):
+        semantic_cache.store(query, query_embedding, cacheable_output(output))
 
     return output
+
+
+def run_agentic_rag(query: str):
+    """
+    Runs the RAG-based agent with conversation history for context-aware responses.
+
+    Args:
+        query (str): The current user query.
+
+    Returns:
+        dict[str, Any]: The response and its sources, or the whole workflow state when `TOOL_OUTPUT_COMPACT` is off.
+    """
+    return tool_output(run_workflow(query))
+
+
+async def arun_agentic_rag(query: str):
+    """
+    Runs the RAG-based agent with conversation history for context-aware responses.
+
+    Args:
+        query (str): The current user query.
+
+    Returns:
+        dict[str, Any]: The response and its sources, or the whole workflow state when `TOOL_OUTPUT_COMPACT` is off.
+    """
+    return tool_output(await arun_workflow(query))
+
+
+# Expose the workflow as a tool that supports both `invoke` and `ainvoke`
+agentic_rag = StructuredTool.from_function(
+    func=run_agentic_rag,
+    coroutine=arun_agentic_rag,
+    name="agentic_rag"
+)
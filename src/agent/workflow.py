@@ -1,12 +1,32 @@
-from typing import Any, Dict, List, TypedDict
+from typing import Any, Dict, List, Optional, TypedDict
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END, START
 
 from agent.generate import *
-from utils.retrieve import retrieve_context
+from utils.lazy import singleton
+from config import (FAST_PATH_ENABLED,
+                    MULTI_QUERY_ENABLED,
+                    PARALLEL_EVALUATION)
+from agent.routing import (is_direct,
+                           route_probe,
+                           probe_retrieval,
+                           aprobe_retrieval)
+from utils.retrieve import (retrieve_context, 
+                            aretrieve_context,
+                            retrieve_multi_context,
+                            aretrieve_multi_context)
 from evaluation.precision import (check_precision, 
+                                  acheck_precision, 
                                   should_continue_precision)
 from evaluation.groundedness import (score_groundedness, 
+                                     ascore_groundedness, 
                                      should_continue_groundedness)
+from evaluation.parallel import (join_evaluations, 
+                                 check_precision_branch, 
+                                 acheck_precision_branch, 
+                                 score_groundedness_branch, 
+                                 ascore_groundedness_branch, 
+                                 should_continue_evaluation)
 
 
 class AgentState(TypedDict):
@@ -16,39 +36,120 @@ class AgentState(TypedDict):
     """
     query: str                          # The current user query
     expanded_query: str                 # The expanded version of the user query
+    expanded_queries: List[str]         # Query variants searched together in multi-query mode
     context: List[Dict[str, Any]]       # Retrieved documents (content and metadata)
     response: str                       # The generated response to the user query
-    precision_score: float              # The precision score of the response
-    groundedness_score: float           # The groundedness score of the response
+    precision_score: Optional[float]    # The precision score of the response, None if not evaluated
+    groundedness_score: Optional[float] # The groundedness score of the response, None if not evaluated
     groundedness_loop_count: int        # Counter for groundedness refinement loops
     precision_loop_count: int           # Counter for precision refinement loops
     feedback: str                       # Feedback from the user
     query_feedback: str                 # Feedback specifically related to the query
     groundedness_check: bool            # Indicator for groundedness check
     loop_max_iter: int                  # Maximum iterations for loops
+    retrieval_score: float              # Similarity of the best hit for the raw query
+    fast_path: str                      # Path chosen from the retrieval score
+    history: str                        # Relevant past interactions of the customer, when called without the agent
+    retrieval_queries: List[str]        # Expanded queries of the last retrieval
+    retrieval_embeddings: List[Optional[List[float]]]  # Their embeddings, None for queries answered lexically
+    retrieval_ids: List[str]            # Ids of the documents of the last retrieval
+    groundedness_key: str               # Hash of the response and context of the last groundedness verdict
+    node_seconds: Dict[str, float]      # Duration of the last run of the nodes that can be skipped
+    skipped_nodes: List[str]            # Nodes skipped on refinement loops because their result still held
+    time_saved: float                   # Estimated seconds saved by the skipped nodes
 
 
-def create_workflow() -> StateGraph:
+def node(func, afunc) -> RunnableLambda:
+    """
+    Combines the sync and async implementation of a node, so the compiled graph
+    supports both `invoke` and `ainvoke`.
+    """
+    return RunnableLambda(func, afunc=afunc)
+
+
+def route_start(state: dict, fast_path: bool = False) -> str:
+    """
+    Skip expansion and retrieval when the state already carries speculatively retrieved context,
+    otherwise probe the retrieval scores first when the fast path is enabled.
+    """
+    if state["context"]:
+        print(" Using speculatively retrieved context.")
+        return "craft_response"
+    if fast_path:
+        return "probe_retrieval"
+    return "expand_query"
+
+
+def expansion_nodes(multi_query: bool) -> tuple[RunnableLambda, RunnableLambda]:
+    """
+    Returns the expansion and retrieval nodes, for a single expanded query or several query variants.
+    """
+    if multi_query:
+        return node(expand_queries, aexpand_queries), node(retrieve_multi_context, aretrieve_multi_context)
+    return node(expand_query, aexpand_query), node(retrieve_context, aretrieve_context)
+
+
+def create_workflow(parallel_evaluation: bool = PARALLEL_EVALUATION, fast_path: bool = FAST_PATH_ENABLED,
+                    multi_query: bool = MULTI_QUERY_ENABLED) -> StateGraph:
     """
     Creates the updated workflow for the AI nutrition agent.
+
+    Args:
+        parallel_evaluation (bool): Fan out the groundedness and precision judges
+            concurrently from `craft_response` instead of chaining them.
+        fast_path (bool): Route queries whose best retrieval hit is a close match
+            past expansion, and past the judges for the closest matches.
+        multi_query (bool): Expand the query into several variants in one call and
+            retrieve with all of them at once, fusing the results by rank.
     """
+    if parallel_evaluation:
+        return create_parallel_workflow(fast_path, multi_query)
+
+    expand, retrieve = expansion_nodes(multi_query)
+
     workflow = StateGraph(AgentState)
 
     # Add processing nodes
-    workflow.add_node("expand_query", expand_query)                         # Step 1: Expand user query.
-    workflow.add_node("retrieve_context", retrieve_context)                 # Step 2: Retrieve relevant documents.
-    workflow.add_node("craft_response", craft_response)                     # Step 3: Generate a response based on retrieved data.
-    workflow.add_node("score_groundedness", score_groundedness)             # Step 4: Evaluate response grounding.
-    workflow.add_node("refine_response", refine_response)                   # Step 5: Improve response if it's weakly grounded.
-    workflow.add_node("check_precision", check_precision)                   # Step 6: Evaluate response precision.
-    workflow.add_node("refine_query", refine_query)                         # Step 7: Improve query if response lacks precision.
-    workflow.add_node("max_iterations_reached", max_iterations_reached)     # Step 8: Handle max iterations.
+    workflow.add_node("probe_retrieval", node(probe_retrieval, aprobe_retrieval))                           # Step 0: Check retrieval scores for a fast path.
+    workflow.add_node("expand_query", expand)                                                               # Step 1: Expand user query.
+    workflow.add_node("retrieve_context", retrieve)                                                         # Step 2: Retrieve relevant documents.
+    workflow.add_node("craft_response", node(craft_response, acraft_response))                              # Step 3: Generate a response based on retrieved data.
+    workflow.add_node("score_groundedness", node(score_groundedness, ascore_groundedness))                  # Step 4: Evaluate response grounding.
+    workflow.add_node("refine_response", node(refine_response, arefine_response))                           # Step 5: Improve response if it's weakly grounded.
+    workflow.add_node("check_precision", node(check_precision, acheck_precision))                           # Step 6: Evaluate response precision.
+    workflow.add_node("refine_query", node(refine_query, arefine_query))                                    # Step 7: Improve query if response lacks precision.
+    workflow.add_node("max_iterations_reached", max_iterations_reached)                                     # Step 8: Handle max iterations.
 
     # Main flow edges
-    workflow.add_edge(START, "expand_query")
+    workflow.add_conditional_edges(
+        START,
+        lambda state: route_start(state, fast_path),
+        {
+            "expand_query": "expand_query",                         # Expand and retrieve for a fresh query.
+            "probe_retrieval": "probe_retrieval",                   # Check for a close match first.
+            "craft_response": "craft_response"                      # Context was retrieved speculatively.
+        }
+    )
+    workflow.add_conditional_edges(
+        "probe_retrieval",
+        route_probe,
+        {
+            "expand_query": "expand_query",                         # No close match, take the full path.
+            "craft_response": "craft_response"                      # Close match, answer from the probed context.
+        }
+    )
     workflow.add_edge("expand_query", "retrieve_context")
     workflow.add_edge("retrieve_context", "craft_response")
-    workflow.add_edge("craft_response", "score_groundedness")
+
+    # Close matches end after the first response; everything else is judged
+    workflow.add_conditional_edges(
+        "craft_response",
+        lambda state: "pass" if is_direct(state) else "score_groundedness",
+        {
+            "pass": END,                                            # Direct path, complete the workflow.
+            "score_groundedness": "score_groundedness"              # Evaluate response grounding.
+        }
+    )
 
     # Conditional edges based on groundedness check
     workflow.add_conditional_edges(
@@ -83,4 +184,81 @@ def create_workflow() -> StateGraph:
     return workflow
 
 
-WORKFLOW_APP = create_workflow().compile()
+def create_parallel_workflow(fast_path: bool = FAST_PATH_ENABLED, multi_query: bool = MULTI_QUERY_ENABLED) -> StateGraph:
+    """
+    Creates the workflow variant where both judges score each response concurrently.
+    """
+    expand, retrieve = expansion_nodes(multi_query)
+
+    workflow = StateGraph(AgentState)
+
+    # Add processing nodes
+    workflow.add_node("probe_retrieval", node(probe_retrieval, aprobe_retrieval))                           # Step 0: Check retrieval scores for a fast path.
+    workflow.add_node("expand_query", expand)                                                               # Step 1: Expand user query.
+    workflow.add_node("retrieve_context", retrieve)                                                         # Step 2: Retrieve relevant documents.
+    workflow.add_node("craft_response", node(craft_response, acraft_response))                              # Step 3: Generate a response based on retrieved data.
+    workflow.add_node("score_groundedness", node(score_groundedness_branch, ascore_groundedness_branch))    # Step 4a: Evaluate response grounding.
+    workflow.add_node("check_precision", node(check_precision_branch, acheck_precision_branch))             # Step 4b: Evaluate response precision.
+    workflow.add_node("join_evaluations", join_evaluations)                                                 # Step 5: Combine both judge scores.
+    workflow.add_node("refine_response", node(refine_response, arefine_response))                           # Step 6: Improve response if it's weakly grounded.
+    workflow.add_node("refine_query", node(refine_query, arefine_query))                                    # Step 7: Improve query if response lacks precision.
+    workflow.add_node("max_iterations_reached", max_iterations_reached)                                     # Step 8: Handle max iterations.
+
+    # Main flow edges
+    workflow.add_conditional_edges(
+        START,
+        lambda state: route_start(state, fast_path),
+        {
+            "expand_query": "expand_query",                         # Expand and retrieve for a fresh query.
+            "probe_retrieval": "probe_retrieval",                   # Check for a close match first.
+            "craft_response": "craft_response"                      # Context was retrieved speculatively.
+        }
+    )
+    workflow.add_conditional_edges(
+        "probe_retrieval",
+        route_probe,
+        {
+            "expand_query": "expand_query",                         # No close match, take the full path.
+            "craft_response": "craft_response"                      # Close match, answer from the probed context.
+        }
+    )
+    workflow.add_edge("expand_query", "retrieve_context")
+    workflow.add_edge("retrieve_context", "craft_response")
+
+    # Fan out to both judges and wait for both before routing (close matches end after the first response)
+    workflow.add_conditional_edges(
+        "craft_response",
+        lambda state: END if is_direct(state) else ["score_groundedness", "check_precision"],
+        ["score_groundedness", "check_precision", END]
+    )
+    workflow.add_edge(["score_groundedness", "check_precision"], "join_evaluations")
+
+    # Conditional edges based on both scores
+    workflow.add_conditional_edges(
+        "join_evaluations",
+        should_continue_evaluation,
+        {
+            "pass": END,                                            # If grounded and precise, complete the workflow.
+            "refine_response": "refine_response",                   # If not grounded, refine response.
+            "refine_query": "refine_query",                         # If imprecise, refine the query.
+            "max_iterations_reached": "max_iterations_reached"      # If max loops reached, exit.
+        }
+    )
+
+    # Go back to crafting a new response adopting feedback.
+    workflow.add_edge("refine_response", "craft_response")
+
+    # Go through expansion again adopting feedback.
+    workflow.add_edge("refine_query", "expand_query")
+
+    workflow.add_edge("max_iterations_reached", END)
+
+    return workflow
+
+
+@singleton
+def get_workflow_app():
+    """
+    Returns the compiled workflow, compiled once on first use.
+    """
+    return create_workflow().compile()
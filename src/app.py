@@ -1,7 +1,52 @@
 import streamlit as st
 
+from config import (STREAMING_RESPONSES,
+                    SPECULATIVE_EXECUTION)
 from agent.nutrition_bot import NutritionBot
-from utils.guardrail import filter_input_with_llama_guard
+from agent.speculation import Speculation
+from utils.guardrail import (is_input_allowed,
+                             filter_input_with_llama_guard)
+
+
+@st.cache_resource
+def get_chatbot() -> NutritionBot:
+    """
+    Returns the bot shared by every session of the server process.
+
+    The bot keeps no per-session state (the user id is passed with every call), so all
+    sessions share its agent executor, clients, connection pool and background writer.
+    """
+    return NutritionBot()
+
+
+def stream_response(chatbot: NutritionBot, user_id: str, query: str, speculation: Speculation = None) -> str:
+    """
+    Renders the response incrementally while showing the workflow progress.
+
+    Returns:
+        str: The complete response.
+    """
+    status = st.status("Working on your question...")
+    placeholder = st.empty()
+    response = ""
+
+    for event in chatbot.stream_customer_query(user_id, query, speculation):
+        if event["type"] == "stage":
+            status.update(label=event["label"])
+        elif event["type"] == "token":
+            response += event["content"]
+            placeholder.markdown(response + "▌")
+        elif event["type"] == "reset":
+            # The judges rejected the draft, a refined response follows
+            response = ""
+            placeholder.markdown(response)
+        elif event["type"] == "response":
+            response = event["content"]
+            placeholder.markdown(response)
+        elif event["type"] == "metrics":
+            status.update(label=f"Done (first token after {event['time_to_first_token'] or 0:.1f}s)", state="complete")
+
+    return response
 
 
 def nutrition_disorder_streamlit():
@@ -60,27 +105,34 @@ def nutrition_disorder_streamlit():
             with st.chat_message("user"):
                 st.write(user_query)
 
-            # Filter input using Llama Guard
-            filtered_result = filter_input_with_llama_guard(user_query)
-            filtered_result = filtered_result.replace("\n", " ")        # Normalize the result
+            try:
+                chatbot = get_chatbot()
+
+                # Filter input using Llama Guard, speculatively starting the history lookup and retrieval alongside it
+                speculation = None
+                if SPECULATIVE_EXECUTION:
+                    speculation = chatbot.speculate(st.session_state.user_id, user_query)
+                    allowed = speculation.is_allowed()
+                else:
+                    allowed = is_input_allowed(filter_input_with_llama_guard(user_query))
 
-            # Check if input is safe based on allowed statuses
-            if filtered_result in ["safe", "unsafe S6", "unsafe S7"]:
-                try:
-                    if 'chatbot' not in st.session_state:
-                        st.session_state.chatbot = NutritionBot()
-                    response = st.session_state.chatbot.handle_customer_query(st.session_state.user_id, user_query)
+                # Check if input is safe based on allowed statuses
+                if allowed:
+                    if STREAMING_RESPONSES:
+                        response = stream_response(chatbot, st.session_state.user_id, user_query, speculation)
+                    else:
+                        response = chatbot.handle_customer_query(st.session_state.user_id, user_query, speculation)
+                        st.write(response)
 
-                    st.write(response)
                     st.session_state.chat_history.append({"role": "assistant", "content": response})
-                except Exception as e:
-                    error_msg = f"Sorry, I encountered an error while processing your query. Please try again. Error: {str(e)}"
-                    st.write(error_msg)
-                    st.session_state.chat_history.append({"role": "assistant", "content": error_msg})
-            else:
-                inappropriate_msg = "I apologize, but I cannot process that input as it may be inappropriate. Please try again."
-                st.write(inappropriate_msg)
-                st.session_state.chat_history.append({"role": "assistant", "content": inappropriate_msg})
+                else:
+                    inappropriate_msg = "I apologize, but I cannot process that input as it may be inappropriate. Please try again."
+                    st.write(inappropriate_msg)
+                    st.session_state.chat_history.append({"role": "assistant", "content": inappropriate_msg})
+            except Exception as e:
+                error_msg = f"Sorry, I encountered an error while processing your query. Please try again. Error: {str(e)}"
+                st.write(error_msg)
+                st.session_state.chat_history.append({"role": "assistant", "content": error_msg})
 
 
 if __name__ == "__main__":
@@ -1,9 +1,7 @@
 import os
 from dotenv import load_dotenv
-from llama_index.core import Settings
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
-from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
+from utils.lazy import singleton
 
 load_dotenv()
 
@@ -17,28 +15,192 @@ EMBEDDING_MODEL = "text-embedding-ada-002"
 STORE_DIRECTORY = "data/store/nutritional_db"
 STORE_COLLECTION = "nutritional_hypotheticals"
 
-# Initialize LLM
-llm = ChatOpenAI(
-    openai_api_base=OPENAI_API_BASE,
-    openai_api_key=OPENAI_API_KEY,
-    model=CHAT_MODEL,
-    streaming=False
-)
-
-# Initialize embedding model
-embedding_model = OpenAIEmbeddings(
-    openai_api_base=OPENAI_API_BASE,
-    openai_api_key=OPENAI_API_KEY,
-    model=EMBEDDING_MODEL
-)
-
-# Initialize the OpenAI embedding function for Chroma
-embedding_function = OpenAIEmbeddingFunction(
-    api_base=OPENAI_API_BASE,
-    api_key=OPENAI_API_KEY,
-    model_name=EMBEDDING_MODEL
-)
-
-# Set global defaults in LlamaIndex
-Settings.llm = llm
-Settings.embedding = embedding_model
+# Connection pool shared by the synchronous HTTP clients (OpenAI, Groq, mem0)
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+
+# Retrieval backend: "chroma" or "local" (in-process index exported with `python -m utils.local_index`)
+RETRIEVAL_BACKEND = "chroma"
+LOCAL_INDEX_DIRECTORY = "data/store/nutritional_index"
+LOCAL_INDEX_METHOD = "exact"            # "exact" top-k or "hnsw"
+LOCAL_INDEX_EF_SEARCH = 64              # HNSW candidate list size at query time
+LOCAL_INDEX_FLOAT16 = False             # Export the embedding matrix in half precision
+
+# HNSW parameters of the Chroma collections built by ingestion and `python -m ingestion.compact`
+STORE_HNSW_M = 16                       # Graph links per element
+STORE_HNSW_EF_CONSTRUCTION = 200        # Candidate list size while building
+STORE_HNSW_EF_SEARCH = 64               # Candidate list size at query time (Chroma's default of 10 is below RETRIEVAL_FETCH_K)
+
+# Multi-vector retrieval: hypothetical questions are matched, their original passages are returned
+MULTI_VECTOR_ENABLED = True
+DOCSTORE_DIRECTORY = "data/store/nutritional_docstore"   # Built with `python -m utils.docstore`, or on first use
+
+# Retrieved context: candidates above a relevance cutoff, diversified with MMR and packed into a token budget
+RETRIEVAL_K = 5                         # Documents kept per retrieval
+RETRIEVAL_FETCH_K = 20                  # Candidates fetched before filtering and MMR
+RETRIEVAL_MIN_SCORE = 0.75              # Minimum cosine similarity to the query
+RETRIEVAL_MMR_LAMBDA = 0.7              # 1 ranks by similarity only, lower values favour diversity
+RETRIEVAL_MAX_CONTEXT_TOKENS = 1500     # Token budget of the context given to the response and groundedness prompts
+
+# Hybrid retrieval: BM25 matches over the questions and passages are fused with the vector results
+HYBRID_RETRIEVAL_ENABLED = True
+LEXICAL_INDEX_DIRECTORY = "data/store/nutritional_lexical"   # Built with `python -m utils.lexical_index`, or on first use
+RRF_K = 60                              # Reciprocal rank fusion constant
+LEXICAL_ONLY_MAX_TERMS = 2              # Queries of up to this many terms, all matched by the top hit, skip the embedding call (0 disables)
+
+# Retrieve with several query variants written in one LLM call, searched concurrently and fused by rank,
+# instead of a single expanded query
+MULTI_QUERY_ENABLED = True
+MULTI_QUERY_VARIANTS = 4                # Variants searched together with the raw query
+
+# Reuse work across the refinement loops of the workflow
+LOOP_REUSE_ENABLED = True
+LOOP_REUSE_THRESHOLD = 0.97             # Cosine similarity of consecutive expanded queries (each variant, with multi-query) above which retrieval is skipped
+
+# Stream workflow progress and the tokens of craft_response to the UI
+STREAMING_RESPONSES = True
+
+# Run the guardrail, history lookup and query expansion/retrieval in parallel
+SPECULATIVE_EXECUTION = True
+SPECULATION_WORKERS = 16
+
+# Write customer interactions to mem0 from a background queue instead of inline
+MEMORY_WRITER_ENABLED = True
+MEMORY_WRITER_QUEUE_SIZE = 1000         # Interactions waiting to be written
+MEMORY_WRITER_BATCH_SIZE = 16           # Interactions drained and coalesced per batch
+MEMORY_WRITER_MAX_RETRIES = 5
+MEMORY_WRITER_BACKOFF = 0.5             # Initial retry delay in seconds
+
+# Search each user's memories locally, fetching them from mem0 only on a cold start or after the TTL
+HISTORY_CACHE_ENABLED = True
+HISTORY_CACHE_TTL = 30 * 60             # Seconds before a user's memories are fetched again
+HISTORY_CACHE_MAX_USERS = 1000          # Least recently active users are evicted beyond this
+
+# HTTP API server (src/server.py)
+SERVER_MAX_CONCURRENCY = 8              # Queries processed at the same time
+SERVER_MAX_QUEUE = 64                   # Queries waiting for a slot before new ones are rejected
+SERVER_QUEUE_TIMEOUT = 30.0             # Seconds a query may wait for a slot
+
+# Group concurrent async embedding and guardrail calls into batches
+MICRO_BATCHING_ENABLED = True
+MICRO_BATCH_MAX_SIZE = 32
+MICRO_BATCH_MAX_WAIT = 0.01             # Seconds the first call of a batch waits for others
+
+# Return only the response and its source citations from the agentic_rag tool, instead of the whole workflow state
+TOOL_OUTPUT_COMPACT = True
+
+# Answer knowledge queries with the RAG workflow directly, keeping the tool-calling agent for conversational turns
+DIRECT_WORKFLOW_ENABLED = True
+
+# Skip query expansion (and the judge loop) when the raw query closely matches a stored question
+FAST_PATH_ENABLED = True
+FAST_PATH_THRESHOLD = 0.90              # Top-hit cosine similarity to skip expansion
+FAST_PATH_DIRECT_THRESHOLD = 0.95       # Top-hit cosine similarity to also skip the judges
+
+# Run the groundedness and precision judges concurrently after each response
+PARALLEL_EVALUATION = True
+
+# Semantic cache of validated responses in front of the agentic_rag tool
+# Queries answered with a customer's history bypass it, so that no response is served to another customer
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_PATH = "data/cache/semantic_cache.sqlite3"
+SEMANTIC_CACHE_THRESHOLD = 0.97         # Minimum cosine similarity for a hit
+SEMANTIC_CACHE_TTL = 7 * 24 * 60 * 60   # Entry lifetime in seconds
+SEMANTIC_CACHE_MAX_ENTRIES = 1000       # Least recently used entries are evicted beyond this
+
+# Exact-match cache of LLM generations. Only nodes whose answer depends on the prompt alone are
+# cached: the judges and the refinement loops send a prompt again expecting a new answer
+LLM_CACHE_ENABLED = True
+LLM_CACHE_NODES = ["expand_query", "expand_queries"]
+LLM_CACHE_MAX_BYTES = 32 * 1024 * 1024              # Size limit of the in-memory tier
+LLM_CACHE_SQLITE_PATH = None                        # e.g. "data/cache/llm_cache.sqlite3" to persist generations
+LLM_CACHE_SQLITE_MAX_BYTES = 256 * 1024 * 1024      # Size limit of the SQLite tier
+
+# Content-addressed cache of embedding vectors
+EMBEDDING_CACHE_DIRECTORY = "data/cache/embeddings"
+EMBEDDING_CACHE_MAX_ENTRIES = 10000                 # Vectors kept in the in-memory LRU
+
+# Ingestion pipeline (`python -m ingestion`)
+DOCS_DIRECTORY = "data/docs"
+PDF_PARSER = "local"                        # "local" (offline, process pool) or "llamaparse" for tables
+PDF_WORKERS = None                          # Parsing processes, the number of CPUs by default
+CHUNKING_PERCENTILE = 80                    # Percentile of sentence distances above which a chunk ends
+CHUNKING_EMBEDDING_MODEL = None             # None for the OpenAI model, or a local sentence-transformers model
+CHUNKING_CACHE_DIRECTORY = "data/cache/chunking_embeddings"    # Sentence embeddings of local models
+CHUNKING_BATCH_PAGES = 32                   # Pages whose sentences are embedded together
+RESEARCH_STORE_DIRECTORY = "data/store/research_db"
+RESEARCH_STORE_COLLECTION = "semantic_chunks"
+INGESTION_CHECKPOINT_PATH = "data/cache/ingestion.sqlite3"     # Generated questions keyed by chunk content hash
+INGESTION_CONCURRENCY = 8                   # Question generation requests in flight
+INGESTION_REQUESTS_PER_MINUTE = 500         # Rate limit of question generation requests
+INGESTION_MAX_RETRIES = 3
+INGESTION_EMBEDDING_BATCH_SIZE = 256        # Texts embedded per request
+
+# The clients below are built on first use and shared by the whole process, so that
+# importing this module stays cheap and no client is built that a process never uses.
+
+def chat_model(**kwargs):
+    """
+    Builds a chat model of the workflow on the shared connection pool, with the given settings overridden.
+    """
+    from langchain_openai import ChatOpenAI
+    from utils.http import http_client
+
+    return ChatOpenAI(**{
+        "openai_api_base": OPENAI_API_BASE,
+        "openai_api_key": OPENAI_API_KEY,
+        "model": CHAT_MODEL,
+        "streaming": False,
+        "http_client": http_client(),
+        **kwargs
+    })
+
+
+@singleton
+def get_llm():
+    """
+    Returns the chat model shared by the workflow nodes.
+    """
+    return chat_model()
+
+
+@singleton
+def get_embedding_model():
+    """
+    Returns the LangChain embedding model.
+    """
+    from langchain_openai import OpenAIEmbeddings
+    from utils.http import http_client
+
+    return OpenAIEmbeddings(
+        openai_api_base=OPENAI_API_BASE,
+        openai_api_key=OPENAI_API_KEY,
+        model=EMBEDDING_MODEL,
+        http_client=http_client()
+    )
+
+
+@singleton
+def get_embedding_function():
+    """
+    Returns the OpenAI embedding function for Chroma.
+    """
+    from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
+    return OpenAIEmbeddingFunction(
+        api_base=OPENAI_API_BASE,
+        api_key=OPENAI_API_KEY,
+        model_name=EMBEDDING_MODEL
+    )
+
+
+def __getattr__(name: str):
+    # Keep `from config import llm` (and the other former module-level clients) working lazily
+    clients = {
+        "llm": get_llm,
+        "embedding_model": get_embedding_model,
+        "embedding_function": get_embedding_function
+    }
+    if name in clients:
+        return clients[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
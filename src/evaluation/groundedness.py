@@ -1,35 +1,60 @@
+import time
+from typing import Optional
+
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser 
 
-from config import llm
+from utils.llm_cache import cached_llm
 from utils.prompts import GROUNDEDNESS
+from utils.reuse import (content_key,
+                         record_run,
+                         record_skip)
+from config import LOOP_REUSE_ENABLED
 
 
-def score_groundedness(state: dict) -> dict:
+def score_groundedness_chain():
     """
-    Checks whether the response is grounded in the retrieved context.
-
-    Args:
-        state (dict): The current state of the workflow, containing the response and context.
-
-    Returns:
-        dict: The updated state with the groundedness score.
+    Builds the chain that scores how well the response is grounded in the context.
     """
-    print("-"*20, "check_groundedness", "-"*20)
-
     groundedness_prompt = ChatPromptTemplate.from_messages([
         ("system", GROUNDEDNESS["system"]),
         ("user", GROUNDEDNESS["query"])
     ])
 
-    chain = groundedness_prompt | llm | StrOutputParser()
+    return groundedness_prompt | cached_llm("score_groundedness") | StrOutputParser()
+
 
-    groundedness_score = float(chain.invoke({
+def score_groundedness_inputs(state: dict) -> dict:
+    return {
         "context": "\n".join([doc["content"] for doc in state['context']]),
         "response": state['response']
-    }))
+    }
 
+
+def response_key(inputs: dict) -> str:
+    # The text of the response, without the metadata of the AI message
+    return content_key(inputs["context"], getattr(inputs["response"], "content", str(inputs["response"])))
+
+
+def reuse_groundedness(state: dict, key: str) -> bool:
+    """
+    Keeps the previous verdict when the response and the context are byte-identical to the ones it judged.
+
+    Only a passing verdict is kept: a failed one is judged again rather than repeated until
+    the loop limit.
+    """
+    if not LOOP_REUSE_ENABLED or key != state.get("groundedness_key") or state["groundedness_score"] < 4.0:
+        return False
+
+    record_skip(state, "score_groundedness", "same response and context")
+    return True
+
+
+def update_groundedness(state: dict, groundedness_score: float, key: str, seconds: Optional[float] = None) -> dict:
     state['groundedness_score'] = groundedness_score
+    state["groundedness_key"] = key
+    if seconds is not None:
+        record_run(state, "score_groundedness", seconds)
     state["groundedness_loop_count"] += 1
 
     print(" groundedness_score:", groundedness_score)
@@ -38,6 +63,46 @@ def score_groundedness(state: dict) -> dict:
     return state
 
 
+def score_groundedness(state: dict) -> dict:
+    """
+    Checks whether the response is grounded in the retrieved context.
+
+    Args:
+        state (dict): The current state of the workflow, containing the response and context.
+
+    Returns:
+        dict: The updated state with the groundedness score.
+    """
+    print("-"*20, "check_groundedness", "-"*20)
+
+    inputs = score_groundedness_inputs(state)
+    key = response_key(inputs)
+    if reuse_groundedness(state, key):
+        return update_groundedness(state, state["groundedness_score"], key)
+
+    start = time.perf_counter()
+    groundedness_score = float(score_groundedness_chain().invoke(inputs))
+
+    return update_groundedness(state, groundedness_score, key, time.perf_counter() - start)
+
+
+async def ascore_groundedness(state: dict) -> dict:
+    """
+    Async variant of `score_groundedness`.
+    """
+    print("-"*20, "check_groundedness", "-"*20)
+
+    inputs = score_groundedness_inputs(state)
+    key = response_key(inputs)
+    if reuse_groundedness(state, key):
+        return update_groundedness(state, state["groundedness_score"], key)
+
+    start = time.perf_counter()
+    groundedness_score = float(await score_groundedness_chain().ainvoke(inputs))
+
+    return update_groundedness(state, groundedness_score, key, time.perf_counter() - start)
+
+
 def should_continue_groundedness(state):
     """
     Decide if groundedness is sufficient or needs improvement.
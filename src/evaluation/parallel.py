@@ -0,0 +1,115 @@
+from evaluation.precision import (check_precision, 
+                                  acheck_precision)
+from evaluation.groundedness import (score_groundedness, 
+                                     ascore_groundedness)
+
+
+def groundedness_update(state: dict) -> dict:
+    return {
+        "groundedness_score": state["groundedness_score"],
+        "groundedness_loop_count": state["groundedness_loop_count"],
+        "groundedness_key": state["groundedness_key"],
+        "node_seconds": state.get("node_seconds", {}),
+        "skipped_nodes": state.get("skipped_nodes", []),
+        "time_saved": state.get("time_saved", 0.0)
+    }
+
+
+def score_groundedness_branch(state: dict) -> dict:
+    """
+    Runs the groundedness judge as one branch of the parallel evaluation.
+
+    Only the keys owned by this judge are returned, so that LangGraph can merge
+    the update with the precision branch that runs in the same step.
+
+    Args:
+        state (dict): The current state of the workflow, containing the response and context.
+
+    Returns:
+        dict: The groundedness score and loop counter, and the bookkeeping of reused verdicts.
+    """
+    state = score_groundedness(dict(state))
+
+    return groundedness_update(state)
+
+
+async def ascore_groundedness_branch(state: dict) -> dict:
+    """
+    Async variant of `score_groundedness_branch`.
+    """
+    state = await ascore_groundedness(dict(state))
+
+    return groundedness_update(state)
+
+
+def check_precision_branch(state: dict) -> dict:
+    """
+    Runs the precision judge as one branch of the parallel evaluation.
+
+    The precision loop counter is left to `join_evaluations`, which only counts
+    a precision pass when the response was grounded (as in the sequential flow).
+
+    Args:
+        state (dict): The current state of the workflow, containing the query and response.
+
+    Returns:
+        dict: The precision score.
+    """
+    state = check_precision(dict(state))
+
+    return {"precision_score": state["precision_score"]}
+
+
+async def acheck_precision_branch(state: dict) -> dict:
+    """
+    Async variant of `check_precision_branch`.
+    """
+    state = await acheck_precision(dict(state))
+
+    return {"precision_score": state["precision_score"]}
+
+
+def join_evaluations(state: dict) -> dict:
+    """
+    Joins the groundedness and precision branches once both judges have finished.
+
+    Args:
+        state (dict): The current state of the workflow, containing both scores.
+
+    Returns:
+        dict: The updated precision loop counter.
+    """
+    print("-"*20, "join_evaluations", "-"*20)
+
+    precision_loop_count = state["precision_loop_count"]
+    if state["groundedness_score"] >= 4.0:
+        precision_loop_count += 1
+
+    print(" precision_loop_count:", precision_loop_count)
+
+    return {"precision_loop_count": precision_loop_count}
+
+
+def should_continue_evaluation(state: dict) -> str:
+    """
+    Decide the next step from both judge scores, replacing the chained
+    groundedness and precision decisions of the sequential workflow.
+    """
+    print("-"*20, "should_continue_evaluation", "-"*20)
+
+    if state['groundedness_score'] < 4.0:
+        if state["groundedness_loop_count"] > state['loop_max_iter']:
+            return "max_iterations_reached"
+        else:
+            print(f" Groundedness Score Threshold Not met. Refining Response.")
+            return "refine_response"
+
+    if state['precision_score'] >= 4.0:
+        print(" Groundedness and precision thresholds met. Ending workflow.")
+        return "pass"
+    else:
+        if state["precision_loop_count"] > state['loop_max_iter']:
+            return "max_iterations_reached"
+        else:
+            print(f" Precision Score Threshold Not met. Refining Query.")
+            return "refine_query"
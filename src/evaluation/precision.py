@@ -1,10 +1,32 @@
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser 
 
-from config import llm
+from utils.llm_cache import cached_llm
 from utils.prompts import PRECISION
 
 
+def check_precision_chain():
+    """
+    Builds the chain that scores how precisely the response addresses the query.
+    """
+    precision_prompt = ChatPromptTemplate.from_messages([
+        ("system", PRECISION["system"]),
+        ("user", PRECISION["query"])
+    ])
+
+    return precision_prompt | cached_llm("check_precision") | StrOutputParser()
+
+
+def update_precision(state: dict, precision_score: float) -> dict:
+    state['precision_score'] = precision_score
+    state["precision_loop_count"] += 1
+
+    print(" precision_score:", precision_score)
+    print(" precision_loop_count:", state["precision_loop_count"])
+
+    return state
+
+
 def check_precision(state: dict) -> dict:
     """
     Checks whether the response precisely addresses the user's query.
@@ -16,26 +38,27 @@ def check_precision(state: dict) -> dict:
         dict: The updated state with the precision score.
     """
     print("-"*20, "check_precision", "-"*20)
-    
-    precision_prompt = ChatPromptTemplate.from_messages([
-        ("system", PRECISION["system"]),
-        ("user", PRECISION["query"])
-    ])
-
-    chain = precision_prompt | llm | StrOutputParser()
 
-    precision_score = float(chain.invoke({
+    precision_score = float(check_precision_chain().invoke({
         "query": state['query'],
         "response": state['response']
     }))
 
-    state['precision_score'] = precision_score
-    state["precision_loop_count"] += 1
+    return update_precision(state, precision_score)
 
-    print(" precision_score:", precision_score)
-    print(" precision_loop_count:", state["precision_loop_count"])
 
-    return state
+async def acheck_precision(state: dict) -> dict:
+    """
+    Async variant of `check_precision`.
+    """
+    print("-"*20, "check_precision", "-"*20)
+
+    precision_score = float(await check_precision_chain().ainvoke({
+        "query": state['query'],
+        "response": state['response']
+    }))
+
+    return update_precision(state, precision_score)
 
 
 def should_continue_precision(state: dict) -> str:
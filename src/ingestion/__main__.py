@@ -0,0 +1,97 @@
+"""
+Builds the vector stores under `data/store/` from the PDFs in `data/docs/`.
+
+Run from the repository root:
+
+    PYTHONPATH=src python -m ingestion
+
+Questions already generated for a chunk are read from the checkpoint and embeddings
+from the embedding cache, so a rerun only calls the APIs for new or changed chunks.
+"""
+import os
+import argparse
+
+from ingestion.pipeline import ingest
+from ingestion.loaders import load_chunks
+from ingestion.store import hnsw_metadata
+from ingestion.questions import QuestionCheckpoint
+from ingestion.chunker import (SemanticChunker,
+                               get_chunking_embeddings)
+from utils.docstore import build_docstore
+from utils.lexical_index import build_lexical_index
+from utils.local_index import export_chroma_index
+from utils.semantic_cache import store_fingerprint
+from utils.embedding_cache import get_cached_embedding_model
+from config import (get_llm,
+                    PDF_PARSER,
+                    PDF_WORKERS,
+                    STORE_HNSW_M,
+                    DOCS_DIRECTORY,
+                    CHUNKING_PERCENTILE,
+                    CHUNKING_BATCH_PAGES,
+                    CHUNKING_EMBEDDING_MODEL,
+                    STORE_DIRECTORY,
+                    STORE_COLLECTION,
+                    DOCSTORE_DIRECTORY,
+                    LOCAL_INDEX_FLOAT16,
+                    LEXICAL_INDEX_DIRECTORY,
+                    STORE_HNSW_EF_SEARCH,
+                    INGESTION_CONCURRENCY,
+                    LOCAL_INDEX_DIRECTORY,
+                    INGESTION_MAX_RETRIES,
+                    RESEARCH_STORE_DIRECTORY,
+                    RESEARCH_STORE_COLLECTION,
+                    INGESTION_CHECKPOINT_PATH,
+                    STORE_HNSW_EF_CONSTRUCTION,
+                    INGESTION_REQUESTS_PER_MINUTE,
+                    INGESTION_EMBEDDING_BATCH_SIZE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default=DOCS_DIRECTORY, help="Directory of the PDFs")
+    parser.add_argument("--parser", choices=["local", "llamaparse"], default=PDF_PARSER, help="PDF parser")
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS, help="Processes parsing PDFs locally")
+    parser.add_argument("--percentile", type=float, default=CHUNKING_PERCENTILE, help="Percentile of sentence distances above which a chunk ends")
+    parser.add_argument("--chunking-model", default=CHUNKING_EMBEDDING_MODEL, help="Local sentence-transformers model embedding the sentences")
+    parser.add_argument("--concurrency", type=int, default=INGESTION_CONCURRENCY, help="Question generation requests in flight")
+    parser.add_argument("--rpm", type=float, default=INGESTION_REQUESTS_PER_MINUTE, help="Question generation requests per minute, 0 for no limit")
+    parser.add_argument("--batch-size", type=int, default=INGESTION_EMBEDDING_BATCH_SIZE, help="Texts embedded per request")
+    parser.add_argument("--skip-research", action="store_true", help="Do not rebuild the store of plain text chunks")
+    args = parser.parse_args()
+
+    embeddings = get_cached_embedding_model()
+    chunker = SemanticChunker(get_chunking_embeddings(args.chunking_model), args.percentile)
+    chunks = load_chunks(args.docs, chunker, args.parser, os.environ.get("LLAMA_KEY"), args.workers, CHUNKING_BATCH_PAGES)
+    print(f"Loaded {len(chunks)} chunks from {args.docs}")
+
+    checkpoint = QuestionCheckpoint(INGESTION_CHECKPOINT_PATH)
+    try:
+        stats = ingest(
+            chunks, get_llm(), embeddings, checkpoint,
+            STORE_DIRECTORY, STORE_COLLECTION,
+            None if args.skip_research else RESEARCH_STORE_DIRECTORY, RESEARCH_STORE_COLLECTION,
+            concurrency=args.concurrency,
+            requests_per_minute=args.rpm,
+            max_retries=INGESTION_MAX_RETRIES,
+            batch_size=args.batch_size,
+            collection_metadata=hnsw_metadata(STORE_HNSW_M, STORE_HNSW_EF_CONSTRUCTION, STORE_HNSW_EF_SEARCH)
+        )
+    finally:
+        checkpoint.close()
+
+    print(f"Chunks: {stats['chunks']} ({stats['cached']} from the checkpoint, {stats['generated']} generated, {stats['failed']} failed). "
+          f"Took {stats['total_s']:.1f}s, {stats['chunks_per_s']:.1f} chunks/s")
+
+    # Keep the artifacts derived from the questions store in sync with it, recording the store they were built from
+    from langchain_community.vectorstores import Chroma
+
+    store = Chroma(collection_name=STORE_COLLECTION, persist_directory=STORE_DIRECTORY)
+    build_docstore(store, DOCSTORE_DIRECTORY, fingerprint=store_fingerprint(STORE_DIRECTORY))
+    build_lexical_index(store, LEXICAL_INDEX_DIRECTORY, fingerprint=store_fingerprint(STORE_DIRECTORY))
+    if os.path.exists(LOCAL_INDEX_DIRECTORY):
+        export_chroma_index(store, LOCAL_INDEX_DIRECTORY, STORE_HNSW_M, STORE_HNSW_EF_CONSTRUCTION, LOCAL_INDEX_FLOAT16)
+
+
+if __name__ == "__main__":
+    main()
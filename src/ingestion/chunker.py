@@ -0,0 +1,100 @@
+import re
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_cache import CachedEmbeddings, get_cached_embedding_model
+from config import (CHUNKING_EMBEDDING_MODEL,
+                    CHUNKING_CACHE_DIRECTORY,
+                    EMBEDDING_CACHE_MAX_ENTRIES)
+
+
+SENTENCE_SPLIT = r"(?<=[.?!])\s+"
+
+
+class SemanticChunker:
+    """
+    Splits text into chunks where the meaning of consecutive sentences shifts.
+
+    Follows the percentile breakpoints of LangChain's `SemanticChunker`: each sentence is
+    embedded together with its `buffer_size` neighbours, and a chunk ends after every
+    sentence whose cosine distance to the next one is above the given percentile of the
+    distances in the text. The sentences of many texts are embedded as one batch and the
+    distances are computed as a single matrix operation. With a cached embedding model,
+    re-chunking the same texts with another percentile calls no API.
+    """
+
+    def __init__(self, embeddings: Embeddings, percentile: float = 80, buffer_size: int = 1):
+        """
+        Args:
+            embeddings (Embeddings): Embedding model of the sentences.
+            percentile (float): Percentile of the distances above which a chunk ends.
+            buffer_size (int): Neighbouring sentences on each side embedded with a sentence.
+        """
+        self.embeddings = embeddings
+        self.percentile = percentile
+        self.buffer_size = buffer_size
+
+
+    def split_text(self, text: str) -> list[str]:
+        return self.split_texts([text])[0]
+
+
+    def split_texts(self, texts: list[str]) -> list[list[str]]:
+        """
+        Splits several texts, embedding the sentences of all of them in one batch.
+        """
+        sentences = [re.split(SENTENCE_SPLIT, text) for text in texts]
+        windows = [self.windows(text_sentences) for text_sentences in sentences]
+
+        flat = [window for text_windows in windows for window in text_windows]
+        matrix = np.asarray(self.embeddings.embed_documents(flat) if flat else [], dtype=np.float32)
+
+        chunks, start = [], 0
+        for text_sentences in sentences:
+            vectors = matrix[start:start + len(text_sentences)]
+            start += len(text_sentences)
+            chunks.append(self.group(text_sentences, vectors))
+
+        return chunks
+
+
+    def windows(self, sentences: list[str]) -> list[str]:
+        return [
+            " ".join(sentences[max(0, i - self.buffer_size):i + 1 + self.buffer_size])
+            for i in range(len(sentences))
+        ]
+
+
+    def group(self, sentences: list[str], vectors: np.ndarray) -> list[str]:
+        if len(sentences) == 1:
+            return sentences
+
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        distances = 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+        threshold = np.percentile(distances, self.percentile)
+
+        ends = np.flatnonzero(distances > threshold) + 1
+        bounds = zip(np.concatenate([[0], ends]), np.concatenate([ends, [len(sentences)]]))
+        return [" ".join(sentences[start:end]) for start, end in bounds]
+
+
+def get_chunking_embeddings(model_name: str = CHUNKING_EMBEDDING_MODEL) -> Embeddings:
+    """
+    Returns the cached embedding model of the sentences.
+
+    Without a model name, the OpenAI embedding model and its cache are used; otherwise
+    the named sentence-transformers model runs locally with its own cache.
+    """
+    if model_name is None:
+        return get_cached_embedding_model()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return CachedEmbeddings(
+        embeddings=HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"normalize_embeddings": True}),
+        model_name=model_name,
+        directory=os.path.join(CHUNKING_CACHE_DIRECTORY, re.sub(r"[^\w.-]", "_", model_name)),
+        max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+    )
@@ -0,0 +1,161 @@
+"""
+Compacts the Chroma collections under `data/store/` and rebuilds their HNSW index.
+
+Each collection is copied into a fresh persist directory with the configured HNSW
+parameters, which drops the fragmented segments left by incremental writes, and swapped
+in for the original. The on-disk size and the time to load the store and answer a first
+query are reported before and after. Run from the repository root, e.g. before deploying:
+
+    PYTHONPATH=src python -m ingestion.compact --m 16 --ef-construction 200 --ef-search 64
+
+`--local-index` also re-exports the local index, with `--float16` in half precision.
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import subprocess
+
+from ingestion.store import (close_client,
+                             hnsw_metadata,
+                             replace_directory)
+from utils.local_index import (LocalVectorStore,
+                               export_chroma_index)
+from config import (STORE_HNSW_M,
+                    STORE_DIRECTORY,
+                    STORE_COLLECTION,
+                    LOCAL_INDEX_FLOAT16,
+                    STORE_HNSW_EF_SEARCH,
+                    LOCAL_INDEX_DIRECTORY,
+                    RESEARCH_STORE_DIRECTORY,
+                    RESEARCH_STORE_COLLECTION,
+                    STORE_HNSW_EF_CONSTRUCTION)
+
+
+def directory_size(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+
+# Times opening a store in a fresh interpreter, once chromadb is imported
+LOAD_TIME = """
+import sys, time, chromadb
+directory, collection_name = sys.argv[1:3]
+start = time.perf_counter()
+collection = chromadb.PersistentClient(path=directory).get_collection(collection_name)
+sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+if len(sample):
+    collection.query(query_embeddings=[sample[0]], n_results=1, include=[])
+print(time.perf_counter() - start)
+"""
+
+
+def collection_load_time(directory: str, collection_name: str) -> float:
+    """
+    Returns the seconds taken to open a Chroma store and answer a first query.
+    """
+    output = subprocess.run([sys.executable, "-c", LOAD_TIME, directory, collection_name],
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def local_index_load_time(directory: str) -> float:
+    """
+    Returns the seconds taken to open the local index and answer a first HNSW query.
+    """
+    start = time.perf_counter()
+    store = LocalVectorStore(directory, embedding_function=None, method="hnsw")
+    store.search_ids(store.matrix[0].tolist(), k=1)
+    return time.perf_counter() - start
+
+
+def compact_collection(directory: str, collection_name: str, metadata: dict, batch_size: int = 1000):
+    """
+    Copies a Chroma collection into a fresh persist directory with new HNSW parameters and swaps it in.
+
+    Args:
+        directory (str): Chroma persist directory of the collection.
+        collection_name (str): Name of the collection.
+        metadata (dict): HNSW parameters; the distance space of the collection is kept.
+        batch_size (int): Records copied at a time.
+    """
+    import chromadb
+
+    source_client = chromadb.PersistentClient(path=directory)
+    source = source_client.get_collection(collection_name)
+
+    staging = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    client = chromadb.PersistentClient(path=staging)
+    target = client.create_collection(collection_name, metadata={**(source.metadata or {}), **metadata})
+
+    for offset in range(0, source.count(), batch_size):
+        records = source.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        target.add(
+            ids=records["ids"],
+            embeddings=records["embeddings"],
+            documents=records["documents"],
+            metadatas=records["metadatas"]
+        )
+
+    close_client(source_client)
+    close_client(client)
+
+    # Reclaim the free pages of the SQLite file
+    conn = sqlite3.connect(os.path.join(staging, "chroma.sqlite3"))
+    conn.execute("VACUUM")
+    conn.close()
+
+    replace_directory(staging, directory)
+
+
+def report(name: str, before: tuple, after: tuple):
+    (size_before, load_before), (size_after, load_after) = before, after
+    print(f"{name:<40} {size_before / 2**20:>8.2f} MB -> {size_after / 2**20:>8.2f} MB   "
+          f"{load_before * 1000:>8.1f} ms -> {load_after * 1000:>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="Chroma persist directory to compact, all stores by default")
+    parser.add_argument("--collection", help="Collection of --store")
+    parser.add_argument("--m", type=int, default=STORE_HNSW_M, help="HNSW graph links per element")
+    parser.add_argument("--ef-construction", type=int, default=STORE_HNSW_EF_CONSTRUCTION, help="HNSW candidate list size while building")
+    parser.add_argument("--ef-search", type=int, default=STORE_HNSW_EF_SEARCH, help="HNSW candidate list size at query time")
+    parser.add_argument("--local-index", action="store_true", help="Also re-export the local index")
+    parser.add_argument("--float16", action="store_true", default=LOCAL_INDEX_FLOAT16, help="Store the local index embeddings in half precision")
+    args = parser.parse_args()
+
+    stores = [(args.store, args.collection)] if args.store else [
+        (STORE_DIRECTORY, STORE_COLLECTION),
+        (RESEARCH_STORE_DIRECTORY, RESEARCH_STORE_COLLECTION)
+    ]
+    metadata = hnsw_metadata(args.m, args.ef_construction, args.ef_search)
+
+    print(f"{'store':<40} {'size on disk':>26}   {'load and first query':>26}")
+    for directory, collection_name in stores:
+        if not os.path.exists(os.path.join(directory, "chroma.sqlite3")):
+            print(f"{directory:<40} not found, skipped")
+            continue
+
+        before = directory_size(directory), collection_load_time(directory, collection_name)
+        compact_collection(directory, collection_name, metadata)
+        report(directory, before, (directory_size(directory), collection_load_time(directory, collection_name)))
+
+    if args.local_index:
+        from langchain_community.vectorstores import Chroma
+
+        before = (directory_size(LOCAL_INDEX_DIRECTORY), local_index_load_time(LOCAL_INDEX_DIRECTORY)) \
+            if os.path.exists(LOCAL_INDEX_DIRECTORY) else (0, 0.0)
+        export_chroma_index(Chroma(collection_name=STORE_COLLECTION, persist_directory=STORE_DIRECTORY),
+                            LOCAL_INDEX_DIRECTORY, args.m, args.ef_construction, args.float16)
+        report(LOCAL_INDEX_DIRECTORY, before, (directory_size(LOCAL_INDEX_DIRECTORY), local_index_load_time(LOCAL_INDEX_DIRECTORY)))
+
+
+if __name__ == "__main__":
+    main()
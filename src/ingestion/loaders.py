@@ -0,0 +1,135 @@
+import os
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from ingestion.pdf import iter_pages
+from ingestion.chunker import SemanticChunker
+
+
+def text_chunks(pages: list[Document], chunker: SemanticChunker) -> list[Document]:
+    """
+    Splits the text of pages into chunks, keeping the source file and page of each.
+    """
+    pages = [page for page in pages if page.page_content.strip()]
+    return [
+        Document(page_content=text, metadata={"source": page.metadata["source"], "page": page.metadata["page"], "type": "text"})
+        for page, page_chunks in zip(pages, chunker.split_texts([page.page_content for page in pages]))
+        for text in page_chunks
+    ]
+
+
+def load_text_chunks(directory: str, chunker: SemanticChunker) -> list[Document]:
+    """
+    Loads the PDFs of a directory with PyPDFDirectoryLoader and splits their text into semantic chunks.
+
+    Args:
+        directory (str): Directory of the PDFs.
+        chunker (SemanticChunker): Splitter of the page texts.
+
+    Returns:
+        list[Document]: Text chunks with their source file and page.
+    """
+    from langchain_community.document_loaders import PyPDFDirectoryLoader
+
+    return text_chunks(PyPDFDirectoryLoader(directory).load(), chunker)
+
+
+def load_tables(directory: str, api_key: str) -> dict:
+    """
+    Extracts the tables of the PDFs of a directory with LlamaParse.
+
+    Returns:
+        dict: Table rows by file name and page, `{source: {page: rows}}`.
+    """
+    from llama_parse import LlamaParse
+
+    parser = LlamaParse(
+        result_type="markdown",                     # Specify the result format
+        skip_diagonal_text=True,                    # Skip diagonal text in the PDFs
+        fast_mode=False,                            # Use normal mode for parsing
+        num_workers=9,                              # Number of workers for parallel processing
+        check_interval=10,                          # Check interval for processing
+        api_key=api_key
+    )
+
+    tables = {}
+    for pdf in sorted(os.listdir(directory)):
+        if not pdf.endswith('.pdf'):
+            continue
+        for obj in parser.get_json_result(os.path.join(directory, pdf)):
+            name = obj["file_path"].split("/")[-1]
+            tables[name] = {}
+            for page in obj['pages']:
+                for component in page['items']:
+                    if component['type'] == 'table':
+                        tables[name][page['page']] = component['rows']
+
+    return tables
+
+
+def table_chunks(tables: dict) -> list[Document]:
+    """
+    Turns the rows of each table into a chunk.
+    """
+    return [
+        Document(page_content=str(rows), metadata={"source": source, "page": page, "type": "table"})
+        for source, pages in tables.items()
+        for page, rows in pages.items()
+    ]
+
+
+def load_local_chunks(directory: str, chunker: SemanticChunker, workers: Optional[int] = None,
+                      batch_pages: int = 32) -> list[Document]:
+    """
+    Parses the PDFs of a directory locally and splits them into text chunks and tables.
+
+    Pages are streamed from the process pool to the chunker, `batch_pages` at a time. Text
+    pages are numbered from 0 and table pages from 1, as PyPDFDirectoryLoader and
+    LlamaParse number them.
+
+    Args:
+        directory (str): Directory of the PDFs.
+        chunker (SemanticChunker): Splitter of the page texts.
+        workers (Optional[int]): Parsing processes, the number of CPUs by default.
+        batch_pages (int): Pages whose sentences are embedded in one batch.
+
+    Returns:
+        list[Document]: Text chunks followed by one chunk per table page.
+    """
+    chunks, tables, pages = [], {}, []
+    for page in iter_pages(directory, workers):
+        pages.append(Document(page_content=page["text"], metadata={"source": page["source"], "page": page["page"]}))
+        if len(pages) == batch_pages:
+            chunks += text_chunks(pages, chunker)
+            pages = []
+        if page["rows"]:
+            tables.setdefault(os.path.basename(page["source"]), {})[page["page"] + 1] = page["rows"]
+
+    return chunks + text_chunks(pages, chunker) + table_chunks(tables)
+
+
+def load_chunks(directory: str, chunker: SemanticChunker, parser: str = "local",
+                llama_key: Optional[str] = None, workers: Optional[int] = None,
+                batch_pages: int = 32) -> list[Document]:
+    """
+    Loads the text chunks and tables of the PDFs of a directory.
+
+    Args:
+        directory (str): Directory of the PDFs.
+        chunker (SemanticChunker): Splitter of the page texts.
+        parser (str): "local" to parse offline, or "llamaparse" to extract the tables with LlamaParse.
+        llama_key (Optional[str]): LlamaParse API key; without it, the "llamaparse" parser skips tables.
+        workers (Optional[int]): Parsing processes of the local parser.
+        batch_pages (int): Pages whose sentences are embedded in one batch by the local parser.
+    """
+    if parser == "local":
+        return load_local_chunks(directory, chunker, workers, batch_pages)
+
+    chunks = load_text_chunks(directory, chunker)
+    if llama_key:
+        chunks += table_chunks(load_tables(directory, llama_key))
+    else:
+        print("LLAMA_KEY is not set. Skipping table extraction.")
+
+    return chunks
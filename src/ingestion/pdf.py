@@ -0,0 +1,107 @@
+import os
+from itertools import islice
+from collections import deque
+from typing import Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+
+def pdf_paths(directory: str) -> list[str]:
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.lower().endswith(".pdf")]
+
+
+def page_count(path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def table_rows(table: list[list]) -> list[list[str]]:
+    return [[cell if cell is not None else "" for cell in row] for row in table if any(row)]
+
+
+def parse_pages(path: str, start: int, stop: int, extract_tables: bool = True) -> list[dict]:
+    """
+    Extracts the text and the table rows of a range of pages of a PDF.
+
+    Runs in a worker process: the text is read with pypdf and, when pdfplumber is
+    installed, the tables with pdfplumber. The rows of all tables of a page are
+    concatenated, as one table per page is kept.
+
+    Returns:
+        list[dict]: For each page, its 0-based number, "text" and table "rows".
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    pages = [{"page": number, "text": reader.pages[number].extract_text() or "", "rows": []} for number in range(start, stop)]
+
+    if extract_tables:
+        try:
+            import pdfplumber
+        except ImportError:
+            return pages
+
+        with pdfplumber.open(path, pages=list(range(start + 1, stop + 1))) as pdf:
+            for page, plumbed in zip(pages, pdf.pages):
+                page["rows"] = [row for table in plumbed.extract_tables() for row in table_rows(table)]
+
+    return pages
+
+
+def iter_pages(directory: str, workers: Optional[int] = None, pages_per_task: int = 8,
+               extract_tables: bool = True) -> Iterator[dict]:
+    """
+    Parses the PDFs of a directory locally in a process pool and yields their pages in order.
+
+    Pages are parsed in ranges of `pages_per_task` spread over the workers, and each page
+    is yielded as soon as it and the pages before it are parsed, so that chunking can
+    start before the last document is read and whole documents are never held in memory.
+    At most `2 * workers` ranges are submitted ahead of the page being yielded.
+
+    Args:
+        directory (str): Directory of the PDFs.
+        workers (Optional[int]): Worker processes, the number of CPUs by default.
+        pages_per_task (int): Pages parsed by a worker at a time.
+        extract_tables (bool): Whether to extract the table rows of each page.
+
+    Yields:
+        dict: The "source" path, 0-based "page" number, "text" and table "rows" of each page.
+    """
+    tasks = [
+        (path, start, min(start + pages_per_task, count))
+        for path, count in ((path, page_count(path)) for path in pdf_paths(directory))
+        for start in range(0, count, pages_per_task)
+    ]
+    if not tasks:
+        return
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep at most two ranges per worker in flight, so that parsed pages waiting
+        # behind a slow range (or a slow consumer) do not pile up in memory
+        tasks = iter(tasks)
+        submit = lambda task: (task[0], executor.submit(parse_pages, *task, extract_tables))
+        pending = deque(map(submit, islice(tasks, workers * 2)))
+
+        while pending:
+            path, future = pending.popleft()
+            pages = future.result()
+            pending.extend(map(submit, islice(tasks, 1)))
+
+            for page in pages:
+                yield {"source": path, **page}
+
+
+def extract_tables(directory: str, workers: Optional[int] = None) -> dict:
+    """
+    Extracts the tables of the PDFs of a directory locally.
+
+    Returns:
+        dict: Table rows by file name and 1-based page, `{source: {page: rows}}`, as built from LlamaParse.
+    """
+    tables = {}
+    for page in iter_pages(directory, workers):
+        if page["rows"]:
+            tables.setdefault(os.path.basename(page["source"]), {})[page["page"] + 1] = page["rows"]
+
+    return tables
@@ -0,0 +1,99 @@
+import time
+import asyncio
+from typing import Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ingestion.store import build_store
+from ingestion.questions import (chunk_key,
+                                 generate_questions,
+                                 QuestionCheckpoint)
+
+
+def document_id(chunk: Document, key: str) -> str:
+    # Derived from the content hash so that unchanged chunks keep their id across runs
+    return f"{chunk.metadata['type']}-{key[:16]}"
+
+
+def question_documents(chunks: list[Document], checkpoint: QuestionCheckpoint) -> list[Document]:
+    """
+    Builds the indexed documents of hypothetical questions, with the chunk they answer in `original_content`.
+
+    Chunks without generated questions are left out.
+    """
+    documents, seen = [], set()
+    for chunk in chunks:
+        key = chunk_key(chunk)
+        questions = checkpoint.get(key)
+        if questions is None or key in seen:
+            continue
+        seen.add(key)
+
+        documents.append(Document(
+            id=document_id(chunk, key),
+            page_content=questions,
+            metadata={"original_content": chunk.page_content, **chunk.metadata}
+        ))
+
+    return documents
+
+
+def chunk_documents(chunks: list[Document]) -> list[Document]:
+    """
+    Builds the indexed documents of the text chunks themselves.
+    """
+    documents = {}
+    for chunk in chunks:
+        if chunk.metadata["type"] == "text":
+            key = chunk_key(chunk)
+            documents[key] = Document(id=document_id(chunk, key), page_content=chunk.page_content, metadata=chunk.metadata)
+
+    return list(documents.values())
+
+
+def ingest(chunks: list[Document], llm, embeddings: Embeddings, checkpoint: QuestionCheckpoint,
+           store_directory: str, store_collection: str,
+           research_directory: Optional[str] = None, research_collection: Optional[str] = None,
+           concurrency: int = 8, requests_per_minute: float = 500, max_retries: int = 3,
+           batch_size: int = 256, collection_metadata: Optional[dict] = None) -> dict:
+    """
+    Generates the questions of new or changed chunks and rebuilds the vector stores.
+
+    Args:
+        chunks (list[Document]): Text chunks and tables with "type", "source" and "page" metadata.
+        llm: Chat model generating the hypothetical questions.
+        embeddings (Embeddings): Embedding model of the stores; a cached model avoids re-embedding unchanged texts.
+        checkpoint (QuestionCheckpoint): Questions generated by previous runs.
+        store_directory (str): Persist directory of the hypothetical questions store.
+        store_collection (str): Collection of the hypothetical questions.
+        research_directory (Optional[str]): Persist directory of the text chunks store, None to skip it.
+        research_collection (Optional[str]): Collection of the text chunks.
+        concurrency (int): Question generation requests in flight.
+        requests_per_minute (float): Rate limit of question generation, 0 for none.
+        max_retries (int): Retries of a failed question generation request.
+        batch_size (int): Texts embedded per request.
+        collection_metadata (Optional[dict]): Metadata of the collections, such as their HNSW parameters.
+
+    Returns:
+        dict: Counts of chunks cached, generated and failed, and the throughput in chunks per second.
+    """
+    start = time.perf_counter()
+
+    stats = asyncio.run(generate_questions(chunks, llm, checkpoint, concurrency, requests_per_minute, max_retries))
+    generated = time.perf_counter()
+
+    build_store(question_documents(chunks, checkpoint), embeddings, store_directory, store_collection,
+                batch_size, collection_metadata)
+    if research_directory:
+        build_store(chunk_documents(chunks), embeddings, research_directory, research_collection,
+                    batch_size, collection_metadata)
+
+    elapsed = time.perf_counter() - start
+    stats.update({
+        "chunks": len(chunks),
+        "generation_s": generated - start,
+        "total_s": elapsed,
+        "chunks_per_s": len(chunks) / elapsed if elapsed else 0.0
+    })
+    return stats
@@ -0,0 +1,127 @@
+import os
+import time
+import random
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from utils.prompts import HYPOTHETICAL_QUESTIONS
+
+
+def chunk_key(chunk: Document) -> str:
+    """
+    Returns the content hash identifying a chunk across runs.
+    """
+    metadata = chunk.metadata
+    text = "\n".join([metadata["type"], str(metadata["source"]), str(metadata["page"]), chunk.page_content])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class QuestionCheckpoint:
+    """
+    Generated questions of every chunk, keyed by the content hash of the chunk and persisted in SQLite.
+
+    Each result is committed as soon as it is generated, so an interrupted run resumes
+    where it stopped and a rerun only generates questions for new or changed chunks.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS questions (key TEXT PRIMARY KEY, questions TEXT, created_at REAL)")
+        self.conn.commit()
+
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT questions FROM questions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+    def put(self, key: str, questions: str):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO questions VALUES (?, ?, ?)", (key, questions, time.time()))
+            self.conn.commit()
+
+
+    def close(self):
+        self.conn.close()
+
+
+class RateLimiter:
+    """
+    Spaces out requests so that no more than `requests_per_minute` start in any minute.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60 / requests_per_minute if requests_per_minute else 0.0
+        self.next_start = 0.0
+
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def generate_questions(chunks: list[Document], llm, checkpoint: QuestionCheckpoint,
+                             concurrency: int = 8, requests_per_minute: float = 500,
+                             max_retries: int = 3) -> dict:
+    """
+    Generates the hypothetical questions of every chunk missing from the checkpoint.
+
+    Requests run concurrently, bounded by `concurrency` and the rate limit, and are retried
+    with jittered exponential backoff. Chunks whose requests keep failing are left out of
+    the checkpoint so that the next run retries them.
+
+    Args:
+        chunks (list[Document]): Chunks with "type", "source" and "page" metadata.
+        llm: Chat model used to generate the questions.
+        checkpoint (QuestionCheckpoint): Questions generated by previous runs.
+        concurrency (int): Requests in flight at once.
+        requests_per_minute (float): Rate limit of the requests, 0 for none.
+        max_retries (int): Retries of a failed request.
+
+    Returns:
+        dict: Counts of the chunks found in the checkpoint ("cached"), generated and failed.
+    """
+    stats = {"cached": 0, "generated": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(requests_per_minute)
+
+    async def generate(chunk: Document, key: str):
+        prompt = HYPOTHETICAL_QUESTIONS[chunk.metadata["type"]].format(content=chunk.page_content)
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                await limiter.wait()
+                try:
+                    response = await llm.ainvoke(prompt)
+                    checkpoint.put(key, response.content)
+                    stats["generated"] += 1
+                    return
+                except Exception as e:
+                    if attempt == max_retries:
+                        print(f"Question generation failed for {chunk.metadata['source']} page {chunk.metadata['page']}: {e}")
+                        stats["failed"] += 1
+                        return
+                    await asyncio.sleep(2 ** attempt * (0.5 + random.random()))
+
+    pending = {}
+    for chunk in chunks:
+        key = chunk_key(chunk)
+        if key in pending:
+            continue
+        if checkpoint.get(key) is not None:
+            stats["cached"] += 1
+        else:
+            pending[key] = chunk
+
+    await asyncio.gather(*(generate(chunk, key) for key, chunk in pending.items()))
+    return stats
@@ -0,0 +1,74 @@
+import os
+import shutil
+from typing import Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+
+def replace_directory(staging: str, directory: str):
+    """
+    Moves a completed build into place, keeping the previous one until the new one is in.
+    """
+    backup = directory.rstrip("/") + ".old"
+    shutil.rmtree(backup, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, backup)
+    os.replace(staging, directory)
+    shutil.rmtree(backup, ignore_errors=True)
+
+
+def hnsw_metadata(m: int, ef_construction: int, ef_search: int) -> dict:
+    """
+    Returns the Chroma collection metadata setting the parameters of its HNSW index.
+    """
+    return {"hnsw:M": m, "hnsw:construction_ef": ef_construction, "hnsw:search_ef": ef_search}
+
+
+def close_client(client):
+    """
+    Stops a Chroma client, flushing and releasing its files, so that its directory can be moved.
+    """
+    from chromadb.api.client import SharedSystemClient
+
+    client._system.stop()
+    SharedSystemClient._identifier_to_system.pop(client._identifier, None)
+
+
+def build_store(documents: list[Document], embeddings: Embeddings, directory: str, collection_name: str,
+                batch_size: int = 256, metadata: Optional[dict] = None):
+    """
+    Builds a Chroma collection from scratch and swaps it in for the existing persist directory.
+
+    Documents are embedded `batch_size` at a time, one request per batch. The collection is
+    written to a temporary sibling directory, so readers of the current store never see
+    a partial build and a failed run leaves it untouched.
+
+    Args:
+        documents (list[Document]): Documents with their ids.
+        embeddings (Embeddings): Embedding model of the collection.
+        directory (str): Chroma persist directory to replace.
+        collection_name (str): Name of the collection.
+        batch_size (int): Documents embedded and added per batch.
+        metadata (Optional[dict]): Collection metadata, such as its HNSW parameters.
+    """
+    import chromadb
+
+    staging = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+
+    client = chromadb.PersistentClient(path=staging)
+    collection = client.create_collection(collection_name, metadata=metadata)
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        collection.add(
+            ids=[doc.id for doc in batch],
+            embeddings=embeddings.embed_documents([doc.page_content for doc in batch]),
+            documents=[doc.page_content for doc in batch],
+            metadatas=[doc.metadata for doc in batch]
+        )
+
+    close_client(client)
+    replace_directory(staging, directory)
+
+    print(f"Stored {len(documents)} documents in the {collection_name} collection at {directory}")
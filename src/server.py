@@ -0,0 +1,227 @@
+import asyncio
+from typing import Optional
+from contextlib import asynccontextmanager
+
+import uvicorn
+from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+
+from utils.lazy import singleton
+from utils.batching import MicroBatcher
+from utils.retrieve import (get_docstore,
+                            get_vector_store,
+                            get_lexical_index)
+from utils.guardrail import (is_input_allowed,
+                             get_async_llama_guard_client,
+                             afilter_inputs_with_llama_guard,
+                             afilter_input_with_llama_guard)
+from agent.workflow import get_workflow_app
+from agent.nutrition_bot import NutritionBot
+from agent.tool import (arun_workflow,
+                        cacheable_output,
+                        get_semantic_cache)
+from config import (SERVER_MAX_QUEUE,
+                    MICRO_BATCH_MAX_SIZE,
+                    MICRO_BATCH_MAX_WAIT,
+                    SERVER_QUEUE_TIMEOUT,
+                    MULTI_VECTOR_ENABLED,
+                    MICRO_BATCHING_ENABLED,
+                    HYBRID_RETRIEVAL_ENABLED,
+                    SERVER_MAX_CONCURRENCY)
+
+
+INAPPROPRIATE_MESSAGE = "I apologize, but I cannot process that input as it may be inappropriate. Please try again."
+
+
+class QueryRequest(BaseModel):
+    user_id: str
+    query: str
+
+
+class QueryResponse(BaseModel):
+    response: str
+    allowed: bool
+
+
+class RagRequest(BaseModel):
+    query: str
+
+
+class RagResponse(BaseModel):
+    response: str
+    expanded_query: str
+    context: list[dict]
+    groundedness_score: Optional[float]     # None when the judges didn't run (direct fast path)
+    precision_score: Optional[float]
+
+
+class AdmissionControl:
+    """
+    Limits the number of queries processed at once and the number waiting for a slot.
+
+    Queries beyond the queue size, or waiting longer than the timeout, are rejected
+    with 503 so that clients can retry instead of piling up behind a saturated server.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active, self.waiting, self.rejected = 0, 0, 0
+        self.semaphore = None
+
+
+    @asynccontextmanager
+    async def slot(self):
+        # Created on first use so that it belongs to the server's event loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy", headers={"Retry-After": "1"})
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Timed out waiting for a slot", headers={"Retry-After": "1"})
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.semaphore.release()
+
+
+@singleton
+def get_bot() -> NutritionBot:
+    """
+    Returns the bot shared by every request of the server process.
+    """
+    return NutritionBot()
+
+
+admission = AdmissionControl(SERVER_MAX_CONCURRENCY, SERVER_MAX_QUEUE, SERVER_QUEUE_TIMEOUT)
+
+# Concurrent guardrail checks are grouped, and identical inputs are checked once
+guard_batcher = MicroBatcher(afilter_inputs_with_llama_guard, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT)
+
+readiness = {"ready": False, "error": None}
+
+
+def warmup():
+    """
+    Builds the shared clients, vector store and compiled workflow before traffic arrives.
+    """
+    get_vector_store()
+    if MULTI_VECTOR_ENABLED:
+        get_docstore()
+    if HYBRID_RETRIEVAL_ENABLED:
+        get_lexical_index()
+    get_workflow_app()
+    get_semantic_cache()
+    get_async_llama_guard_client()
+    get_bot()
+
+
+async def run_warmup():
+    try:
+        await asyncio.to_thread(warmup)
+        readiness["ready"] = True
+        print("Server warmed up and ready.")
+    except Exception as e:
+        readiness["error"] = f"{type(e).__name__}: {e}"
+        print(f"Server warmup failed: {readiness['error']}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve health checks while warming up; readiness reports when queries can be handled
+    warmup_task = asyncio.create_task(run_warmup())
+    yield
+    warmup_task.cancel()
+
+    # Write the pending interactions before the process exits
+    if get_bot.is_initialized() and get_bot().memory_writer is not None:
+        await asyncio.to_thread(get_bot().memory_writer.close)
+
+
+app = FastAPI(title="Nutrition Disorder Specialist", lifespan=lifespan)
+
+
+def require_ready():
+    if not readiness["ready"]:
+        raise HTTPException(status_code=503, detail=readiness["error"] or "Warming up", headers={"Retry-After": "5"})
+
+
+async def is_allowed(query: str) -> bool:
+    if MICRO_BATCHING_ENABLED:
+        return is_input_allowed(await guard_batcher.submit(query))
+    return is_input_allowed(await afilter_input_with_llama_guard(query))
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query(request: QueryRequest) -> QueryResponse:
+    """
+    Answers a customer query with the agent, using and updating the customer's history.
+    """
+    require_ready()
+
+    # The guardrail runs before admission so that concurrent checks can share a batch
+    if not await is_allowed(request.query):
+        return QueryResponse(response=INAPPROPRIATE_MESSAGE, allowed=False)
+
+    async with admission.slot():
+        response = await get_bot().ahandle_customer_query(request.user_id, request.query)
+        return QueryResponse(response=response, allowed=True)
+
+
+@app.post("/agentic_rag", response_model=RagResponse)
+async def rag(request: RagRequest) -> RagResponse:
+    """
+    Runs the agentic RAG workflow directly, without the agent or the customer's history.
+    """
+    require_ready()
+    if not await is_allowed(request.query):
+        raise HTTPException(status_code=400, detail=INAPPROPRIATE_MESSAGE)
+
+    async with admission.slot():
+        output = cacheable_output(await arun_workflow(request.query))
+        return RagResponse(**{key: output[key] for key in RagResponse.model_fields})
+
+
+@app.get("/health")
+async def health() -> dict:
+    """
+    Liveness: the process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: warmup finished, with the current load of the server.
+    """
+    bot: Optional[NutritionBot] = get_bot() if get_bot.is_initialized() else None
+    body = {
+        "ready": readiness["ready"],
+        "error": readiness["error"],
+        "active": admission.active,
+        "waiting": admission.waiting,
+        "rejected": admission.rejected,
+        "guard_batches": guard_batcher.batches,
+        "guard_batched_items": guard_batcher.items,
+        "memory_writer": bot.memory_writer.metrics() if bot and bot.memory_writer else None
+    }
+    return JSONResponse(body, status_code=200 if readiness["ready"] else 503)
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8000)
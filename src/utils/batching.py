@@ -0,0 +1,111 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+
+class MicroBatcher:
+    """
+    Groups concurrent async calls into batches.
+
+    Calls submitted within `max_wait` seconds of the first pending call (or until
+    `max_batch_size` calls are pending) are passed to `run_batch` together, and each
+    caller receives its own result. The batcher lives on the running event loop and
+    starts over when it is used from a new loop.
+    """
+
+    def __init__(self, run_batch, max_batch_size: int = 32, max_wait: float = 0.01):
+        """
+        Args:
+            run_batch: Coroutine function mapping a list of items to a list of results in the same order.
+            max_batch_size (int): Number of pending calls that triggers a batch immediately.
+            max_wait (float): Seconds the first call of a batch waits for others to join.
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.loop, self.pending, self.timer = None, [], None
+        self.batches, self.items = 0, 0
+
+
+    async def submit(self, item):
+        """
+        Adds an item to the next batch and waits for its result.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop, self.pending, self.timer = loop, [], None
+
+        future = loop.create_future()
+        self.pending.append((item, future))
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        batch, self.pending = self.pending, []
+        if batch:
+            self.loop.create_task(self._run(batch))
+
+
+    async def _run(self, batch: list[tuple]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+async def unique_batch(items: list, run_one) -> list:
+    """
+    Runs `run_one` concurrently once per distinct item and maps the results back to every item.
+    """
+    unique = list(dict.fromkeys(items))
+    results = await asyncio.gather(*(run_one(item) for item in unique), return_exceptions=True)
+    by_item = dict(zip(unique, results))
+    return [by_item[item] for item in items]
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embedding model whose concurrent async query embeddings are sent as one batched request.
+
+    Synchronous calls and document batches go straight to the underlying model.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32, max_wait: float = 0.01):
+        self.embeddings = embeddings
+        self.batcher = MicroBatcher(self._embed_batch, max_batch_size, max_wait)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.batcher.submit(text)
+
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        unique = list(dict.fromkeys(texts))
+        vectors = dict(zip(unique, await self.embeddings.aembed_documents(unique)))
+        return [vectors[text] for text in texts]
@@ -0,0 +1,128 @@
+import os
+import json
+import mmap
+import shutil
+import hashlib
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class DocStore:
+    """
+    Read-only store of the original passages and tables behind the indexed hypothetical questions.
+
+    The passages are concatenated into a UTF-8 file that is memory-mapped on load, with
+    their byte offsets in a `.npy` array, so only the passages of retrieved hits are read.
+    Every indexed ID maps to the passage it was generated from; IDs generated from the
+    same source chunk share one passage.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory (str): Directory written by `build_docstore`.
+        """
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "index.json")) as f:
+            index = json.load(f)
+        self.chunks, self.metadatas = index["chunks"], index["metadatas"]
+
+        with open(os.path.join(directory, "passages.bin"), "rb") as f:
+            # An empty file cannot be memory-mapped
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+
+    def __len__(self) -> int:
+        return len(self.metadatas)
+
+
+    def chunk(self, id: str) -> Optional[int]:
+        """
+        Returns the passage number of an indexed ID, or None if the ID is unknown.
+        """
+        return self.chunks.get(id)
+
+
+    def passage(self, chunk: int) -> str:
+        return self.data[int(self.offsets[chunk]):int(self.offsets[chunk + 1])].decode("utf-8")
+
+
+    def document(self, chunk: int) -> Document:
+        return Document(
+            id=f"chunk{chunk}",
+            page_content=self.passage(chunk),
+            metadata={**self.metadatas[chunk], "chunk": chunk}
+        )
+
+
+def build_docstore(vector_store, directory: str, batch_size: int = 1000, fingerprint: Optional[str] = None):
+    """
+    Builds the docstore of a Chroma collection of hypothetical questions.
+
+    The `original_content` of each record becomes a passage, keyed by a hash of its source,
+    page and content so that records of the same chunk share it. Only the source, page and
+    type are kept as passage metadata. The store is written to a temporary sibling directory
+    and moved into place once complete.
+
+    Args:
+        vector_store: The LangChain Chroma vector store to read.
+        directory (str): Destination directory.
+        batch_size (int): Records read from the collection at a time.
+        fingerprint (Optional[str]): Fingerprint of the store files (`store_fingerprint`), written
+            next to the passages so that a docstore built from another store is detected.
+    """
+    collection = vector_store._collection
+
+    chunks, keys, metadatas, passages = {}, {}, [], []
+    for offset in range(0, collection.count(), batch_size):
+        records = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        for id, metadata in zip(records["ids"], records["metadatas"]):
+            metadata = metadata or {}
+            content = metadata.get("original_content", "")
+            source = {name: metadata[name] for name in ["source", "page", "type"] if name in metadata}
+
+            key = hashlib.sha256(json.dumps([source, content], sort_keys=True).encode("utf-8")).hexdigest()
+            if key not in keys:
+                keys[key] = len(passages)
+                passages.append(content.encode("utf-8"))
+                metadatas.append(source)
+            chunks[id] = keys[key]
+
+    staging = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    with open(os.path.join(staging, "passages.bin"), "wb") as f:
+        for passage in passages:
+            f.write(passage)
+    np.save(os.path.join(staging, "offsets.npy"), np.cumsum([0] + [len(passage) for passage in passages], dtype=np.int64))
+    with open(os.path.join(staging, "index.json"), "w") as f:
+        json.dump({"chunks": chunks, "metadatas": metadatas}, f)
+    if fingerprint is not None:
+        with open(os.path.join(staging, "fingerprint"), "w") as f:
+            f.write(fingerprint)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+    print(f"Stored {len(passages)} passages for {len(chunks)} indexed records in {directory}")
+
+
+if __name__ == "__main__":
+    from langchain_community.vectorstores import Chroma
+
+    from config import (STORE_DIRECTORY,
+                        STORE_COLLECTION,
+                        DOCSTORE_DIRECTORY)
+    from utils.semantic_cache import store_fingerprint
+
+    build_docstore(
+        Chroma(
+            collection_name=STORE_COLLECTION,
+            persist_directory=STORE_DIRECTORY
+        ),
+        DOCSTORE_DIRECTORY,
+        fingerprint=store_fingerprint(STORE_DIRECTORY)
+    )
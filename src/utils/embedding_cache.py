@@ -0,0 +1,210 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.lazy import singleton
+from utils.batching import BatchedEmbeddings
+from config import (EMBEDDING_MODEL,
+                    get_embedding_model,
+                    MICRO_BATCH_MAX_SIZE,
+                    MICRO_BATCH_MAX_WAIT,
+                    MICRO_BATCHING_ENABLED,
+                    EMBEDDING_CACHE_DIRECTORY,
+                    EMBEDDING_CACHE_MAX_ENTRIES)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed cache around an embedding model.
+
+    Vectors are keyed by a hash of the model name and the text. Recently used vectors
+    are kept in an in-memory LRU, and every vector is persisted as a row of a float32
+    file that is memory-mapped on load, so repeated texts never reach the embedding API
+    again, even across restarts. Misses of a batch are embedded in a single request.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, directory: str, max_entries: int = 10000):
+        """
+        Args:
+            embeddings (Embeddings): The underlying embedding model.
+            model_name (str): Name of the embedding model, part of every cache key.
+            directory (str): Directory holding the persisted vectors and keys.
+            max_entries (int): Number of vectors kept in the in-memory LRU.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.hits, self.misses = 0, 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.txt")
+        self.meta_path = os.path.join(directory, "meta.json")
+
+        self.dim, self.count, self.rows, self.vectors = None, 0, {}, None
+        self._load()
+
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds a batch of texts, sending only the uncached ones in one request.
+        """
+        return self._embed(texts, self.embeddings.embed_documents)
+
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        Embeds a single query.
+        """
+        return self._embed([text], lambda missing: [self.embeddings.embed_query(missing[0])])[0]
+
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds several query variants in one request.
+
+        Queries and documents share cache entries, which holds for OpenAI models where
+        `embed_query` is `embed_documents` on a single text.
+        """
+        return self.embed_documents(texts)
+
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Async variant of `embed_documents`.
+        """
+        return await self._aembed(texts, self.embeddings.aembed_documents)
+
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Async variant of `embed_queries`.
+        """
+        return await self.aembed_documents(texts)
+
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """
+        Async variant of `embed_query`.
+        """
+        async def embed_missing(missing):
+            return [await self.embeddings.aembed_query(missing[0])]
+
+        return (await self._aembed([text], embed_missing))[0]
+
+
+    def _embed(self, texts: list[str], embed_missing) -> list[list[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        if missing:
+            self._store(missing, embed_missing(list(missing.values())), vectors)
+
+        return [vectors[key].tolist() for key in keys]
+
+
+    async def _aembed(self, texts: list[str], aembed_missing) -> list[list[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        if missing:
+            self._store(missing, await aembed_missing(list(missing.values())), vectors)
+
+        return [vectors[key].tolist() for key in keys]
+
+
+    def _lookup(self, texts: list[str]):
+        keys = [self._key(text) for text in texts]
+
+        with self.lock:
+            vectors = {key: self._get(key) for key in set(keys)}
+
+        missing = {key: text for key, text in zip(keys, texts) if vectors[key] is None}
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        return keys, vectors, missing
+
+
+    def _store(self, missing: dict, embedded: list[list[float]], vectors: dict):
+        embedded = np.asarray(embedded, dtype=np.float32)
+        with self.lock:
+            self._append(list(missing.keys()), embedded)
+        vectors.update(zip(missing.keys(), embedded))
+
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode()).hexdigest()
+
+
+    def _get(self, key: str):
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory.move_to_end(key)
+        elif key in self.rows:
+            vector = np.array(self.vectors[self.rows[key]])
+            self._remember(key, vector)
+        return vector
+
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+
+        with open(self.meta_path) as f:
+            self.dim = json.load(f)["dim"]
+        with open(self.keys_path) as f:
+            keys = f.read().split()
+
+        # Drop a partially written tail so that rows and keys stay aligned
+        self.count = min(len(keys), os.path.getsize(self.vectors_path) // (4 * self.dim))
+        os.truncate(self.vectors_path, self.count * 4 * self.dim)
+        self.rows = {key: row for row, key in enumerate(keys[:self.count])}
+        if self.count:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+
+
+    def _append(self, keys: list[str], vectors: np.ndarray):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"model": self.model_name, "dim": self.dim}, f)
+
+        # Vectors are written before their keys so that a crash never leaves a dangling key
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.astype(np.float32).tobytes())
+        with open(self.keys_path, "a") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+
+        for key, vector in zip(keys, vectors):
+            self.rows[key] = self.count
+            self.count += 1
+            self._remember(key, vector)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+
+
+@singleton
+def get_cached_embedding_model() -> CachedEmbeddings:
+    """
+    Returns the cached embedding model shared by retrieval, the semantic cache and the history cache.
+    """
+    embeddings = get_embedding_model()
+    if MICRO_BATCHING_ENABLED:
+        # Cache misses of concurrent async queries are embedded in one request
+        embeddings = BatchedEmbeddings(embeddings, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT)
+
+    return CachedEmbeddings(
+        embeddings=embeddings,
+        model_name=EMBEDDING_MODEL,
+        directory=EMBEDDING_CACHE_DIRECTORY,
+        max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+    )
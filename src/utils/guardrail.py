@@ -1,9 +1,28 @@
-from groq import Groq
+from groq import Groq, AsyncGroq
 
+from utils.lazy import singleton
+from utils.http import http_client
+from utils.batching import unique_batch
 from config import GROQ_API_KEY
 
 
-llama_guard_client = Groq(api_key=GROQ_API_KEY)
+@singleton
+def get_llama_guard_client() -> Groq:
+    """
+    Returns the shared Groq client for Llama Guard.
+    """
+    return Groq(api_key=GROQ_API_KEY, http_client=http_client())
+
+
+@singleton
+def get_async_llama_guard_client() -> AsyncGroq:
+    """
+    Returns the shared async Groq client for Llama Guard.
+    """
+    return AsyncGroq(api_key=GROQ_API_KEY)
+
+# Llama Guard results that are allowed through (S6: specialized advice, S7: privacy)
+ALLOWED_RESULTS = ["safe", "unsafe S6", "unsafe S7"]
 
 
 def filter_input_with_llama_guard(user_input, model="meta-llama/llama-guard-4-12b"):
@@ -19,7 +38,7 @@ def filter_input_with_llama_guard(user_input, model="meta-llama/llama-guard-4-12
     """
     try:
         # Create a request to Llama Guard to filter the user input
-        response = llama_guard_client.chat.completions.create(
+        response = get_llama_guard_client().chat.completions.create(
             messages=[{"role": "user", "content": user_input}],
             model=model,
         )
@@ -28,4 +47,39 @@ def filter_input_with_llama_guard(user_input, model="meta-llama/llama-guard-4-12
     except Exception as e:
         print(f"Error with Llama Guard: {e}")
         return None
-    
\ No newline at end of file
+
+
+async def afilter_input_with_llama_guard(user_input, model="meta-llama/llama-guard-4-12b"):
+    """
+    Async variant of `filter_input_with_llama_guard`.
+    """
+    try:
+        response = await get_async_llama_guard_client().chat.completions.create(
+            messages=[{"role": "user", "content": user_input}],
+            model=model,
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"Error with Llama Guard: {e}")
+        return None
+
+
+async def afilter_inputs_with_llama_guard(user_inputs: list[str], model="meta-llama/llama-guard-4-12b") -> list:
+    """
+    Filters several user inputs concurrently, checking identical inputs only once.
+
+    Llama Guard classifies one conversation per request, so a batch is sent as
+    concurrent requests rather than a single one.
+    """
+    return await unique_batch(user_inputs, lambda user_input: afilter_input_with_llama_guard(user_input, model))
+
+
+def is_input_allowed(filtered_result) -> bool:
+    """
+    Checks whether a Llama Guard result allows the input to be processed.
+    """
+    if filtered_result is None:
+        return False
+
+    # Normalize the result
+    return filtered_result.replace("\n", " ") in ALLOWED_RESULTS
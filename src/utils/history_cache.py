@@ -0,0 +1,211 @@
+import time
+import threading
+from typing import Callable
+from collections import OrderedDict
+
+import numpy as np
+
+
+class UserHistory:
+    """
+    Memories of one user with their normalized embeddings.
+
+    Interactions added since the last search are kept in `pending` and embedded
+    together on the next search.
+    """
+
+    def __init__(self, memories: list[dict], matrix: np.ndarray):
+        self.memories = memories
+        self.matrix = matrix
+        self.pending = []
+        self.loaded_at = time.monotonic()
+
+
+class HistoryCache:
+    """
+    Per-user cache of mem0 memories searched locally.
+
+    On a cold start (or once the TTL expires) all memories of a user are fetched
+    from mem0 with a single `get_all` and embedded in one batch. Later turns search
+    the cached embeddings with a matrix product, and every stored interaction is added
+    to the cache as it happens, so the next search sees it before mem0 has processed it.
+
+    Interactions stay unconfirmed until `confirm` reports them written to mem0, and a
+    reload keeps them next to the memories fetched, so interactions still queued in the
+    background writer are not lost when the TTL expires.
+    """
+
+    def __init__(self, memory, get_async_memory: Callable, embeddings, ttl: float = 1800, limit: int = 5, max_users: int = 1000):
+        """
+        Args:
+            memory: mem0 `MemoryClient` used on a cold start.
+            get_async_memory (Callable): Returns the mem0 `AsyncMemoryClient` used on a cold start
+                of the async path, so that it is only built once needed.
+            embeddings: Embedding model for memories and queries (LangChain `Embeddings`).
+            ttl (float): Seconds before the memories of a user are fetched from mem0 again.
+            limit (int): Number of memories returned per search.
+            max_users (int): Users kept before the least recently used is evicted.
+        """
+        self.memory = memory
+        self.get_async_memory = get_async_memory
+        self.embeddings = embeddings
+        self.ttl = ttl
+        self.limit = limit
+        self.max_users = max_users
+        self.lock = threading.Lock()
+        self.users = OrderedDict()
+        self.unconfirmed = {}       # Interactions of each user not written to mem0 yet, oldest first
+        self.hits, self.misses = 0, 0
+
+
+    def search(self, user_id: str, query: str) -> list[dict]:
+        """
+        Returns the memories of a user most similar to the query.
+        """
+        history = self._cached(user_id)
+        if history is None:
+            memories = results(self.memory.get_all(user_id=user_id))
+            history = self._remember(user_id, memories, self._embed(self.embeddings.embed_documents, memories))
+
+        self._embed_pending(history, self.embeddings.embed_documents)
+        return self._search(history, self.embeddings.embed_query(query))
+
+
+    async def asearch(self, user_id: str, query: str) -> list[dict]:
+        """
+        Async variant of `search`.
+        """
+        history = self._cached(user_id)
+        if history is None:
+            memories = results(await self.get_async_memory().get_all(user_id=user_id))
+            history = self._remember(user_id, memories, await self._aembed(memories))
+
+        with self.lock:
+            pending, history.pending = history.pending, []
+        if pending:
+            self._extend(history, pending, await self._aembed(pending))
+        return self._search(history, await self.embeddings.aembed_query(query))
+
+
+    def add(self, user_id: str, conversation: list[dict], metadata: dict = None):
+        """
+        Adds a stored interaction to the cached memories of a user until mem0 has written it.
+
+        Warm users search it from their next turn on; cold users get it on top of the
+        memories fetched from mem0 on their next search.
+        """
+        memory = {"memory": interaction_memory(conversation), "metadata": metadata or {}}
+        with self.lock:
+            self.unconfirmed.setdefault(user_id, []).append(memory)
+            history = self.users.get(user_id)
+            if history is not None:
+                history.pending.append(memory)
+
+
+    def confirm(self, user_id: str, count: int = 1):
+        """
+        Marks the oldest unconfirmed interactions of a user as written to mem0 (or given up),
+        so that the next reload takes them from mem0.
+        """
+        with self.lock:
+            remaining = self.unconfirmed.get(user_id, [])[count:]
+            if remaining:
+                self.unconfirmed[user_id] = remaining
+            else:
+                self.unconfirmed.pop(user_id, None)
+
+
+    def invalidate(self, user_id: str):
+        """
+        Drops the cached memories of a user.
+        """
+        with self.lock:
+            self.users.pop(user_id, None)
+
+
+    def _cached(self, user_id: str):
+        with self.lock:
+            history = self.users.get(user_id)
+            if history is not None and time.monotonic() - history.loaded_at < self.ttl:
+                self.users.move_to_end(user_id)
+                self.hits += 1
+                return history
+
+            self.misses += 1
+            return None
+
+
+    def _remember(self, user_id: str, memories: list[dict], matrix: np.ndarray) -> UserHistory:
+        history = UserHistory(memories, matrix)
+        with self.lock:
+            # mem0 doesn't have the interactions still waiting to be written yet
+            history.pending = list(self.unconfirmed.get(user_id, []))
+            self.users[user_id] = history
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+        print(f" Loaded {len(memories)} memories of {user_id} from mem0.")
+        return history
+
+
+    def _embed(self, embed, memories: list[dict]) -> np.ndarray:
+        if not memories:
+            return np.empty((0, 0), dtype=np.float32)
+        return normalize(embed([memory["memory"] for memory in memories]))
+
+
+    async def _aembed(self, memories: list[dict]) -> np.ndarray:
+        if not memories:
+            return np.empty((0, 0), dtype=np.float32)
+        return normalize(await self.embeddings.aembed_documents([memory["memory"] for memory in memories]))
+
+
+    def _embed_pending(self, history: UserHistory, embed):
+        with self.lock:
+            pending, history.pending = history.pending, []
+        if pending:
+            self._extend(history, pending, self._embed(embed, pending))
+
+
+    def _extend(self, history: UserHistory, memories: list[dict], matrix: np.ndarray):
+        with self.lock:
+            history.memories = history.memories + memories
+            history.matrix = matrix if not history.matrix.size else np.vstack([history.matrix, matrix])
+
+
+    def _search(self, history: UserHistory, query_embedding: list[float]) -> list[dict]:
+        # `_extend` replaces both under the lock, so they are read together
+        with self.lock:
+            memories, matrix = history.memories, history.matrix
+        if not memories:
+            return []
+
+        scores = matrix @ normalize([query_embedding])[0]
+        top = np.argsort(-scores)[:self.limit]
+        return [{**memories[i], "score": float(scores[i])} for i in top]
+
+
+def interaction_memory(conversation: list[dict]) -> str:
+    """
+    Returns the text cached for a stored interaction until it is reloaded from mem0.
+
+    mem0 keeps facts extracted from what the customer said rather than the exchange
+    itself, so only the customer's messages are kept.
+    """
+    return "\n".join(message["content"] for message in conversation if message["role"] == "user")
+
+
+def results(response) -> list[dict]:
+    """
+    Returns the memories of a mem0 response (a list, or {"results": [...]} for output format v1.1).
+    """
+    return response.get("results", []) if isinstance(response, dict) else list(response)
+
+
+def normalize(vectors) -> np.ndarray:
+    """
+    L2-normalizes the rows of a matrix.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
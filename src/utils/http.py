@@ -0,0 +1,28 @@
+import httpx
+
+from utils.lazy import singleton
+from config import (HTTP_MAX_CONNECTIONS,
+                    HTTP_MAX_KEEPALIVE_CONNECTIONS)
+
+
+@singleton
+def get_transport() -> httpx.HTTPTransport:
+    """
+    Returns the connection pool shared by the synchronous HTTP clients of every service.
+    """
+    return httpx.HTTPTransport(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+
+
+def http_client(**kwargs) -> httpx.Client:
+    """
+    Builds a synchronous HTTP client on top of the shared connection pool.
+
+    Each service gets its own client, since some SDKs (mem0) set the base URL and
+    headers on the client they are given, while the sockets stay pooled process-wide.
+    """
+    return httpx.Client(transport=get_transport(), follow_redirects=True, **kwargs)
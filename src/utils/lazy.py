@@ -0,0 +1,25 @@
+import threading
+from functools import wraps
+
+
+def singleton(factory):
+    """
+    Turns a zero-argument factory into a thread-safe accessor of a process-wide instance.
+
+    The instance is built on the first call and shared afterwards. `accessor.reset()`
+    drops it so that the next call builds a new one.
+    """
+    lock = threading.Lock()
+    instances = []
+
+    @wraps(factory)
+    def accessor():
+        if not instances:
+            with lock:
+                if not instances:
+                    instances.append(factory())
+        return instances[0]
+
+    accessor.reset = instances.clear
+    accessor.is_initialized = lambda: bool(instances)
+    return accessor
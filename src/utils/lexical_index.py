@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import shutil
+from typing import Optional
+from collections import Counter
+
+import numpy as np
+
+
+STOPWORDS = set("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or should so
+than that the their them there these they this to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercases and splits text into alphanumeric terms, dropping stopwords.
+
+    Hyphenated words are split, so "iron-deficiency" matches "iron deficiency", and
+    mixed terms such as "B12" are kept whole.
+    """
+    return [term for term in re.findall(r"[a-z0-9]+", text.lower()) if term not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Read-only BM25 inverted index over the records of a Chroma collection.
+
+    Postings are stored as flat `.npy` arrays (record rows and term frequencies, with
+    the offsets of each term) that are memory-mapped on load, next to a JSON file with
+    the vocabulary and the record ids. A search only reads the postings of the query terms.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory (str): Directory written by `build_lexical_index`.
+        """
+        with open(os.path.join(directory, "vocabulary.json")) as f:
+            vocabulary = json.load(f)
+        self.ids, self.k1, self.b = vocabulary["ids"], vocabulary["k1"], vocabulary["b"]
+        self.terms = {term: index for index, term in enumerate(vocabulary["terms"])}
+
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self.rows = np.load(os.path.join(directory, "rows.npy"), mmap_mode="r")
+        self.frequencies = np.load(os.path.join(directory, "frequencies.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(directory, "lengths.npy")).astype(np.float32)
+
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+        document_frequencies = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (len(self.ids) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+
+
+    def search(self, query: str, k: int = 20) -> list[tuple[str, float, float]]:
+        """
+        Returns the k records with the highest BM25 score for a query.
+
+        Returns:
+            list[tuple[str, float, float]]: The id, BM25 score and the fraction of the
+            query terms found in each record, best first.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.ids:
+            return []
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matches = np.zeros(len(self.ids), dtype=np.int32)
+        for term in terms:
+            index = self.terms.get(term)
+            if index is None:
+                continue
+
+            start, end = self.offsets[index], self.offsets[index + 1]
+            rows = self.rows[start:end]
+            frequencies = self.frequencies[start:end].astype(np.float32)
+            norms = self.k1 * (1 - self.b + self.b * self.lengths[rows] / self.average_length)
+
+            # Rows are unique within the postings of a term
+            scores[rows] += self.idf[index] * frequencies * (self.k1 + 1) / (frequencies + norms)
+            matches[rows] += 1
+
+        hits = np.flatnonzero(scores)
+        hits = hits[np.argsort(-scores[hits], kind="stable")][:k]
+        return [(self.ids[row], float(scores[row]), matches[row] / len(terms)) for row in hits]
+
+
+def build_lexical_index(vector_store, directory: str, k1: float = 1.5, b: float = 0.75, batch_size: int = 1000,
+                        fingerprint: Optional[str] = None):
+    """
+    Builds the BM25 index of a Chroma collection of hypothetical questions.
+
+    Each record is indexed with its questions and the `original_content` of its chunk.
+    The index is written to a temporary sibling directory and moved into place once complete.
+
+    Args:
+        vector_store: The LangChain Chroma vector store to read.
+        directory (str): Destination directory.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 length normalization.
+        batch_size (int): Records read from the collection at a time.
+        fingerprint (Optional[str]): Fingerprint of the store files (`store_fingerprint`), written
+            next to the index so that an index built from another store is detected.
+    """
+    collection = vector_store._collection
+
+    ids, lengths, postings = [], [], {}
+    for offset in range(0, collection.count(), batch_size):
+        records = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        for id, document, metadata in zip(records["ids"], records["documents"], records["metadatas"]):
+            terms = tokenize(f"{document or ''}\n{(metadata or {}).get('original_content', '')}")
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append((len(ids), frequency))
+            ids.append(id)
+            lengths.append(len(terms))
+
+    vocabulary = sorted(postings)
+    offsets = np.cumsum([0] + [len(postings[term]) for term in vocabulary], dtype=np.int64)
+    entries = [entry for term in vocabulary for entry in postings[term]]
+
+    staging = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    np.save(os.path.join(staging, "offsets.npy"), offsets)
+    np.save(os.path.join(staging, "rows.npy"), np.array([row for row, _ in entries], dtype=np.int32))
+    np.save(os.path.join(staging, "frequencies.npy"), np.array([min(frequency, 65535) for _, frequency in entries], dtype=np.uint16))
+    np.save(os.path.join(staging, "lengths.npy"), np.array(lengths, dtype=np.int32))
+    with open(os.path.join(staging, "vocabulary.json"), "w") as f:
+        json.dump({"terms": vocabulary, "ids": ids, "k1": k1, "b": b}, f)
+    if fingerprint is not None:
+        with open(os.path.join(staging, "fingerprint"), "w") as f:
+            f.write(fingerprint)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+    print(f"Indexed {len(vocabulary)} terms of {len(ids)} records in {directory}")
+
+
+if __name__ == "__main__":
+    from langchain_community.vectorstores import Chroma
+
+    from config import (STORE_DIRECTORY,
+                        STORE_COLLECTION,
+                        LEXICAL_INDEX_DIRECTORY)
+    from utils.semantic_cache import store_fingerprint
+
+    build_lexical_index(
+        Chroma(
+            collection_name=STORE_COLLECTION,
+            persist_directory=STORE_DIRECTORY
+        ),
+        LEXICAL_INDEX_DIRECTORY,
+        fingerprint=store_fingerprint(STORE_DIRECTORY)
+    )
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Optional
+from collections import OrderedDict
+
+from langchain_core.load import dumps, loads
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+
+from utils.lazy import singleton
+from utils.streaming import RESPONSE_TAG
+from config import (get_llm,
+                    chat_model,
+                    STREAMING_RESPONSES,
+                    LLM_CACHE_NODES,
+                    LLM_CACHE_ENABLED,
+                    LLM_CACHE_MAX_BYTES,
+                    LLM_CACHE_SQLITE_PATH,
+                    LLM_CACHE_SQLITE_MAX_BYTES)
+
+
+class PromptCache:
+    """
+    Exact-match cache of LLM generations keyed by a hash of the rendered prompt and the model parameters.
+
+    Entries live in a bounded in-memory LRU tier and, optionally, in a SQLite tier that
+    survives restarts. Both tiers evict the least recently used entries once their total
+    size exceeds the configured number of bytes. Hits and misses are counted per node.
+    """
+
+    def __init__(self, max_bytes: int, sqlite_path: Optional[str] = None, sqlite_max_bytes: int = 0):
+        """
+        Args:
+            max_bytes (int): Size limit of the in-memory tier.
+            sqlite_path (Optional[str]): Location of the SQLite tier, or None to disable it.
+            sqlite_max_bytes (int): Size limit of the SQLite tier.
+        """
+        self.max_bytes = max_bytes
+        self.sqlite_max_bytes = sqlite_max_bytes
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.stats = {}
+
+        self.conn = None
+        if sqlite_path:
+            os.makedirs(os.path.dirname(sqlite_path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "key TEXT PRIMARY KEY, node TEXT, value TEXT, size INTEGER, accessed_at REAL)"
+            )
+            self.conn.commit()
+
+
+    def lookup(self, node: str, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = prompt_key(prompt, llm_string)
+
+        with self.lock:
+            value = self.memory.get(key)
+            if value is not None:
+                self.memory.move_to_end(key)
+            elif self.conn is not None:
+                row = self.conn.execute("SELECT value FROM generations WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = row[0]
+                    self.conn.execute("UPDATE generations SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                    self.conn.commit()
+                    self._put_memory(key, value)
+
+            counters = self.stats.setdefault(node, {"hits": 0, "misses": 0})
+            counters["hits" if value is not None else "misses"] += 1
+
+        if value is None:
+            return None
+
+        print(f" LLM cache hit for {node}")
+        return [loads(generation) for generation in json.loads(value)]
+
+
+    def update(self, node: str, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        key = prompt_key(prompt, llm_string)
+        value = json.dumps([dumps(generation) for generation in return_val])
+
+        with self.lock:
+            self._put_memory(key, value)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?)",
+                    (key, node, value, len(value), time.time())
+                )
+                self._evict_sqlite()
+                self.conn.commit()
+
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_bytes = 0
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM generations")
+                self.conn.commit()
+
+
+    def _put_memory(self, key: str, value: str):
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = value
+        self.memory_bytes += len(value)
+
+        # Evict the least recently used entries beyond the size limit
+        while self.memory_bytes > self.max_bytes and self.memory:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+
+    def _evict_sqlite(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM generations").fetchone()[0]
+        if total <= self.sqlite_max_bytes:
+            return
+
+        rows = self.conn.execute("SELECT key, size FROM generations ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if total <= self.sqlite_max_bytes:
+                break
+            self.conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+            total -= size
+
+
+class NodeCache(BaseCache):
+    """
+    LangChain cache adapter that attributes lookups on the shared `PromptCache` to one workflow node.
+    """
+
+    def __init__(self, cache: PromptCache, node: str):
+        self.cache = cache
+        self.node = node
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.cache.lookup(self.node, prompt, llm_string)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.cache.update(self.node, prompt, llm_string, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear()
+
+
+def prompt_key(prompt: str, llm_string: str) -> str:
+    """
+    Hashes a rendered prompt together with the serialized model parameters.
+    """
+    return hashlib.sha256(f"{llm_string}\n{prompt}".encode()).hexdigest()
+
+
+@singleton
+def get_prompt_cache() -> PromptCache:
+    """
+    Returns the prompt cache shared by every workflow node.
+    """
+    return PromptCache(
+        max_bytes=LLM_CACHE_MAX_BYTES,
+        sqlite_path=LLM_CACHE_SQLITE_PATH,
+        sqlite_max_bytes=LLM_CACHE_SQLITE_MAX_BYTES
+    )
+
+_node_llms = {}
+_node_llms_lock = threading.Lock()
+
+
+def cached_llm(node: str):
+    """
+    Returns the chat model bound to the prompt cache for the given workflow node.
+
+    Args:
+        node (str): Name of the workflow node, used for the hit and miss counters.
+
+    Returns:
+        A chat model with a per-node cache attached, or the shared chat model when caching
+        is disabled or the node is not in `LLM_CACHE_NODES`.
+    """
+    if not LLM_CACHE_ENABLED or node not in LLM_CACHE_NODES:
+        return get_llm()
+
+    with _node_llms_lock:
+        if node not in _node_llms:
+            _node_llms[node] = chat_model(cache=NodeCache(get_prompt_cache(), node))
+        return _node_llms[node]
+
+
+@singleton
+def response_llm():
+    """
+    Returns the chat model of craft_response: never cached, tagged with `RESPONSE_TAG` and
+    streaming when `STREAMING_RESPONSES` is on, so that its tokens can be shown as they come.
+    """
+    return chat_model(streaming=STREAMING_RESPONSES, tags=[RESPONSE_TAG])
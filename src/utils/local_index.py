@@ -0,0 +1,209 @@
+import os
+import json
+import shutil
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Read-only, in-process vector store over an exported copy of a Chroma collection.
+
+    The normalized embeddings are stored as a float32 (or float16) `.npy` matrix that is
+    memory-mapped on load, next to a JSON file with the ids, documents and metadata. Searches
+    run as an exact vectorized top-k over the matrix, or through an HNSW index built at
+    export time.
+    """
+
+    def __init__(self, directory: str, embedding_function: Embeddings, method: str = "exact", ef_search: int = 64):
+        """
+        Args:
+            directory (str): Directory written by `export_chroma_index`.
+            embedding_function (Embeddings): Embedding model used to embed queries.
+            method (str): "exact" for a brute-force top-k or "hnsw" for the approximate index.
+            ef_search (int): Size of the HNSW candidate list at query time.
+        """
+        self.embedding_function = embedding_function
+        self.method = method
+
+        self.matrix = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "records.json")) as f:
+            records = json.load(f)
+        self.ids, self.documents, self.metadatas = records["ids"], records["documents"], records["metadatas"]
+        self.rows = {id: row for row, id in enumerate(self.ids)}
+
+        self.hnsw = None
+        if method == "hnsw":
+            import hnswlib
+
+            self.hnsw = hnswlib.Index(space="ip", dim=self.matrix.shape[1])
+            self.hnsw.load_index(os.path.join(directory, "hnsw.bin"), max_elements=self.matrix.shape[0])
+            self.hnsw.set_ef(max(ef_search, 1))
+
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Returns the k most similar documents with their cosine similarity.
+        """
+        rows, scores = self._search(embedding, k)
+        return [(self._document(int(row)), float(score)) for row, score in zip(rows, scores)]
+
+
+    def similarity_search_with_vectors(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float, np.ndarray]]:
+        """
+        Returns the k most similar documents with their cosine similarity and stored embedding.
+        """
+        rows, scores = self._search(embedding, k)
+        return [(self._document(int(row)), float(score), np.asarray(self.matrix[row], dtype=np.float32)) for row, score in zip(rows, scores)]
+
+
+    def search_ids(self, embedding: List[float], k: int = 4) -> List[Tuple[str, float, np.ndarray]]:
+        """
+        Returns the ids of the k most similar records with their cosine similarity and stored embedding.
+        """
+        rows, scores = self._search(embedding, k)
+        return [(self.ids[row], float(score), np.asarray(self.matrix[row], dtype=np.float32)) for row, score in zip(rows, scores)]
+
+
+    def get_records(self, ids: List[str]) -> List[Tuple[Document, np.ndarray]]:
+        """
+        Returns the documents and stored embeddings of records by id, skipping unknown ids.
+        """
+        rows = [self.rows[id] for id in ids if id in self.rows]
+        return [(self._document(row), np.asarray(self.matrix[row], dtype=np.float32)) for row in rows]
+
+
+    def _search(self, embedding: List[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        k = min(k, len(self.ids))
+        if k <= 0:
+            # An empty export has nothing to partition
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self.hnsw is not None:
+            labels, distances = self.hnsw.knn_query(query, k=k)
+            return labels[0], 1.0 - distances[0]
+
+        similarities = self._similarities(query)
+        rows = np.argpartition(-similarities, k - 1)[:k]
+        rows = rows[np.argsort(-similarities[rows])]
+        return rows, similarities[rows]
+
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k)
+
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+
+    def _similarities(self, query: np.ndarray, block_rows: int = 4096) -> np.ndarray:
+        if self.matrix.dtype == np.float32:
+            return self.matrix @ query
+
+        # Half-precision products have no BLAS kernel, so blocks are widened to float32 first
+        return np.concatenate([
+            self.matrix[start:start + block_rows].astype(np.float32) @ query
+            for start in range(0, self.matrix.shape[0], block_rows)
+        ])
+
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities
+        return lambda score: score
+
+
+    def add_texts(self, texts, metadatas=None, **kwargs: Any) -> List[str]:
+        raise RuntimeError("LocalVectorStore is read-only. Add the texts to the Chroma collection and re-export it with export_chroma_index.")
+
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs: Any):
+        # Required by `VectorStore`; the store is only ever loaded from an export
+        raise TypeError("LocalVectorStore is read-only. Build it from a Chroma collection with export_chroma_index.")
+
+
+    def _document(self, row: int) -> Document:
+        return Document(id=self.ids[row], page_content=self.documents[row], metadata=self.metadatas[row])
+
+
+def export_chroma_index(vector_store, directory: str, hnsw_m: int = 16, hnsw_ef_construction: int = 200, float16: bool = False):
+    """
+    Exports a Chroma collection into the directory layout read by `LocalVectorStore`.
+
+    The export is written to a temporary sibling directory and moved into place once complete.
+
+    Args:
+        vector_store: The LangChain Chroma vector store to export.
+        directory (str): Destination directory.
+        hnsw_m (int): Number of HNSW graph links per element.
+        hnsw_ef_construction (int): Size of the HNSW candidate list while building.
+        float16 (bool): Store the embedding matrix in half precision, halving its size.
+    """
+    import hnswlib
+
+    collection = vector_store._collection.get(include=["embeddings", "documents", "metadatas"])
+
+    matrix = np.asarray(collection["embeddings"], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    staging = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    np.save(os.path.join(staging, "embeddings.npy"), matrix.astype(np.float16) if float16 else matrix)
+    with open(os.path.join(staging, "records.json"), "w") as f:
+        json.dump({
+            "ids": collection["ids"],
+            "documents": collection["documents"],
+            "metadatas": collection["metadatas"]
+        }, f)
+
+    hnsw = hnswlib.Index(space="ip", dim=matrix.shape[1])
+    hnsw.init_index(max_elements=matrix.shape[0], M=hnsw_m, ef_construction=hnsw_ef_construction)
+    hnsw.add_items(matrix, np.arange(matrix.shape[0]))
+    hnsw.save_index(os.path.join(staging, "hnsw.bin"))
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+    print(f"Exported {matrix.shape[0]} embeddings of dimension {matrix.shape[1]} to {directory}")
+
+
+if __name__ == "__main__":
+    from langchain_community.vectorstores import Chroma
+
+    from config import (STORE_HNSW_M,
+                        STORE_DIRECTORY,
+                        get_embedding_model,
+                        STORE_COLLECTION,
+                        LOCAL_INDEX_FLOAT16,
+                        LOCAL_INDEX_DIRECTORY,
+                        STORE_HNSW_EF_CONSTRUCTION)
+
+    export_chroma_index(
+        Chroma(
+            collection_name=STORE_COLLECTION,
+            persist_directory=STORE_DIRECTORY,
+            embedding_function=get_embedding_model()
+        ),
+        LOCAL_INDEX_DIRECTORY,
+        STORE_HNSW_M,
+        STORE_HNSW_EF_CONSTRUCTION,
+        LOCAL_INDEX_FLOAT16
+    )
@@ -0,0 +1,201 @@
+import time
+import queue
+import atexit
+import random
+import threading
+from typing import Callable, Optional
+
+
+class MemoryWriter:
+    """
+    Background writer that moves mem0 interaction writes off the response path.
+
+    Interactions are put on a bounded queue and written by a single worker thread.
+    The worker drains up to `batch_size` queued interactions at a time and coalesces
+    those of the same user and metadata (apart from their timestamp) into one `memory.add` call. Failed writes are retried
+    with exponential backoff, and the queue is flushed when the process exits.
+    """
+
+    def __init__(self, memory, max_queue_size: int = 1000, batch_size: int = 16,
+                 max_retries: int = 5, backoff: float = 0.5, enqueue_timeout: float = 1.0,
+                 on_done: Optional[Callable[[str, int], None]] = None):
+        """
+        Args:
+            memory: mem0 `MemoryClient` used for the writes.
+            max_queue_size (int): Maximum number of interactions waiting to be written.
+            batch_size (int): Maximum number of interactions drained per batch.
+            max_retries (int): Attempts per write before it is given up.
+            backoff (float): Initial retry delay in seconds, doubled after every failure.
+            enqueue_timeout (float): Seconds a blocking `submit` waits for room on a full queue.
+            on_done (Callable, optional): Called with a user ID and a number of interactions
+                once they have been written or given up.
+        """
+        self.memory = memory
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.enqueue_timeout = enqueue_timeout
+        self.on_done = on_done
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.stats = {"submitted": 0, "written": 0, "batches": 0, "calls": 0,
+                      "retries": 0, "failed": 0, "dropped": 0, "max_depth": 0}
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.worker = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+
+
+    def submit(self, user_id: str, conversation: list[dict], metadata: dict, block: bool = True) -> bool:
+        """
+        Queues an interaction for writing.
+
+        Args:
+            user_id (str): Unique identifier for the customer.
+            conversation (list[dict]): Messages of the interaction.
+            metadata (dict): Metadata stored with the interaction.
+            block (bool): Wait up to `enqueue_timeout` for room when the queue is full.
+
+        Returns:
+            bool: Whether the interaction was queued; it is dropped when the queue stays full.
+        """
+        if self.closed:
+            print(" Memory writer closed. Dropping interaction.")
+            return False
+
+        try:
+            self.queue.put((user_id, conversation, metadata), block=block, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self.lock:
+                self.stats["dropped"] += 1
+            print(f" Memory write queue full ({self.queue.qsize()}). Dropping interaction.")
+            return False
+
+        with self.lock:
+            self.stats["submitted"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], self.queue.qsize())
+        return True
+
+
+    def metrics(self) -> dict:
+        """
+        Returns the current queue depth together with the write counters.
+        """
+        with self.lock:
+            return {"queue_depth": self.queue.qsize(), **self.stats}
+
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until every queued interaction has been written or given up.
+
+        Returns:
+            bool: Whether the queue was drained within the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+
+    def close(self, timeout: float = 30.0):
+        """
+        Flushes the pending writes and stops the worker.
+        """
+        if self.closed:
+            return
+
+        self.closed = True
+        if not self.flush(timeout):
+            print(f" Memory writer closed with {self.queue.qsize()} interactions unwritten.")
+        try:
+            self.queue.put(None, timeout=1.0)
+        except queue.Full:
+            return
+        self.worker.join(timeout=1.0)
+
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+
+            # Drain whatever else is already waiting, up to the batch size
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)    # Handle the stop signal after this batch
+                    self.queue.task_done()
+                    break
+                batch.append(item)
+
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
+    def _write_batch(self, batch: list[tuple]):
+        # Coalesce the interactions of each user into a single write, keeping their order.
+        # The metadata applies to the whole write, so a change of metadata starts a new one.
+        # Every interaction has its own timestamp: a write keeps the one of its latest interaction.
+        writes, last = [], {}
+        for user_id, conversation, metadata in batch:
+            if user_id in last and coalescing_key(writes[last[user_id]][2]) == coalescing_key(metadata):
+                _, messages, _, count = writes[last[user_id]]
+                writes[last[user_id]] = (user_id, messages + conversation, metadata, count + 1)
+            else:
+                last[user_id] = len(writes)
+                writes.append((user_id, conversation, metadata, 1))
+
+        for user_id, messages, metadata, count in writes:
+            if self._write(user_id, messages, metadata):
+                with self.lock:
+                    self.stats["written"] += count
+            else:
+                with self.lock:
+                    self.stats["failed"] += count
+            if self.on_done is not None:
+                self.on_done(user_id, count)
+
+        with self.lock:
+            self.stats["batches"] += 1
+
+
+    def _write(self, user_id: str, messages: list[dict], metadata: dict) -> bool:
+        for attempt in range(self.max_retries):
+            try:
+                with self.lock:
+                    self.stats["calls"] += 1
+                self.memory.add(messages, user_id=user_id, output_format="v1.1", metadata=metadata)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    print(f" Memory write for {user_id} failed after {self.max_retries} attempts: {e}")
+                    return False
+
+                delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+                print(f" Memory write for {user_id} failed ({e}). Retrying in {delay:.1f}s.")
+                with self.lock:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+
+
+def coalescing_key(metadata: dict) -> dict:
+    """
+    Returns the metadata that must match for interactions to be written together.
+    """
+    return {key: value for key, value in metadata.items() if key != "timestamp"}
@@ -0,0 +1,66 @@
+import math
+
+import tiktoken
+from langchain_core.documents import Document
+
+from utils.lazy import singleton
+from config import CHAT_MODEL
+
+
+# Used to estimate token counts when the tokenizer cannot be loaded
+CHARS_PER_TOKEN = 4
+
+
+@singleton
+def get_encoding():
+    """
+    Returns the tokenizer of the chat model, or None when its vocabulary cannot be loaded (e.g. offline).
+    """
+    try:
+        return tiktoken.encoding_for_model(CHAT_MODEL)
+    except Exception as e:
+        print(f"Tokenizer unavailable ({type(e).__name__}: {e}). Estimating {CHARS_PER_TOKEN} characters per token.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def pack_documents(docs: list[Document], max_tokens: int) -> list[Document]:
+    """
+    Keeps the documents, in order of relevance, that fit in a token budget together.
+
+    Documents that would overflow the budget are skipped so that shorter ones after them
+    can still fit. If even the most relevant document is too long, it is truncated rather
+    than leaving the context empty.
+
+    Args:
+        docs (list[Document]): Documents ordered from most to least relevant.
+        max_tokens (int): Token budget of the joined context.
+
+    Returns:
+        list[Document]: The packed documents.
+    """
+    packed, used = [], 0
+    for doc in docs:
+        tokens = count_tokens(doc.page_content) + 1     # The newline joining it to the next document
+        if used + tokens <= max_tokens:
+            packed.append(doc)
+            used += tokens
+        elif not packed:
+            content = truncate_tokens(doc.page_content, max_tokens - 1)
+            packed.append(Document(id=doc.id, page_content=content, metadata=doc.metadata))
+            used = max_tokens
+
+    return packed
@@ -40,7 +40,7 @@ GENERATE = {
     If a feedback is provided, use it to improve your response - address gaps, clarify ambiguities, or adjust tone as needed.
     """,
     
-    "query": "Query: {query}\nContext: {context}\n\nfeedback: {feedback}"
+    "query": "{history}Query: {query}\nContext: {context}\n\nfeedback: {feedback}"
 }
 
 GROUNDEDNESS = {
@@ -121,6 +121,25 @@ EXPANSION = {
     "query": "Expand this query: {query} using the feedback: {query_feedback}"
 }
 
+MULTI_QUERY = {
+    "system": """
+    You are a domain expert in nutrition and medical disorders, specializing in understanding user intent and writing search queries for optimal information retrieval.
+
+    Your task is to rewrite a user's query as {count} distinct search queries that are all searched at once.
+    Together they should cover what the user needs, so that a relevant passage is found even when it uses other words than the user.
+
+    Guidelines:
+    - Approach the query from different angles: related conditions, symptoms, biomarkers, nutrients, foods or treatment approaches.
+    - Use both clinical terminology and everyday wording.
+    - Disambiguate vague or general terms (e.g., replace "bad diet" with "high-sugar, low-fiber diet").
+    - If user feedback is provided, incorporate it into the queries.
+
+    Output exactly {count} queries, one per line, without numbering or explanations.
+    """,
+
+    "query": "Rewrite this query: {query} using the feedback: {query_feedback}"
+}
+
 REFINEMENT = {
     "system": """
     You are an expert in nutrition and medical disorders.
@@ -160,3 +179,24 @@ RESPONSE_REFINEMENT = {
 
     "query": "Query: {query}\nResponse: {response}\n\nWhat improvements can be made to enhance accuracy and completeness?"
 }
+
+# Prompts used at ingestion to generate the indexed questions of each text chunk and table
+HYPOTHETICAL_QUESTIONS = {
+    "text": """
+Generate a list of exactly 5 hypothetical questions that the below nutritional disorder document could be used to answer:
+{content}
+
+If the content cannot answer any questions, return an empty list.
+Generate only a list of questions. Do not mention anything before or after the list.
+Ensure that the questions are specific to nutritional disorders, dietary deficiencies, metabolic disorders, vitamin and mineral imbalances, obesity, and related health conditions.
+""",
+
+    "table": """
+Generate a list of exactly 5 hypothetical questions that the below nutritional disorder table could be used to answer:
+{content}
+
+If the content cannot answer any questions, return an empty list.
+Generate only a list of questions. Do not mention anything before or after the list.
+Ensure that the questions are specific to nutritional disorders, dietary deficiencies, metabolic disorders, vitamin and mineral imbalances, obesity, and related health conditions.
+"""
+}
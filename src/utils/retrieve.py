@@ -1,28 +1,547 @@
-from langchain_community.vectorstores import Chroma
+import os
+import time
+import asyncio
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 
-from config import (embedding_model, 
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import (CallbackManagerForRetrieverRun,
+                                      AsyncCallbackManagerForRetrieverRun)
+
+from utils.lazy import singleton
+from config import (RRF_K,
+                    RETRIEVAL_K,
                     STORE_DIRECTORY, 
-                    STORE_COLLECTION)
+                    STORE_COLLECTION, 
+                    RETRIEVAL_FETCH_K,
+                    RETRIEVAL_BACKEND, 
+                    LOCAL_INDEX_METHOD, 
+                    DOCSTORE_DIRECTORY,
+                    RETRIEVAL_MIN_SCORE,
+                    MULTI_VECTOR_ENABLED,
+                    RETRIEVAL_MMR_LAMBDA,
+                    LOCAL_INDEX_DIRECTORY, 
+                    LOCAL_INDEX_EF_SEARCH,
+                    LEXICAL_INDEX_DIRECTORY,
+                    LEXICAL_ONLY_MAX_TERMS,
+                    LOOP_REUSE_ENABLED,
+                    LOOP_REUSE_THRESHOLD,
+                    MULTI_QUERY_VARIANTS,
+                    HYBRID_RETRIEVAL_ENABLED,
+                    RETRIEVAL_MAX_CONTEXT_TOKENS)
+from utils.packing import pack_documents
+from utils.reuse import (record_run,
+                         record_skip,
+                         cosine_similarity)
+from utils.docstore import DocStore, build_docstore
+from utils.semantic_cache import store_fingerprint
+from utils.local_index import LocalVectorStore
+from utils.lexical_index import LexicalIndex, build_lexical_index, tokenize
+from utils.embedding_cache import get_cached_embedding_model
+
+
+# Searches of the query variants of a multi-query retrieval
+executor = ThreadPoolExecutor(max_workers=MULTI_QUERY_VARIANTS + 1, thread_name_prefix="retrieval")
+
+
+@singleton
+def get_vector_store():
+    """
+    Returns the vector store of the configured retrieval backend, opened on first use.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        # Initialize the in-process index exported from the Chroma collection
+        return LocalVectorStore(
+            directory=LOCAL_INDEX_DIRECTORY,
+            embedding_function=get_cached_embedding_model(),
+            method=LOCAL_INDEX_METHOD,
+            ef_search=LOCAL_INDEX_EF_SEARCH
+        )
+
+    # Initialize the Chroma vector store for retrieving documents
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(
+        collection_name=STORE_COLLECTION,
+        persist_directory=STORE_DIRECTORY,
+        embedding_function=get_cached_embedding_model()
+    )
+
+
+def is_stale(directory: str) -> bool:
+    """
+    Whether an artifact derived from the vector store is missing or was built from other store files.
+    """
+    path = os.path.join(directory, "fingerprint")
+    if not os.path.exists(path):
+        return True
+
+    with open(path) as f:
+        return f.read() != store_fingerprint(STORE_DIRECTORY)
+
+
+@singleton
+def get_docstore() -> DocStore:
+    """
+    Returns the docstore of original passages, (re)building it from the Chroma collection if
+    missing or built from another version of the store.
+    """
+    if is_stale(DOCSTORE_DIRECTORY):
+        from langchain_community.vectorstores import Chroma
+
+        reason = "is outdated" if os.path.exists(DOCSTORE_DIRECTORY) else "not found"
+        print(f"Docstore at {DOCSTORE_DIRECTORY} {reason}. Building it from the {STORE_COLLECTION} collection.")
+        store = Chroma(collection_name=STORE_COLLECTION, persist_directory=STORE_DIRECTORY)
+        build_docstore(store, DOCSTORE_DIRECTORY, fingerprint=store_fingerprint(STORE_DIRECTORY))
+
+    return DocStore(DOCSTORE_DIRECTORY)
+
+
+def report_unresolved(found: int, total: int, where: str):
+    """
+    Logs retrieved ids that are missing from the store their documents are read from.
+    """
+    if found < total:
+        print(f" {total - found} of {total} retrieved ids are missing from {where}. Their hits are dropped.")
+
+
+def cosine_scores(collection, distances: list[float]) -> list[float]:
+    """
+    Converts Chroma distances to cosine similarities (the embeddings are unit-normalized), so
+    that thresholds mean the same on both backends.
+    """
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+
+    # Squared L2 distance of unit vectors is 2 - 2cos; cosine and inner-product distances are 1 - cos
+    return [1 - distance / 2 if space == "l2" else 1 - distance for distance in distances]
+
+
+def search_ids(embedding: list[float], k: int) -> list[tuple[str, float, list[float]]]:
+    """
+    Returns the ids of the k nearest records with their cosine similarity to the query embedding and their own embedding.
+
+    Neither the indexed text nor the metadata of the records is loaded.
+    """
+    vector_store = get_vector_store()
+    if isinstance(vector_store, LocalVectorStore):
+        return vector_store.search_ids(embedding, k=k)
+
+    collection = vector_store._collection
+    results = collection.query(query_embeddings=[embedding], n_results=k, include=["distances", "embeddings"])
+
+    return list(zip(results["ids"][0], cosine_scores(collection, results["distances"][0]), results["embeddings"][0]))
+
+
+def search_candidates(embedding: list[float], k: int) -> list[tuple[Document, float, list[float]]]:
+    """
+    Returns the k nearest documents with their cosine similarity to the query embedding and their own embedding.
+
+    In multi-vector mode the records matched are hypothetical questions and the documents
+    returned are the original passages they were generated from, read from the docstore.
+    """
+    if MULTI_VECTOR_ENABLED:
+        docstore = get_docstore()
+        hits, candidates = search_ids(embedding, k), []
+        for id, score, vector in hits:
+            chunk = docstore.chunk(id)
+            if chunk is not None:
+                candidates.append((docstore.document(chunk), score, vector))
+        report_unresolved(len(candidates), len(hits), f"the docstore at {DOCSTORE_DIRECTORY}")
+        return candidates
+
+    vector_store = get_vector_store()
+    if isinstance(vector_store, LocalVectorStore):
+        return vector_store.similarity_search_with_vectors(embedding, k=k)
+
+    collection = vector_store._collection
+    results = collection.query(
+        query_embeddings=[embedding],
+        n_results=k,
+        include=["documents", "metadatas", "distances", "embeddings"]
+    )
+
+    documents = [
+        Document(id=id, page_content=content, metadata=metadata or {})
+        for id, content, metadata in zip(results["ids"][0], results["documents"][0], results["metadatas"][0])
+    ]
+    return list(zip(documents, cosine_scores(collection, results["distances"][0]), results["embeddings"][0]))
+
+
+def get_records(ids: list[str]) -> dict[str, tuple[Document, np.ndarray]]:
+    """
+    Returns the indexed documents and stored embeddings of records by id.
+    """
+    if not ids:
+        return {}
+
+    vector_store = get_vector_store()
+    if isinstance(vector_store, LocalVectorStore):
+        return {doc.id: (doc, vector) for doc, vector in vector_store.get_records(ids)}
+
+    results = vector_store._collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+    return {
+        id: (Document(id=id, page_content=content, metadata=metadata or {}), np.asarray(vector, dtype=np.float32))
+        for id, content, metadata, vector in zip(results["ids"], results["documents"], results["metadatas"], results["embeddings"])
+    }
+
+
+def zip_documents(hits: list[tuple[str, tuple]]) -> list[tuple[tuple, Document]]:
+    """
+    Pairs the values of record ids with the documents they stand for, dropping unknown ids.
+
+    In multi-vector mode these are the original passages read from the docstore, otherwise
+    the indexed documents themselves.
+    """
+    if MULTI_VECTOR_ENABLED:
+        docstore = get_docstore()
+        chunks = [(value, docstore.chunk(id)) for id, value in hits]
+        documents = [(value, docstore.document(chunk)) for value, chunk in chunks if chunk is not None]
+        report_unresolved(len(documents), len(hits), f"the docstore at {DOCSTORE_DIRECTORY}")
+        return documents
+
+    records = get_records([id for id, _ in hits])
+    return [(value, records[id][0]) for id, value in hits if id in records]
+
+
+def fuse_rankings(rankings: list[list[str]], k: int = 60) -> dict[str, float]:
+    """
+    Combines rankings of record ids by reciprocal rank fusion.
+
+    Returns:
+        dict[str, float]: The sum of 1 / (k + rank) over the rankings each id appears in.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking, start=1):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, vectors: np.ndarray, lambda_mult: float, k: int) -> list[int]:
+    """
+    Picks k candidates by maximal marginal relevance, trading their relevance to the query
+    off against their cosine similarity to the candidates already picked.
+
+    Returns:
+        list[int]: The indices of the candidates picked, in order.
+    """
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarities = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(relevance)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * similarities[:, selected].max(axis=1)
+        scores[selected] = -np.inf
+        selected.append(int(np.argmax(scores)))
+
+    return selected
+
+
+@singleton
+def get_lexical_index() -> LexicalIndex:
+    """
+    Returns the BM25 index of the vector store records, (re)building it from the Chroma collection
+    if missing or built from another version of the store.
+    """
+    if is_stale(LEXICAL_INDEX_DIRECTORY):
+        from langchain_community.vectorstores import Chroma
+
+        reason = "is outdated" if os.path.exists(LEXICAL_INDEX_DIRECTORY) else "not found"
+        print(f"Lexical index at {LEXICAL_INDEX_DIRECTORY} {reason}. Building it from the {STORE_COLLECTION} collection.")
+        store = Chroma(collection_name=STORE_COLLECTION, persist_directory=STORE_DIRECTORY)
+        build_lexical_index(store, LEXICAL_INDEX_DIRECTORY, fingerprint=store_fingerprint(STORE_DIRECTORY))
+
+    return LexicalIndex(LEXICAL_INDEX_DIRECTORY)
+
+
+class ScoredRetriever(BaseRetriever):
+    """
+    Retriever returning relevant, diverse documents that fit in a token budget.
+
+    It fetches `fetch_k` candidates, drops those below `min_score` and repeated contents
+    (such as several questions generated from the same source chunk), picks `k` of the
+    rest by maximal marginal relevance and packs them into `max_tokens`. The cosine
+    similarity of each document to the query is kept in `metadata["score"]`.
+
+    In hybrid mode the `fetch_k` best BM25 matches are fused with the vector candidates by
+    reciprocal rank fusion, which then ranks them for MMR. Short queries whose terms are
+    all found in the best lexical match are answered from the lexical index alone, without
+    embedding the query; their documents carry no score.
+    """
+
+    k: int = 5
+    fetch_k: int = 20
+    min_score: float = 0.0
+    mmr_lambda: float = 1.0                 # 1 ranks by similarity only, lower values favour diversity
+    max_tokens: Optional[int] = None        # None keeps all k documents
+    hybrid: bool = False
+    rrf_k: int = 60
+    lexical_only_max_terms: int = 0         # 0 always embeds the query
+
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        return self.retrieve(query, self.search_lexical(query))
+
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        return await self.aretrieve(query, await asyncio.to_thread(self.search_lexical, query))
+
+
+    def retrieve(self, query: str, lexical: list[tuple[str, float, float]], embedding: Optional[list[float]] = None) -> list[Document]:
+        """
+        Retrieves with the lexical matches of the query, embedding it only when it is not
+        answered from the lexical index alone and no embedding is given.
+        """
+        if self.is_lexical_only(query, lexical):
+            return self.select(self.lexical_candidates(lexical))
+
+        embedding = embedding or get_cached_embedding_model().embed_query(query)
+        return self.select(self.candidates(embedding, lexical))
+
+
+    async def aretrieve(self, query: str, lexical: list[tuple[str, float, float]], embedding: Optional[list[float]] = None) -> list[Document]:
+        """
+        Async variant of `retrieve`.
+        """
+        if self.is_lexical_only(query, lexical):
+            return self.select(await asyncio.to_thread(self.lexical_candidates, lexical))
+
+        embedding = embedding or await get_cached_embedding_model().aembed_query(query)
+        return self.select(await asyncio.to_thread(self.candidates, embedding, lexical))
+
 
+    def search_lexical(self, query: str) -> list[tuple[str, float, float]]:
+        return get_lexical_index().search(query, k=self.fetch_k) if self.hybrid else []
 
-# Initialize the Chroma vector store for retrieving documents
-vector_store = Chroma(
-    collection_name=STORE_COLLECTION,
-    persist_directory=STORE_DIRECTORY,
-    embedding_function=embedding_model
-)
 
-# Create a retriever from the vector store
-retriever = vector_store.as_retriever(
-    search_type='similarity',
-    search_kwargs={'k': 5}
-)
+    def is_lexical_only(self, query: str, lexical: list[tuple[str, float, float]]) -> bool:
+        # The best match contains every term of a short query, such as a nutrient or food name
+        return bool(lexical) and len(set(tokenize(query))) <= self.lexical_only_max_terms and lexical[0][2] == 1.0
+
+
+    def answers_lexically(self, query: str) -> bool:
+        """
+        Whether a query is answered from the lexical index alone, so that it never needs an embedding.
+        """
+        return (self.hybrid and len(set(tokenize(query))) <= self.lexical_only_max_terms
+                and self.is_lexical_only(query, self.search_lexical(query)))
+
+
+    def embed_queries(self, queries: list[str], lexicals: list[list[tuple[str, float, float]]]) -> list[Optional[list[float]]]:
+        """
+        Embeds in one request the queries not answered from the lexical index alone. The others get None.
+        """
+        embedded = [query for query, lexical in zip(queries, lexicals) if not self.is_lexical_only(query, lexical)]
+        vectors = iter(get_cached_embedding_model().embed_queries(embedded) if embedded else [])
+        return [None if self.is_lexical_only(query, lexical) else next(vectors) for query, lexical in zip(queries, lexicals)]
+
+
+    async def aembed_queries(self, queries: list[str], lexicals: list[list[tuple[str, float, float]]]) -> list[Optional[list[float]]]:
+        """
+        Async variant of `embed_queries`.
+        """
+        embedded = [query for query, lexical in zip(queries, lexicals) if not self.is_lexical_only(query, lexical)]
+        vectors = iter(await get_cached_embedding_model().aembed_queries(embedded) if embedded else [])
+        return [None if self.is_lexical_only(query, lexical) else next(vectors) for query, lexical in zip(queries, lexicals)]
+
+
+    def lexical_candidates(self, lexical: list[tuple[str, float, float]]) -> list[tuple[Document, Optional[float], np.ndarray, float]]:
+        """
+        Returns the documents of lexical matches, with their BM25 score relative to the best as relevance.
+        """
+        records = get_records([id for id, _, _ in lexical])
+        top = lexical[0][1]
+        hits = [(id, (None, records[id][1], score / top)) for id, score, _ in lexical if id in records]
+        report_unresolved(len(hits), len(lexical), f"the {STORE_COLLECTION} collection")
+        return [(doc, *value) for value, doc in zip_documents(hits)]
+
+
+    def candidates(self, embedding: list[float], lexical: list[tuple[str, float, float]]) -> list[tuple[Document, Optional[float], np.ndarray, float]]:
+        """
+        Returns the candidate documents with their cosine similarity, stored embedding and relevance.
+
+        Without lexical matches the relevance is the cosine similarity. Otherwise it is the
+        reciprocal rank fusion score relative to the best, and the cosine similarity of lexical
+        matches outside the vector candidates is computed from their stored embedding.
+        """
+        if not lexical:
+            return [(doc, score, np.asarray(vector, dtype=np.float32), score)
+                    for doc, score, vector in search_candidates(embedding, self.fetch_k)]
+
+        vector_hits = search_ids(embedding, self.fetch_k)
+        fused = fuse_rankings([[id for id, _, _ in vector_hits], [id for id, _, _ in lexical]], self.rrf_k)
+
+        hits = {id: (score, np.asarray(vector, dtype=np.float32)) for id, score, vector in vector_hits}
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        for id, (_, vector) in get_records([id for id in fused if id not in hits]).items():
+            hits[id] = (float(query @ vector / (np.linalg.norm(vector) or 1.0)), vector)
+
+        top = max(fused.values())
+        ranked = [(id, (*hits[id], fused[id] / top)) for id in sorted(fused, key=fused.get, reverse=True) if id in hits]
+        return [(doc, *value) for value, doc in zip_documents(ranked)]
+
+
+    def multi_query(self, lexicals: list[list[tuple[str, float, float]]], embeddings: list[Optional[list[float]]]) -> list[Document]:
+        """
+        Retrieves with several query variants at once from their lexical matches and embeddings
+        (see `embed_queries`), searching them concurrently.
+        """
+        return self.select(self.fuse_candidates(list(executor.map(self.search, lexicals, embeddings))))
+
+
+    async def amulti_query(self, lexicals: list[list[tuple[str, float, float]]], embeddings: list[Optional[list[float]]]) -> list[Document]:
+        """
+        Async variant of `multi_query`.
+        """
+        rankings = await asyncio.gather(*(
+            asyncio.to_thread(self.search, lexical, embedding) for lexical, embedding in zip(lexicals, embeddings)
+        ))
+        return self.select(self.fuse_candidates(list(rankings)))
+
+
+    def search(self, lexical: list[tuple[str, float, float]], embedding: Optional[list[float]]) -> list[tuple[Document, Optional[float], np.ndarray, float]]:
+        # Queries answered from the lexical index alone are not embedded
+        return self.lexical_candidates(lexical) if embedding is None else self.candidates(embedding, lexical)
+
+
+    def fuse_candidates(self, rankings: list[list[tuple[Document, Optional[float], np.ndarray, float]]]) -> list[tuple[Document, Optional[float], np.ndarray, float]]:
+        """
+        Fuses the candidates of several query variants by reciprocal rank fusion.
+
+        A document found by several variants keeps its best cosine similarity, and its
+        fused score relative to the best becomes its relevance.
+        """
+        documents, ranked_ids = {}, []
+        for candidates in rankings:
+            ranked = sorted(candidates, key=lambda candidate: candidate[3], reverse=True)
+            ranked_ids.append([doc.id or doc.page_content for doc, _, _, _ in ranked])
+            for doc, score, vector, _ in ranked:
+                key = doc.id or doc.page_content
+                best = documents.get(key)
+                if best is None or (score is not None and (best[1] is None or score > best[1])):
+                    documents[key] = (doc, score, vector)
+
+        fused = fuse_rankings(ranked_ids, self.rrf_k)
+        if not fused:
+            return []
+
+        top = max(fused.values())
+        return [(*documents[key], fused[key] / top) for key in sorted(fused, key=fused.get, reverse=True)]
+
+
+    def select(self, candidates: list[tuple[Document, Optional[float], np.ndarray, float]]) -> list[Document]:
+        kept, seen = [], set()
+        for doc, score, vector, relevance in candidates:
+            if (score is not None and score < self.min_score) or doc.page_content in seen:
+                continue
+            seen.add(doc.page_content)
+            kept.append((doc, score, vector, relevance))
+
+        if not kept:
+            return []
+
+        order = maximal_marginal_relevance(
+            np.asarray([relevance for _, _, _, relevance in kept], dtype=np.float32),
+            np.asarray([vector for _, _, vector, _ in kept], dtype=np.float32),
+            lambda_mult=self.mmr_lambda,
+            k=self.k
+        )
+        docs = [
+            Document(id=kept[i][0].id, page_content=kept[i][0].page_content,
+                     metadata=kept[i][0].metadata if kept[i][1] is None else {**kept[i][0].metadata, "score": kept[i][1]})
+            for i in order
+        ]
+
+        return pack_documents(docs, self.max_tokens) if self.max_tokens else docs
+
+
+@singleton
+def get_retriever() -> ScoredRetriever:
+    """
+    Returns the retriever over the shared vector store.
+    """
+    return ScoredRetriever(
+        k=RETRIEVAL_K,
+        fetch_k=RETRIEVAL_FETCH_K,
+        min_score=RETRIEVAL_MIN_SCORE,
+        mmr_lambda=RETRIEVAL_MMR_LAMBDA,
+        max_tokens=RETRIEVAL_MAX_CONTEXT_TOKENS,
+        hybrid=HYBRID_RETRIEVAL_ENABLED,
+        rrf_k=RRF_K,
+        lexical_only_max_terms=LEXICAL_ONLY_MAX_TERMS
+    )
+
+
+def context_from_documents(docs: list[Document]) -> list[dict]:
+    """
+    Extracts both page_content and metadata (and the similarity score, when known) from each retrieved document.
+    """
+    context = []
+    for doc in docs:
+        metadata = dict(doc.metadata)
+        item = {
+            "content": doc.page_content,        # The actual content of the document
+            "metadata": metadata                # The metadata (e.g., source, page number, etc.)
+        }
+        if "score" in metadata:
+            item["score"] = metadata.pop("score")   # Cosine similarity to the query
+        context.append(item)
+
+    return context
+
+
+def reuse_retrieval(state: dict, queries: list[str], embeddings: Optional[list[Optional[list[float]]]]) -> bool:
+    """
+    Keeps the context of the previous loop when the expanded query has barely changed.
+
+    With several query variants, every variant must be within the threshold of the variant
+    in the same position in the previous loop: a mean of the variants would hide one that changed.
+    Queries answered from the lexical index alone have no embedding and must be identical.
+    """
+    previous = state.get("retrieval_embeddings")
+    if embeddings is None or not previous or len(embeddings) != len(previous) or not state["context"]:
+        return False
+
+    similarity = min(
+        cosine_similarity(embedding, before) if embedding is not None and before is not None
+        else float(embedding is None and before is None and query == previous_query)
+        for query, previous_query, embedding, before in zip(queries, state["retrieval_queries"], embeddings, previous)
+    )
+    if similarity < LOOP_REUSE_THRESHOLD:
+        return False
+
+    record_skip(state, "retrieve_context", f"expanded query similarity {similarity:.3f}")
+    return True
+
+
+def update_context(state: dict, docs: list[Document], queries: list[str], embeddings: Optional[list[Optional[list[float]]]], seconds: float) -> dict:
+    ids = [doc.id for doc in docs]
+
+    # The same documents as the previous loop leave the context byte-identical for the judges
+    if ids and ids == state.get("retrieval_ids") and state["context"]:
+        print(" Retrieved the same documents as the previous loop. Keeping the context.")
+    else:
+        state['context'] = context_from_documents(docs)
+
+    state["retrieval_ids"] = ids
+    state["retrieval_queries"] = queries
+    state["retrieval_embeddings"] = embeddings or []
+    record_run(state, "retrieve_context", seconds)
+
+    return state
 
 
 def retrieve_context(state):
     """
     Retrieves context from the vector store using the expanded or original query.
 
+    On refinement loops, retrieval is skipped when the expanded query embedding is within
+    `LOOP_REUSE_THRESHOLD` of the previous one. Short queries answered from the lexical
+    index alone are never embedded.
+
     Args:
         state (dict): The current state of the workflow, containing the query and expanded query.
 
@@ -35,21 +554,87 @@ def retrieve_context(state):
     
     # print(" Query used for retrieval:", query)
 
+    retriever = get_retriever()
+    lexical = retriever.search_lexical(query)
+    embeddings = retriever.embed_queries([query], [lexical]) if LOOP_REUSE_ENABLED else None
+    if reuse_retrieval(state, [query], embeddings):
+        return state
+
     # Retrieve documents from the vector store
-    docs = retriever.invoke(query)
+    start = time.perf_counter()
+    docs = retriever.retrieve(query, lexical, embeddings[0] if embeddings else None)
     
     # print(" Retrieved documents:", docs)
 
-    # Extract both page_content and metadata from each document
-    context= [
-        {
-            "content": doc.page_content,        # The actual content of the document
-            "metadata": doc.metadata            # The metadata (e.g., source, page number, etc.)
-        }
-        for doc in docs
-    ]
-    state['context'] = context
-    
-    # print("Extracted context with metadata:", context)
+    return update_context(state, docs, [query], embeddings, time.perf_counter() - start)
 
-    return state
+
+async def aretrieve_context(state):
+    """
+    Async variant of `retrieve_context`.
+    """
+    print("-"*20, "retrieve_context", "-"*20)
+
+    query = state['expanded_query']
+
+    retriever = get_retriever()
+    lexical = await asyncio.to_thread(retriever.search_lexical, query)
+    embeddings = await retriever.aembed_queries([query], [lexical]) if LOOP_REUSE_ENABLED else None
+    if reuse_retrieval(state, [query], embeddings):
+        return state
+
+    # Retrieve documents from the vector store
+    start = time.perf_counter()
+    docs = await retriever.aretrieve(query, lexical, embeddings[0] if embeddings else None)
+
+    return update_context(state, docs, [query], embeddings, time.perf_counter() - start)
+
+
+def retrieve_multi_context(state):
+    """
+    Retrieves context with the raw query and its variants, fusing the results by rank.
+
+    The queries not answered from the lexical index alone are embedded in one request, and
+    all are searched concurrently. On refinement loops, retrieval is skipped when every query
+    is within `LOOP_REUSE_THRESHOLD` of its previous one.
+
+    Args:
+        state (dict): The current state of the workflow, containing the query and its variants.
+
+    Returns:
+        dict: The updated state with the retrieved context.
+    """
+    print("-"*20, "retrieve_context", "-"*20)
+
+    queries = [state['query'], *state['expanded_queries']]
+    retriever = get_retriever()
+    lexicals = list(executor.map(retriever.search_lexical, queries))
+    embeddings = retriever.embed_queries(queries, lexicals)
+
+    if LOOP_REUSE_ENABLED and reuse_retrieval(state, queries, embeddings):
+        return state
+
+    start = time.perf_counter()
+    docs = retriever.multi_query(lexicals, embeddings)
+
+    return update_context(state, docs, queries, embeddings, time.perf_counter() - start)
+
+
+async def aretrieve_multi_context(state):
+    """
+    Async variant of `retrieve_multi_context`.
+    """
+    print("-"*20, "retrieve_context", "-"*20)
+
+    queries = [state['query'], *state['expanded_queries']]
+    retriever = get_retriever()
+    lexicals = await asyncio.gather(*(asyncio.to_thread(retriever.search_lexical, query) for query in queries))
+    embeddings = await retriever.aembed_queries(queries, list(lexicals))
+
+    if LOOP_REUSE_ENABLED and reuse_retrieval(state, queries, embeddings):
+        return state
+
+    start = time.perf_counter()
+    docs = await retriever.amulti_query(list(lexicals), embeddings)
+
+    return update_context(state, docs, queries, embeddings, time.perf_counter() - start)
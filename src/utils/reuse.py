@@ -0,0 +1,37 @@
+import hashlib
+
+import numpy as np
+
+
+def content_key(*parts: str) -> str:
+    """
+    Hashes the exact inputs of a node, so that a repeated call can be recognized.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cosine_similarity(a: list[float], b: list[float]) -> float:
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    return float(a @ b / ((np.linalg.norm(a) * np.linalg.norm(b)) or 1.0))
+
+
+def record_run(state: dict, node: str, seconds: float):
+    """
+    Keeps the duration of the last run of a node, to estimate the time saved by skipping it.
+    """
+    state["node_seconds"] = {**state.get("node_seconds", {}), node: seconds}
+
+
+def record_skip(state: dict, node: str, reason: str):
+    """
+    Records a node skipped because its result from a previous loop still holds.
+    """
+    saved = state.get("node_seconds", {}).get(node, 0.0)
+    state["skipped_nodes"] = state.get("skipped_nodes", []) + [node]
+    state["time_saved"] = state.get("time_saved", 0.0) + saved
+
+    print(f" Skipping {node}: {reason}. Saved {saved:.2f}s")
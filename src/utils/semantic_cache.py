@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Embedding-keyed cache of validated workflow responses, persisted in SQLite.
+
+    A lookup returns the stored response of the most similar cached query when its
+    cosine similarity reaches the threshold. Queries stored without an embedding (short
+    lexical queries, see `ScoredRetriever.answers_lexically`) only match the same text. Entries expire after a TTL, the least
+    recently used entries are evicted beyond `max_entries`, and the whole cache is
+    invalidated when the files of the vector store change.
+    """
+
+    def __init__(self, path: str, embeddings, store_directory: str,
+                 threshold: float = 0.97, ttl: float = 86400, max_entries: int = 1000):
+        """
+        Args:
+            path (str): Location of the SQLite cache file.
+            embeddings: Embedding model used to embed queries (LangChain `Embeddings`).
+            store_directory (str): Vector store directory whose changes invalidate the cache.
+            threshold (float): Minimum cosine similarity for a cache hit.
+            ttl (float): Lifetime of an entry in seconds.
+            max_entries (int): Maximum number of entries kept before LRU eviction.
+        """
+        self.embeddings = embeddings
+        self.store_directory = store_directory
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY, query TEXT, embedding BLOB, output TEXT, "
+            "created_at REAL, accessed_at REAL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+        self.ids, self.matrix = [], np.empty((0, 0), dtype=np.float32)
+        self._validate_store()
+        self._load()
+
+
+    def embed(self, query: str) -> np.ndarray:
+        """
+        Embeds and L2-normalizes a query.
+        """
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+
+    async def aembed(self, query: str) -> np.ndarray:
+        """
+        Async variant of `embed`.
+        """
+        vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+
+    def lookup(self, embedding: np.ndarray) -> Optional[dict]:
+        """
+        Returns the cached output of the most similar query, if it is similar enough.
+
+        Args:
+            embedding (np.ndarray): Normalized embedding of the incoming query.
+
+        Returns:
+            Optional[dict]: The cached workflow output, or None on a miss.
+        """
+        with self.lock:
+            self._validate_store()
+            self._expire()
+            if not self.ids:
+                return None
+
+            similarities = self.matrix @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            entry_id = self.ids[best]
+            row = self.conn.execute("SELECT query, output FROM entries WHERE id = ?", (entry_id,)).fetchone()
+            self.conn.execute("UPDATE entries SET accessed_at = ? WHERE id = ?", (time.time(), entry_id))
+            self.conn.commit()
+
+        print(f" Semantic cache hit ({similarities[best]:.3f}) for cached query: {row[0]}")
+        return json.loads(row[1])
+
+
+    def lookup_text(self, query: str) -> Optional[dict]:
+        """
+        Returns the cached output of the same query text, without embedding it.
+        """
+        with self.lock:
+            self._validate_store()
+            self._expire()
+
+            row = self.conn.execute(
+                "SELECT id, output FROM entries WHERE query = ? ORDER BY created_at DESC LIMIT 1", (query,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self.conn.execute("UPDATE entries SET accessed_at = ? WHERE id = ?", (time.time(), row[0]))
+            self.conn.commit()
+
+        print(f" Semantic cache hit (same text) for cached query: {query}")
+        return json.loads(row[1])
+
+
+    def store(self, query: str, embedding: Optional[np.ndarray], output: dict):
+        """
+        Stores a validated workflow output for the given query.
+
+        Args:
+            query (str): The user query.
+            embedding (Optional[np.ndarray]): Normalized embedding of the query, or None to only match its text.
+            output (dict): JSON-serializable workflow output to cache.
+        """
+        now = time.time()
+        vector = embedding.astype(np.float32).tobytes() if embedding is not None else None
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO entries (query, embedding, output, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (query, vector, json.dumps(output), now, now)
+            )
+
+            # Evict the least recently used entries beyond the size limit
+            self.conn.execute(
+                "DELETE FROM entries WHERE id NOT IN "
+                "(SELECT id FROM entries ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self.conn.commit()
+            self._load()
+
+
+    def clear(self):
+        """
+        Removes every cached entry.
+        """
+        self.conn.execute("DELETE FROM entries")
+        self.conn.commit()
+        self.ids, self.matrix = [], np.empty((0, 0), dtype=np.float32)
+
+
+    def _load(self):
+        rows = self.conn.execute("SELECT id, embedding FROM entries WHERE embedding IS NOT NULL").fetchall()
+        self.ids = [row[0] for row in rows]
+        if rows:
+            self.matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        else:
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+
+
+    def _expire(self):
+        cursor = self.conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+        if cursor.rowcount:
+            self.conn.commit()
+            self._load()
+
+
+    def _validate_store(self):
+        # Invalidate every entry when the vector store has been rebuilt
+        fingerprint = store_fingerprint(self.store_directory)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'store_fingerprint'").fetchone()
+        if row is None or row[0] != fingerprint:
+            if row is not None:
+                print(" Vector store changed. Clearing semantic cache.")
+            self.clear()
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('store_fingerprint', ?)", (fingerprint,))
+            self.conn.commit()
+
+
+def store_fingerprint(directory: str) -> str:
+    """
+    Hashes the path, size and modification time of every file under a directory.
+    """
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, directory)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
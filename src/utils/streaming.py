@@ -0,0 +1,61 @@
+import queue
+from uuid import UUID
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# Tag attached to the chat model of craft_response, whose tokens are streamed to the user
+RESPONSE_TAG = "final_response"
+
+# Progress labels of the workflow nodes reported while a query is processed
+STAGES = {
+    "probe_retrieval": "Looking for a close match...",
+    "expand_query": "Expanding the query...",
+    "retrieve_context": "Retrieving relevant documents...",
+    "craft_response": "Crafting a response...",
+    "score_groundedness": "Judging groundedness...",
+    "check_precision": "Judging precision...",
+    "refine_response": "Refining the response...",
+    "refine_query": "Refining the query..."
+}
+
+
+class StreamingHandler(BaseCallbackHandler):
+    """
+    Callback handler that forwards workflow stages and response tokens to a queue.
+
+    Events are dicts with a "type" of "stage" (with the node "name" and a "label"),
+    "token" (with the token "content") or "reset". Only tokens of chat models tagged with
+    `RESPONSE_TAG` (craft_response) are forwarded, so the other workflow calls stay silent.
+    A response is only accepted once the judges pass it, so when a refinement loop crafts
+    it again, a "reset" tells the consumer to discard the tokens of the rejected draft.
+    """
+
+    def __init__(self, events: queue.Queue):
+        self.events = events
+        self.response_runs = set()
+        self.streamed = False
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        # LangGraph tags the node run and all of its children with the node name
+        name = kwargs.get("name")
+        if name in STAGES and (metadata or {}).get("langgraph_node") == name:
+            self.events.put({"type": "stage", "name": name, "label": STAGES[name]})
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        if RESPONSE_TAG in (tags or []):
+            self.response_runs.add(run_id)
+            if self.streamed:
+                self.events.put({"type": "reset"})
+                self.streamed = False
+
+    def on_llm_new_token(self, token: str, *, chunk: Any = None, run_id: UUID,
+                         parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        if token and run_id in self.response_runs:
+            self.events.put({"type": "token", "content": token})
+            self.streamed = True
@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# The app runs from the repository root with `src` on the import path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+# `config` reads the API keys on import; the tests never call the services
+for key in ["MEM0_API_KEY", "GROQ_API_KEY", "OPENAI_API_KEY"]:
+    os.environ.setdefault(key, "test")
+os.environ.setdefault("OPENAI_API_BASE", "http://localhost:1/v1")
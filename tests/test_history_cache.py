@@ -0,0 +1,217 @@
+import zlib
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from utils import history_cache
+from utils.history_cache import HistoryCache
+from utils.memory_writer import MemoryWriter
+from agent.nutrition_bot import NutritionBot
+
+
+class FakeEmbeddings:
+    """
+    Hashes words into buckets, so that texts sharing words are similar. Records the texts embedded.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.embedded = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.append(list(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+
+class FakeMemoryClient:
+    """
+    Local stand-in for mem0's `MemoryClient`, ranking memories with the same embeddings.
+    """
+
+    def __init__(self):
+        self.embeddings = FakeEmbeddings()
+        self.memories = {}
+        self.calls = {"add": 0, "get_all": 0, "search": 0}
+
+    def add(self, messages: list[dict], user_id: str, **kwargs):
+        self.calls["add"] += 1
+        # Like mem0, keeps what the user said rather than the exchange
+        text = "\n".join(message["content"] for message in messages if message["role"] == "user")
+        self.memories.setdefault(user_id, []).append({"memory": text, "metadata": kwargs.get("metadata", {})})
+
+    def get_all(self, user_id: str, **kwargs) -> dict:
+        self.calls["get_all"] += 1
+        return {"results": list(self.memories.get(user_id, []))}
+
+    def search(self, query: str, user_id: str, limit: int = 5, **kwargs) -> list[dict]:
+        self.calls["search"] += 1
+        memories = self.memories.get(user_id, [])
+        if not memories:
+            return []
+
+        matrix = np.asarray(self.embeddings.embed_documents([memory["memory"] for memory in memories]))
+        query_vector = np.asarray(self.embeddings.embed_query(query))
+        scores = matrix @ query_vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector) + 1e-9)
+        # Like mem0, only memories related to the query are returned
+        return [memories[i] for i in np.argsort(-scores)[:limit] if scores[i] > 0]
+
+
+class BlockedMemoryClient:
+    """
+    Holds every write until released, like a mem0 write still queued or in flight.
+    """
+
+    def __init__(self, memory: FakeMemoryClient):
+        self.memory = memory
+        self.released = threading.Event()
+
+    def add(self, *args, **kwargs):
+        self.released.wait()
+        self.memory.add(*args, **kwargs)
+
+
+class FakeAsyncMemoryClient:
+    def __init__(self, memory: FakeMemoryClient):
+        self.memory = memory
+
+    async def get_all(self, user_id: str, **kwargs) -> dict:
+        return self.memory.get_all(user_id=user_id)
+
+
+TOPICS = ["scurvy citrus", "iron anemia spinach", "vitamin D sunlight exposure", "rickets weak bones growing children",
+          "vegan diet needs vitamin B12 supplements", "iodine deficiency causes goiter thyroid swelling adults",
+          "kwashiorkor severe protein intake shortage among young kids"]
+
+
+@pytest.fixture
+def memory():
+    memory = FakeMemoryClient()
+    for topic in TOPICS:
+        memory.add([{"role": "user", "content": topic}], user_id="alice")
+    return memory
+
+
+@pytest.fixture
+def cache(memory):
+    return HistoryCache(memory, lambda: FakeAsyncMemoryClient(memory), FakeEmbeddings(), ttl=60, limit=3)
+
+
+@pytest.fixture
+def bot(memory, cache):
+    # Only the parts used to store interactions, without the mem0 and OpenAI clients
+    bot = NutritionBot.__new__(NutritionBot)
+    bot.memory, bot.history_cache, bot.memory_writer = memory, cache, None
+    return bot
+
+
+def texts(memories: list[dict]) -> list[str]:
+    # Memories sharing no word with the query score 0 and are left out, as by the fake's search
+    return [memory["memory"] for memory in memories if memory.get("score", 1.0) > 0]
+
+
+def test_cold_start_loads_all_memories_once(memory, cache):
+    results = cache.search("alice", "what helps with goiter and iodine")
+
+    assert memory.calls["get_all"] == 1
+    assert "goiter" in results[0]["memory"]
+    assert texts(results) == texts(memory.search("what helps with goiter and iodine", user_id="alice", limit=3))
+
+    # All memories are embedded in one batch, then only the query
+    assert [len(batch) for batch in cache.embeddings.embedded] == [len(TOPICS), 1]
+
+
+def test_warm_searches_stay_local(memory, cache):
+    for query in ["rickets in children", "vegan diet and vitamin B12", "protein for kwashiorkor"]:
+        assert texts(cache.search("alice", query)) == texts(memory.search(query, user_id="alice", limit=3))
+
+    assert memory.calls["get_all"] == 1
+    assert cache.hits == 2 and cache.misses == 1
+
+
+def test_stored_interaction_is_searchable_before_mem0_reload(memory, cache, bot):
+    cache.search("alice", "iron")
+    bot.store_customer_interaction("alice", "Is folate deficiency linked to fatigue?", "Folate deficiency causes fatigue.")
+
+    query = "folate deficiency fatigue"
+    results = cache.search("alice", query)
+
+    assert "folate" in results[0]["memory"].lower()
+    assert texts(results) == texts(memory.search(query, user_id="alice", limit=3))
+
+    # The new interaction was embedded on its own, without fetching the memories again
+    assert memory.calls["get_all"] == 1
+    assert [len(batch) for batch in cache.embeddings.embedded[-2:]] == [1, 1]
+
+
+def test_interactions_of_cold_users_are_left_to_mem0(memory, cache, bot):
+    bot.store_customer_interaction("bob", "How much iron do I need?", "About 18 mg a day.")
+
+    assert "bob" not in cache.users
+    assert texts(cache.search("bob", "iron")) == texts(memory.memories["bob"])
+
+
+def test_ttl_expiry_reloads_from_mem0(memory, cache, bot, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(history_cache.time, "monotonic", lambda: now[0])
+
+    cache.search("alice", "scurvy")
+    now[0] += 30
+    cache.search("alice", "scurvy")
+    assert memory.calls["get_all"] == 1
+
+    now[0] += 31
+    bot.store_customer_interaction("alice", "Can I eat oranges for scurvy?", "Yes, citrus fruit helps.")
+    results = cache.search("alice", "oranges scurvy citrus")
+
+    assert memory.calls["get_all"] == 2
+    assert texts(results) == texts(memory.search("oranges scurvy citrus", user_id="alice", limit=3))
+
+
+def test_queued_interactions_survive_ttl_reload(memory, cache, bot, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(history_cache.time, "monotonic", lambda: now[0])
+    blocked = BlockedMemoryClient(memory)
+    bot.memory_writer = MemoryWriter(blocked, on_done=cache.confirm)
+
+    cache.search("alice", "scurvy")
+    bot.store_customer_interaction("alice", "Can oranges prevent scurvy?", "Yes, citrus fruit helps.")
+
+    # mem0 doesn't have the interaction yet when the memories are fetched again
+    now[0] += 61
+    results = cache.search("alice", "oranges prevent scurvy")
+    assert memory.calls["get_all"] == 2
+    assert "oranges" in results[0]["memory"]
+
+    # Once written, it is only taken from mem0
+    blocked.released.set()
+    assert bot.memory_writer.flush(timeout=5)
+    assert "alice" not in cache.unconfirmed
+
+    now[0] += 61
+    results = cache.search("alice", "oranges prevent scurvy")
+    assert texts(results) == texts(memory.search("oranges prevent scurvy", user_id="alice", limit=3))
+    bot.memory_writer.close()
+
+
+def test_async_search_matches_sync_search(memory, cache, bot):
+    asyncio.run(cache.asearch("alice", "sunlight"))
+    bot.store_customer_interaction("alice", "Does sunlight help vitamin D?", "Yes, sunlight helps.")
+
+    query = "sunlight vitamin D"
+    assert texts(asyncio.run(cache.asearch("alice", query))) == texts(memory.search(query, user_id="alice", limit=3))
+    assert memory.calls["get_all"] == 1
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from agent import tool
+from utils import retrieve
+from utils.semantic_cache import SemanticCache
+from utils.retrieve import ScoredRetriever
+
+
+class FakeEmbeddings:
+    """
+    Records every text embedded, the way an embedding request would be billed.
+    """
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.extend(texts)
+        return [[1.0, float(len(text)), 0.0] for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_queries(texts)
+
+
+class FakeLexicalIndex:
+    """
+    Matches records whose text contains query terms, with the fraction of terms found.
+    """
+
+    def __init__(self, records: dict[str, str]):
+        self.records = records
+
+    def search(self, query: str, k: int = 20) -> list[tuple[str, float, float]]:
+        terms = set(query.lower().split())
+        hits = []
+        for id, text in self.records.items():
+            found = len(terms & set(text.lower().split()))
+            if found:
+                hits.append((id, float(found), found / len(terms)))
+        return sorted(hits, key=lambda hit: hit[1], reverse=True)[:k]
+
+
+RECORDS = {
+    "b12": "vitamin b12 deficiency causes anemia",
+    "scurvy": "scurvy comes from a lack of vitamin c",
+    "rickets": "rickets softens the bones of children"
+}
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    embeddings = FakeEmbeddings()
+    vectors = {id: np.asarray([1.0, float(i), 1.0], dtype=np.float32) for i, id in enumerate(RECORDS)}
+
+    monkeypatch.setattr(retrieve, "MULTI_VECTOR_ENABLED", False)
+    monkeypatch.setattr(retrieve, "get_cached_embedding_model", lambda: embeddings)
+    monkeypatch.setattr(retrieve, "get_lexical_index", lambda: FakeLexicalIndex(RECORDS))
+    monkeypatch.setattr(retrieve, "get_records", lambda ids: {
+        id: (Document(id=id, page_content=RECORDS[id]), vectors[id]) for id in ids if id in RECORDS
+    })
+    monkeypatch.setattr(retrieve, "search_ids", lambda embedding, k: [
+        (id, 0.5, vector.tolist()) for id, vector in vectors.items()
+    ][:k])
+
+    retriever = ScoredRetriever(k=2, fetch_k=5, hybrid=True, lexical_only_max_terms=2)
+    monkeypatch.setattr(retrieve, "get_retriever", lambda: retriever)
+    monkeypatch.setattr(tool, "get_retriever", lambda: retriever)
+    return embeddings
+
+
+def test_short_lexical_query_is_retrieved_without_embedding(embeddings):
+    state = retrieve.retrieve_context({**tool.initial_state("b12"), "expanded_query": "vitamin b12"})
+
+    assert embeddings.embedded == []
+    assert state["context"][0]["content"] == RECORDS["b12"]
+
+
+def test_longer_query_is_embedded_once(embeddings):
+    retrieve.retrieve_context({**tool.initial_state("b12"), "expanded_query": "which vitamin deficiency causes anemia"})
+
+    assert embeddings.embedded == ["which vitamin deficiency causes anemia"]
+
+
+def test_refinement_loop_reuses_lexical_retrieval(embeddings):
+    state = retrieve.retrieve_context({**tool.initial_state("b12"), "expanded_query": "vitamin b12"})
+    state = retrieve.retrieve_context(state)
+
+    assert embeddings.embedded == []
+    assert state["skipped_nodes"] == ["retrieve_context"]
+
+
+def test_multi_query_only_embeds_variants_that_need_it(embeddings):
+    state = {**tool.initial_state("scurvy"), "expanded_queries": ["vitamin c", "what does a lack of vitamin c cause"]}
+    state = retrieve.retrieve_multi_context(state)
+
+    assert embeddings.embedded == ["what does a lack of vitamin c cause"]
+    assert RECORDS["scurvy"] in [doc["content"] for doc in state["context"]]
+
+
+def test_semantic_cache_matches_lexical_query_on_its_text(embeddings, tmp_path, monkeypatch):
+    (tmp_path / "store").mkdir()
+    cache = SemanticCache(str(tmp_path / "cache.sqlite3"), embeddings, store_directory=str(tmp_path / "store"))
+    runs = []
+
+    class App:
+        def invoke(self, state, config=None):
+            runs.append(state["query"])
+            return {**state, "response": "Vitamin B12 deficiency causes anemia.",
+                    "groundedness_score": 5.0, "precision_score": 5.0}
+
+    monkeypatch.setattr(tool, "get_semantic_cache", lambda: cache)
+    monkeypatch.setattr(tool, "get_workflow_app", lambda: App())
+    monkeypatch.setattr(tool, "speculative_state", tool.initial_state)
+
+    first = tool.run_workflow("b12")
+    second = tool.run_workflow("b12")
+
+    assert runs == ["b12"]
+    assert second["response"] == first["response"]
+    assert embeddings.embedded == []